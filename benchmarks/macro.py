@@ -0,0 +1,139 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+import subprocess
+
+from concurrent.futures import ThreadPoolExecutor
+from pypeline.helpers import helpers, parallel_helpers
+
+from benchmarks.runner import benchmark
+
+
+#
+# Macro benchmarks of pipelines built with the helper functions,
+# computed sequentially and by a thread pool
+#
+__no_workers = 4
+
+__reverse_command = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "src", "pypeline", "helpers", "tests", "reverse.sh")
+
+
+def __linear_pipeline(helper_module, no_components):
+    pipeline = helper_module.cons_function_component(lambda a, s: a + 1)
+    for i in xrange(no_components - 1):
+        pipeline = pipeline >> helper_module.cons_function_component(lambda a, s: a + 1)
+    return pipeline
+
+
+def __fan_out_fan_in_pipeline(helper_module, depth):
+    """A pipeline that splits its input depth times, into 2 ** depth branches, and joins them again."""
+    if depth == 0:
+        return helper_module.cons_function_component(lambda a, s: sum(xrange(a)))
+    branch = __fan_out_fan_in_pipeline(helper_module, depth - 1)
+    return helper_module.cons_split_wire() >> \
+           (branch ** branch) >> \
+           helper_module.cons_unsplit_wire(lambda t, b: t + b)
+
+
+def __parallel(pipeline, input):
+    executor = ThreadPoolExecutor(max_workers = __no_workers)
+    function = lambda: parallel_helpers.run_pipeline(executor, pipeline, input, None)
+    return (function, lambda: executor.shutdown(True))
+
+
+def __cons_subprocess_component(helper_module, processes):
+    process = subprocess.Popen([__reverse_command],
+                               stdin = subprocess.PIPE,
+                               stdout = subprocess.PIPE)
+    processes.append(process)
+
+    def process_function(a, s):
+        print >> process.stdin, a
+        process.stdin.flush()
+        return process.stdout.readline().strip()
+
+    return helper_module.cons_function_component(process_function)
+
+
+def __subprocess_pipeline(helper_module, no_components):
+    processes = list()
+    def tear_down():
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+    try:
+        pipeline = __cons_subprocess_component(helper_module, processes)
+        for i in xrange(no_components - 1):
+            pipeline = pipeline >> __cons_subprocess_component(helper_module, processes)
+    except Exception:
+        tear_down()
+        raise
+    return (pipeline, tear_down)
+
+
+@benchmark("macro", 200)
+def linear_pipeline_50_components():
+    pipeline = __linear_pipeline(helpers, 50)
+    return (lambda: helpers.run_pipeline(pipeline, 0, None), None)
+
+
+@benchmark("macro", 1000)
+def compiled_linear_pipeline_50_components():
+    pipeline = helpers.compile_pipeline(__linear_pipeline(helpers, 50))
+    return (lambda: helpers.run_pipeline(pipeline, 0, None), None)
+
+
+@benchmark("macro", 20)
+def parallel_linear_pipeline_50_components():
+    return __parallel(__linear_pipeline(parallel_helpers, 50), 0)
+
+
+@benchmark("macro", 2000)
+def dictionary_wire_chain():
+    pipeline = helpers.cons_dictionary_wire({'one': 'two', 'unused': 'unused'}) >> \
+               helpers.cons_dictionary_wire({'two': 'three'}) >> \
+               helpers.cons_function_component(lambda a, s: a['three'], required_keys = ['three'])
+    value = {'one': 1, 'unused': 0}
+    return (lambda: helpers.run_pipeline(pipeline, value, None), None)
+
+
+@benchmark("macro", 200)
+def fan_out_fan_in_pipeline_16_branches():
+    pipeline = __fan_out_fan_in_pipeline(helpers, 4)
+    return (lambda: helpers.run_pipeline(pipeline, 1000, None), None)
+
+
+@benchmark("macro", 20)
+def parallel_fan_out_fan_in_pipeline_16_branches():
+    return __parallel(__fan_out_fan_in_pipeline(parallel_helpers, 4), 1000)
+
+
+@benchmark("macro", 20)
+def subprocess_pipeline_2_components():
+    pipeline, tear_down = __subprocess_pipeline(helpers, 2)
+    return (lambda: helpers.run_pipeline(pipeline, "hello world", None), tear_down)
+
+
+@benchmark("macro", 20)
+def parallel_subprocess_pipeline_2_components():
+    pipeline, tear_down = __subprocess_pipeline(parallel_helpers, 2)
+    function, shutdown = __parallel(pipeline, "hello world")
+    return (function, lambda: (shutdown(), tear_down()))
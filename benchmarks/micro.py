@@ -0,0 +1,158 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pypeline.core.arrows.function_arrow import FunctionArrow
+from pypeline.core.arrows.function_arrow_choice import FunctionArrowChoice, if_maker
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
+from pypeline.core.arrows.kleisli_arrow_choice import KleisliArrowChoice
+from pypeline.core.types.either import Left, Right
+from pypeline.core.types.state import State, return_
+
+from benchmarks.runner import benchmark
+
+
+#
+# Micro benchmarks of the arrow and monad implementations
+#
+def __function_arrow(depth):
+    arrow = FunctionArrow(lambda a: a + 1)
+    for i in xrange(depth - 1):
+        arrow = arrow >> FunctionArrow(lambda a: a + 1)
+    return arrow
+
+
+def __kleisli_arrow(depth):
+    arrow = KleisliArrow(return_, lambda a: return_(a + 1))
+    for i in xrange(depth - 1):
+        arrow = arrow >> KleisliArrow(return_, lambda a: return_(a + 1))
+    return arrow
+
+
+def __run_kleisli_arrow(arrow, a):
+    return State.evalState(KleisliArrow.runKleisli(arrow, a), None)
+
+
+@benchmark("micro", 10000)
+def function_arrow_composition_depth_10():
+    arrow = __function_arrow(10)
+    return (lambda: arrow(0), None)
+
+
+@benchmark("micro", 1000)
+def function_arrow_composition_depth_100():
+    arrow = __function_arrow(100)
+    return (lambda: arrow(0), None)
+
+
+@benchmark("micro", 100)
+def function_arrow_composition_depth_1000():
+    arrow = __function_arrow(1000)
+    return (lambda: arrow(0), None)
+
+
+@benchmark("micro", 100)
+def function_arrow_build_depth_100():
+    return (lambda: __function_arrow(100), None)
+
+
+@benchmark("micro", 2000)
+def kleisli_arrow_composition_depth_10():
+    arrow = __kleisli_arrow(10)
+    return (lambda: __run_kleisli_arrow(arrow, 0), None)
+
+
+@benchmark("micro", 200)
+def kleisli_arrow_composition_depth_100():
+    arrow = __kleisli_arrow(100)
+    return (lambda: __run_kleisli_arrow(arrow, 0), None)
+
+
+@benchmark("micro", 20)
+def kleisli_arrow_composition_depth_1000():
+    arrow = __kleisli_arrow(1000)
+    return (lambda: __run_kleisli_arrow(arrow, 0), None)
+
+
+@benchmark("micro", 10000)
+def function_arrow_parallel():
+    arrow = FunctionArrow(lambda a: a + 1) ** FunctionArrow(lambda a: a - 1)
+    return (lambda: arrow((0, 0)), None)
+
+
+@benchmark("micro", 10000)
+def function_arrow_fanout():
+    arrow = FunctionArrow(lambda a: a + 1) & FunctionArrow(lambda a: a - 1)
+    return (lambda: arrow(0), None)
+
+
+@benchmark("micro", 2000)
+def kleisli_arrow_parallel():
+    arrow = KleisliArrow(return_, lambda a: return_(a + 1)) ** KleisliArrow(return_, lambda a: return_(a - 1))
+    return (lambda: __run_kleisli_arrow(arrow, (0, 0)), None)
+
+
+@benchmark("micro", 2000)
+def kleisli_arrow_fanout():
+    arrow = KleisliArrow(return_, lambda a: return_(a + 1)) & KleisliArrow(return_, lambda a: return_(a - 1))
+    return (lambda: __run_kleisli_arrow(arrow, 0), None)
+
+
+@benchmark("micro", 200)
+def state_bind_chain_100():
+    state = return_(0)
+    for i in xrange(100):
+        state = state >= (lambda a: return_(a + 1))
+    return (lambda: State.runState(state, None), None)
+
+
+@benchmark("micro", 20)
+def state_bind_chain_1000():
+    state = return_(0)
+    for i in xrange(1000):
+        state = state >= (lambda a: return_(a + 1))
+    return (lambda: State.runState(state, None), None)
+
+
+@benchmark("micro", 200)
+def state_bind_chain_with_state_100():
+    state = return_(0)
+    for i in xrange(100):
+        state = state >= (lambda a: State(lambda s: (a + s, s + 1)))
+    return (lambda: State.runState(state, 0), None)
+
+
+@benchmark("micro", 5000)
+def either_routing_function_arrow():
+    arrow = if_maker(lambda a: a % 2 == 0, lambda a: a // 2, lambda a: 3 * a + 1)
+    values = range(10)
+    return (lambda: [arrow(a) for a in values], None)
+
+
+@benchmark("micro", 5000)
+def either_routing_function_arrow_choice():
+    arrow = FunctionArrowChoice(lambda a: a // 2) | FunctionArrowChoice(lambda a: 3 * a + 1)
+    values = [Left(a) if a % 2 == 0 else Right(a) for a in xrange(10)]
+    return (lambda: [arrow(a) for a in values], None)
+
+
+@benchmark("micro", 1000)
+def either_routing_kleisli_arrow_choice():
+    arrow = KleisliArrowChoice(return_, lambda a: return_(a // 2)) | \
+            KleisliArrowChoice(return_, lambda a: return_(3 * a + 1))
+    values = [Left(a) if a % 2 == 0 else Right(a) for a in xrange(10)]
+    return (lambda: [__run_kleisli_arrow(arrow, a) for a in values], None)
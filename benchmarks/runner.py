@@ -0,0 +1,125 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+
+
+#
+# A benchmark is registered with the group it belongs to and the number
+# of times its function is called per timed repetition. The registered
+# setup function returns the function to time, taking no arguments, and
+# a tear down function, or None.
+#
+__benchmarks = list()
+
+
+def benchmark(group, number):
+    def register(setup_function):
+        __benchmarks.append((group, setup_function.__name__, number, setup_function))
+        return setup_function
+    return register
+
+
+def get_benchmarks():
+    # Importing the benchmark modules registers their benchmarks
+    import benchmarks.micro
+    import benchmarks.macro
+    return list(__benchmarks)
+
+
+def run_benchmark(setup_function, number, repeat):
+    """Returns the time, in seconds, of one call of the benchmarked function for each repetition."""
+    function, tear_down_function = setup_function()
+    try:
+        # Warm up
+        function()
+
+        times = list()
+        for i in xrange(repeat):
+            start = timeit.default_timer()
+            for j in xrange(number):
+                function()
+            times.append((timeit.default_timer() - start) / number)
+        return times
+    finally:
+        if tear_down_function:
+            tear_down_function()
+
+
+def summarise(times):
+    ordered = sorted(times)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+    return {'min': ordered[0],
+            'max': ordered[-1],
+            'mean': sum(ordered) / len(ordered),
+            'median': median}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog = "python -m benchmarks",
+                                     description = "Benchmark pypeline and write the results as JSON.")
+    parser.add_argument("--group", choices = ["micro", "macro"], help = "only run the benchmarks in this group")
+    parser.add_argument("--filter", help = "only run the benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type = int, default = 5, help = "timed repetitions of each benchmark")
+    parser.add_argument("--scale", type = float, default = 1.0, help = "multiply the number of calls per repetition")
+    parser.add_argument("--output", help = "write the results to this file instead of standard out")
+    parser.add_argument("--list", action = "store_true", help = "list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in get_benchmarks()
+                if (args.group is None or b[0] == args.group) and
+                   (args.filter is None or args.filter in b[1])]
+    if args.list:
+        for group, name, number, setup_function in selected:
+            print "%s.%s" % (group, name)
+        return 0
+
+    results = list()
+    for group, name, number, setup_function in selected:
+        number = max(1, int(number * args.scale))
+        print >> sys.stderr, "%s.%s..." % (group, name),
+        times = run_benchmark(setup_function, number, args.repeat)
+        summary = summarise(times)
+        print >> sys.stderr, "%.3g s" % summary['median']
+
+        result = {'group': group,
+                  'name': name,
+                  'number': number,
+                  'repeat': args.repeat,
+                  'times': times}
+        result.update(summary)
+        results.append(result)
+
+    report = {'python': platform.python_version(),
+              'implementation': platform.python_implementation(),
+              'platform': platform.platform(),
+              'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+              'benchmarks': results}
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent = 2, sort_keys = True)
+    else:
+        json.dump(report, sys.stdout, indent = 2, sort_keys = True)
+        print
+    return 0
@@ -35,6 +35,8 @@ setup(
 
     setup_requires = ['nose>=1.0'],
     install_requires = ['futures>=2.1.3'],
+    extras_require = {'async': ['trollius>=2.0']},
+    tests_require = ['trollius>=2.0'],
 
     test_suite = 'nose.collector',
 )
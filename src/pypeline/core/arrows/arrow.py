@@ -21,8 +21,8 @@
 # Abstract arrow types
 #
 class Arrow(object):
-    pass
+    __slots__ = ()
 
 class ArrowChoice(Arrow):
-    pass
+    __slots__ = ()
 
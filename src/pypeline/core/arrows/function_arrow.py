@@ -42,14 +42,35 @@ from pypeline.core.arrows.arrow import Arrow
 #    http://www.haskell.org/haskellwiki/Arrow_tutorial
 #    http://en.wikibooks.org/wiki/Haskell/Understanding_arrows
 #
+# Composed arrows keep a flat tuple of the functions, or stages,
+# that make up the composition. Applying a value runs the stages in
+# a loop, so the stack depth does not grow with the number of
+# composed arrows.
+#
 class FunctionArrow(Arrow):
+    __slots__ = ('_func', '_stages')
+
     def __init__(self, func):
-        if type(func) is not types.FunctionType and \
-           type(func) is not types.MethodType:
-            raise ValueError("Must be a function or method")
+        if not callable(func):
+            raise ValueError("Must be callable")
 
         Arrow.__init__(self)
         self._func = func
+        self._stages = (func,)
+
+    #
+    # Construct an arrow that applies the stages, in order, to a value
+    #
+    @staticmethod
+    def _from_stages(stages):
+        def composition(b):
+            for stage in stages:
+                b = stage(b)
+            return b
+
+        arrow = FunctionArrow(composition)
+        arrow._stages = stages
+        return arrow
 
     #
     # (>>>) composition
@@ -61,7 +82,7 @@ class FunctionArrow(Arrow):
         if not isinstance(other, FunctionArrow):
             raise ValueError("Must be a FunctionArrow")
 
-        return FunctionArrow(lambda b: other._func(self._func(b)))
+        return FunctionArrow._from_stages(self._stages + other._stages)
 
     #
     # (***) parallel computation with input of type tuple
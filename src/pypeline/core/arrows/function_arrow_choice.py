@@ -22,6 +22,8 @@ from pypeline.core.types.either import *
 
 
 class FunctionArrowChoice(ArrowChoice, FunctionArrow):
+    __slots__ = ()
+
     def __init__(self, f):
         ArrowChoice.__init__(self)
         FunctionArrow.__init__(self, f)
@@ -16,8 +16,6 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
-import types
-
 from pypeline.core.arrows.arrow import Arrow
 
 
@@ -28,21 +26,45 @@ from pypeline.core.arrows.arrow import Arrow
 #  Publications:
 #    http://www.cse.chalmers.se/~rjmh/Papers/arrows.pdf
 #
+# Composed arrows keep a flat tuple of the Kleisli functions, or
+# stages, that make up the composition. Running the arrow binds the
+# stages in a loop, so the stack depth does not grow with the number
+# of composed arrows.
+#
 class KleisliArrow(Arrow):
+    __slots__ = ('_patcher', '_func', '_stages')
+
     #
     # patcher :: Monad m => a -> m a
     # function :: Monad m => a -> m b
     #
     def __init__(self, patcher, f):
-        if not isinstance(patcher, types.FunctionType) and not isinstance(patcher, types.MethodType):
-            raise ValueError("Patcher must be a function")
-        if f and (not isinstance(f, types.FunctionType) and
-                  not isinstance(f, types.MethodType)):
-            raise ValueError("Function must be a function")
+        if not callable(patcher):
+            raise ValueError("Patcher must be callable")
+        if f is not None and not callable(f):
+            raise ValueError("Function must be callable")
 
         Arrow.__init__(self)
         self._patcher = patcher
         self._func = f
+        self._stages = (f,)
+
+    #
+    # Construct an arrow that binds the stages, in order, to a value
+    #
+    # K f >>> K g >>> K h = K(\b -> f b >>= g >>= h)
+    @staticmethod
+    def _from_stages(patcher, stages):
+        head, tail = stages[0], stages[1:]
+        def composition(b):
+            m = head(b)
+            for stage in tail:
+                m = m >= stage
+            return m
+
+        arrow = KleisliArrow(patcher, composition)
+        arrow._stages = stages
+        return arrow
 
     # arr f = K(\b -> return(f b))
     def arr(self, f):
@@ -53,7 +75,7 @@ class KleisliArrow(Arrow):
         if not isinstance(other, KleisliArrow):
             raise ValueError("Must be an KleisliArrow")
 
-        return KleisliArrow(other._patcher, lambda b: self._func(b) >= other._func)
+        return KleisliArrow._from_stages(other._patcher, self._stages + other._stages)
 
     # K f (***) K g = first K f >>> second K g
     def __pow__(self, other):
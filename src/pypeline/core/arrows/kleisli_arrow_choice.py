@@ -22,6 +22,8 @@ from pypeline.core.types.either import *
 
 
 class KleisliArrowChoice(ArrowChoice, KleisliArrow):
+    __slots__ = ()
+
     def __init__(self, patcher, f):
         ArrowChoice.__init__(self)
         KleisliArrow.__init__(self, patcher, f)
@@ -16,6 +16,9 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import functools
+import operator
+import sys
 import unittest
 
 from pypeline.core.arrows.function_arrow import FunctionArrow, split, unsplit
@@ -182,6 +185,30 @@ class ArrowUnitTests(unittest.TestCase):
         self.assertEquals(target, result)
 
 
+    # Composition merges the stages of both arrows
+    def test_composition_merges_stages(self):
+        f = lambda x: x + 1
+        g = lambda x: x * 2
+        h = lambda x: x - 3
+
+        arrow_one = FunctionArrow(f) >> FunctionArrow(g)
+        arrow_two = arrow_one >> (FunctionArrow(h) >> FunctionArrow(f))
+
+        self.assertEquals((f, g), arrow_one._stages)
+        self.assertEquals((f, g, h, f), arrow_two._stages)
+        self.assertEquals(f(h(g(f(5)))), arrow_two(5))
+
+
+    # Deep compositions do not grow the stack
+    def test_deep_composition(self):
+        depth = sys.getrecursionlimit() * 2
+        arrow = FunctionArrow(lambda x: x)
+        for i in xrange(depth):
+            arrow = arrow >> FunctionArrow(lambda x: x + 1)
+
+        self.assertEquals(depth, arrow(0))
+
+
     # Compose split then first
     def test_split_first(self):
         def func(b):
@@ -283,3 +310,16 @@ class ArrowUnitTests(unittest.TestCase):
         
         self.assertEquals(target, result_one)
         self.assertEquals(target, result_two)
+
+
+    def test_callables(self):
+        class Increment(object):
+            def __call__(self, a):
+                return a + 1
+
+        arrow = FunctionArrow(operator.itemgetter(1)) >> \
+                FunctionArrow(functools.partial(operator.mul, 2)) >> \
+                FunctionArrow(Increment()) >> \
+                FunctionArrow(str)
+        self.assertEquals("21", arrow((1, 10)))
+        self.assertRaises(ValueError, FunctionArrow, 7)
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import sys
 import unittest
 
 from pypeline.core.arrows.function_arrow import FunctionArrow
@@ -75,6 +76,18 @@ class KleisliArrowUnitTest(unittest.TestCase):
         self.assertEquals((x(w(value)), [s1, s2]), State.runState(state_monad, state)) # This is the state
 
 
+    def test_deep_state_monad_pipeline(self):
+        depth = sys.getrecursionlimit() * 2
+        k = KleisliArrow(state_return, lambda a: State(lambda s: (a + 1, s + 1)))
+        arrow = k
+        for i in xrange(depth - 1):
+            arrow = arrow >> k
+
+        self.assertEquals(depth, len(arrow._stages))
+        state_monad = KleisliArrow.runKleisli(arrow, 0)
+        self.assertEquals((depth, depth), State.runState(state_monad, 0))
+
+
     def test_first_with_maybe_monad(self):
         w = lambda a: a * 2
         wk = lambda a: Just(w(a))
@@ -225,3 +238,12 @@ class KleisliArrowUnitTest(unittest.TestCase):
         result = State.runState(state, list())
         target = (f(value, value), list())
         self.assertEquals(target, result)
+
+
+    def test_slots(self):
+        arrow = KleisliArrow(state_return, lambda a: state_return(a + 1))
+        composed = arrow >> arrow
+
+        for obj in (arrow, composed, composed ** arrow, FunctionArrow(lambda a: a), KleisliArrow.runKleisli(composed, 1)):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEquals((3, None), State.runState(KleisliArrow.runKleisli(composed, 1), None))
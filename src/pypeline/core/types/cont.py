@@ -16,18 +16,17 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
-import types
-
 from pypeline.core.types.monad import Monad
 
 
 # Continuation monad
 class Cont(Monad):
+    __slots__ = ('_cont',)
+
     def __init__(self, a):
         super(Monad, self).__init__()
-        if type(a) is not types.FunctionType and \
-           type(a) is not types.MethodType:
-            raise ValueError("Must be a function or method")
+        if not callable(a):
+            raise ValueError("Must be callable")
 
         self._cont = a
 
@@ -38,9 +37,8 @@ class Cont(Monad):
     # Bind operator
     # (>>=) :: m a -> (a -> m b) -> m b
     def __ge__(self, f):
-        if type(f) is not types.FunctionType and \
-           type(f) is not types.MethodType:
-            raise ValueError("Must be a function or method")
+        if not callable(f):
+            raise ValueError("Must be callable")
 
         return Cont(lambda k: Cont.runCont(self, lambda a: Cont.runCont(f(a), k)))
 
@@ -59,9 +57,8 @@ def return_(a):
 # Call current continuation
 # callCC :: ((a -> Cont r b) -> Cont r a) -> Cont r a
 def callCC(f):
-    if type(f) is not types.FunctionType and \
-       type(f) is not types.MethodType:
-        raise ValueError("Must be a function or method")
+    if not callable(f):
+        raise ValueError("Must be callable")
 
     def continuation(k):
         def function_arg(a):
@@ -17,11 +17,19 @@
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
 class Either(object):
+    __slots__ = ('val',)
+
     def __hash__(self):
         return self.val.__hash__()
 
+    # Slotted objects have no __dict__ to pickle
+    def __reduce__(self):
+        return (self.__class__, (self.val,))
+
 
 class Left(Either):
+    __slots__ = ()
+
     def __init__(self, a):
         super(Left, self).__init__()
         self.val = a
@@ -44,6 +52,8 @@ class Left(Either):
 
 
 class Right(Either):
+    __slots__ = ()
+
     def __init__(self, b):
         super(Right, self).__init__()
         self.val = b
@@ -16,8 +16,6 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
-import types
-
 from pypeline.core.types.monad import Maybe
 
 
@@ -25,6 +23,8 @@ from pypeline.core.types.monad import Maybe
 # Just a value
 #
 class Just(Maybe):
+    __slots__ = ('_a',)
+
     def __init__(self, a):
         super(Maybe, self).__init__()
         if a is None:
@@ -38,9 +38,8 @@ class Just(Maybe):
         return Just(a)
 
     def __ge__(self, function):
-        if type(function) is not types.FunctionType and \
-           type(function) is not types.MethodType:
-            raise ValueError("Must be a function or method")
+        if not callable(function):
+            raise ValueError("Must be callable")
         result = function(self._a)
         return result
 
@@ -59,6 +58,10 @@ class Just(Maybe):
     def __hash__(self):
         return self._a.__hash__()
 
+    # Slotted objects have no __dict__ to pickle
+    def __reduce__(self):
+        return (Just, (self._a,))
+
     def __repr__(self):
         return "<Just %s>" % str(self._a)
 
@@ -22,6 +22,8 @@
 # Base monad class
 #
 class Monad(object):
+    __slots__ = ()
+
     # return
     # return :: a -> m a
     def return_(self, a):
@@ -44,6 +46,8 @@ class Monad(object):
 # Erm, maybe...
 #
 class Maybe(Monad):
+    __slots__ = ()
+
     def __init__(self):
         super(Monad, self).__init__()
 
@@ -23,6 +23,7 @@ from pypeline.core.types.monad import Maybe
 # Nothing. This is a singleton.
 #
 class Nothing(Maybe):
+    __slots__ = ()
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -49,6 +50,10 @@ class Nothing(Maybe):
     def __repr__(self):
         return "<Nothing>"
 
+    # Unpickles to the singleton
+    def __reduce__(self):
+        return (Nothing, ())
+
     def __nonzero__(self):
         return False
 
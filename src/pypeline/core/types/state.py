@@ -16,8 +16,6 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
-import types
-
 from pypeline.core.types.monad import Monad
 
 
@@ -33,14 +31,22 @@ from pypeline.core.types.monad import Monad
 #    http://brandon.si/code/the-state-monad-a-tutorial-for-the-confused/
 #    http://channel9.msdn.com/Shows/Going+Deep/Brian-Beckman-The-Zen-of-Expressing-State-The-State-Monad
 #
+# Binding does not nest closures. A bound State records the State it
+# was bound to and the bind function, and runState interprets the
+# resulting tree with an explicit stack of continuations. Hence, long
+# chains of binds run in constant Python stack space.
+#
 class State(Monad):
+    __slots__ = ('_func', '_bound', '_bind_function')
+
     def __init__(self, a):
         super(Monad, self).__init__()
-        if type(a) is not types.FunctionType and \
-           type(a) is not types.MethodType:
-            raise ValueError("Must be a function or method")
+        if not callable(a):
+            raise ValueError("Must be callable")
 
         self._func = a
+        self._bound = None
+        self._bind_function = None
 
     # return
     # return :: a -> m a
@@ -53,25 +59,36 @@ class State(Monad):
     #                                     (State g) = f a
     #                                 in  g newState
     def __ge__(self, function):
-        if type(function) is not types.FunctionType and \
-           type(function) is not types.MethodType:
-            raise ValueError("Must be a function or method")
-
-        def composition(s):
-            a, state = State.runState(self, s)
-            new_state_monad = function(a)
-            if not isinstance(new_state_monad, State):
-                raise ValueError("Bind function [%s] shall return a State monad object" % function)
-            return State.runState(new_state_monad, state)
+        if not callable(function):
+            raise ValueError("Must be callable")
 
-        return State(composition)
+        state = State.__new__(State)
+        state._func = None
+        state._bound = self
+        state._bind_function = function
+        return state
 
     def __repr__(self):
-        return "<State: %s>" % self._func
+        return "<State: %s>" % (self._func if self._func else self._bind_function)
 
     @staticmethod
     def runState(state, s):
-        return state._func(s)
+        continuations = list()
+        while True:
+            # Descend to the innermost state function, stacking the
+            # bind functions that consume its value
+            while state._func is None:
+                continuations.append(state._bind_function)
+                state = state._bound
+
+            a, s = state._func(s)
+            if not continuations:
+                return (a, s)
+
+            function = continuations.pop()
+            state = function(a)
+            if not isinstance(state, State):
+                raise ValueError("Bind function [%s] shall return a State monad object" % function)
 
     @staticmethod
     def evalState(state, s):
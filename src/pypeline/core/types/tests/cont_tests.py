@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import functools
 import unittest
 
 from pypeline.core.types.cont import Cont, return_, callCC
@@ -66,3 +67,9 @@ class ContMonadUnitTest(unittest.TestCase):
 
     def __set_error_message(self, err):
         self.error_message = err
+
+
+    def test_bind_callables(self):
+        cont = return_(7) >= functools.partial(lambda b, a: return_(a * b), 3)
+        self.assertEquals(21, Cont.runCont(cont, lambda x: x))
+        self.assertRaises(ValueError, Cont, 7)
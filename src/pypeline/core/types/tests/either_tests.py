@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import pickle
 import unittest
 
 from pypeline.core.types.either import Either, Left, Right
@@ -30,3 +31,14 @@ class EitherUnitTests(unittest.TestCase):
     def test_ne(self):
         self.assertNotEquals(Left(10), Left(11))
         self.assertNotEquals(Left(10), Right(10))
+
+
+    def test_slots(self):
+        self.assertFalse(hasattr(Left(10), '__dict__'))
+        self.assertFalse(hasattr(Right(10), '__dict__'))
+
+
+    def test_pickle(self):
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEquals(Left(0), pickle.loads(pickle.dumps(Left(0), protocol)))
+            self.assertEquals(Right("something"), pickle.loads(pickle.dumps(Right("something"), protocol)))
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import functools
+import pickle
 import unittest
 
 from pypeline.core.types.just import Just, return_
@@ -47,3 +49,14 @@ class JustMonadUnitTest(unittest.TestCase):
         self.assertNotEquals(Just(11), return_(10))
         self.assertNotEquals(Just(11), None)
         self.assertNotEquals(Just(11), object())
+
+
+    def test_slots_and_pickle(self):
+        self.assertFalse(hasattr(Just(10), '__dict__'))
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEquals(Just(10), pickle.loads(pickle.dumps(Just(10), protocol)))
+
+
+    def test_bind_callables(self):
+        self.assertEquals(Just(30), Just(10) >= functools.partial(lambda b, a: Just(a * b), 3))
+        self.assertRaises(ValueError, Just(10).__ge__, 7)
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import pickle
 import unittest
 
 from pypeline.core.types.nothing import Nothing, return_
@@ -42,3 +43,8 @@ class NothingMonadUnitTest(unittest.TestCase):
     def test_ne(self):
         self.assertNotEquals(Nothing(), None)
         self.assertNotEquals(Nothing(), object())
+
+
+    def test_pickle(self):
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertTrue(pickle.loads(pickle.dumps(Nothing(), protocol)) is Nothing())
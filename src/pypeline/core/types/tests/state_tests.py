@@ -16,9 +16,12 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import functools
+import sys
 import unittest
 import inspect
 
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
 from pypeline.core.types.state import State, return_
 
 
@@ -91,3 +94,39 @@ class StateMonadUnitTest(unittest.TestCase):
         m_two = m_one >= (lambda a: State(lambda s: (a * 2, s.append(msg) or s)))
 
         self.assertEquals([msg], State.execState(m_two, state))
+
+
+    def test_deep_bind_chain(self):
+        depth = sys.getrecursionlimit() * 2
+        m = return_(0)
+        for i in xrange(depth):
+            m = m >= (lambda a: State(lambda s: (a + 1, s + 1)))
+
+        self.assertEquals((depth, depth), State.runState(m, 0))
+
+
+    def test_deep_right_nested_bind_chain(self):
+        depth = sys.getrecursionlimit() * 2
+        def count(a):
+            if a == depth:
+                return return_(a)
+            return State(lambda s: (a + 1, s)) >= count
+
+        self.assertEquals((depth, None), State.runState(return_(0) >= count, None))
+
+
+    def test_bind_function_must_return_state(self):
+        m = return_(7) >= (lambda a: a * 2)
+        self.assertRaises(ValueError, State.runState, m, None)
+
+        # Arrows have a _func attribute too, but are not State monads
+        m = return_(7) >= (lambda a: KleisliArrow(return_, return_))
+        self.assertRaises(ValueError, State.runState, m, None)
+
+
+    def test_callables(self):
+        m = State(functools.partial(lambda a, s: (a, s + 1), 7)) >= \
+            functools.partial(lambda b, a: State(lambda s: (a + b, s)), 3)
+        self.assertEquals((10, 1), State.runState(m, 0))
+        self.assertRaises(ValueError, State, None)
+        self.assertRaises(ValueError, m.__ge__, 7)
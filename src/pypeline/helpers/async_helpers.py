@@ -0,0 +1,427 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
+from pypeline.core.types.state import State, return_
+from pypeline.helpers.helpers import get_dictionary_conversion_function, get_fanout_components, is_value_function
+
+
+#
+# Pipelines whose components are computed on an asyncio event loop.
+# Values and states flow through the pipeline as asyncio futures, and
+# a component is computed, by the event loop, once its input value and
+# state are available. Components whose functions return coroutines, or
+# futures, do not block the event loop, so one loop can keep many
+# pipeline runs in flight.
+#
+class WrappedState(object):
+    __slots__ = ('loop', 'state')
+
+    def __init__(self, loop, state):
+        self.loop = loop
+        self.state = state
+
+
+class AsyncComponentArrow(KleisliArrow):
+    """A Kleisli arrow built by these helpers. Asyncio futures cannot be indexed, so the first and second operators take the items of a future for a pair with a done callback."""
+    __slots__ = ()
+
+    @staticmethod
+    def _from_arrow(arrow):
+        component = AsyncComponentArrow(arrow._patcher, arrow._func)
+        component._stages = arrow._stages
+        return component
+
+    @staticmethod
+    def _get_item(loop, value, key):
+        """Index the value. The item of a future is another future that completes when the indexed future completes."""
+        if not isinstance(value, asyncio.Future):
+            return value[key]
+
+        item_future = asyncio.Future(loop = loop)
+        def done(f):
+            if f.cancelled():
+                item_future.cancel()
+                return
+            try:
+                item = f.result()[key]
+            except Exception as ex:
+                item_future.set_exception(ex)
+            else:
+                item_future.set_result(item)
+        value.add_done_callback(done)
+        return item_future
+
+    def __rshift__(self, other):
+        return AsyncComponentArrow._from_arrow(KleisliArrow.__rshift__(self, other))
+
+    def __rrshift__(self, other):
+        return AsyncComponentArrow._from_arrow(KleisliArrow.__rshift__(other, self))
+
+    def __and__(self, other):
+        return AsyncComponentArrow._from_arrow(KleisliArrow.__and__(self, other))
+
+    # first (K f) = K(\(b, d) -> f b >>= \c -> return (c, d))
+    def first(self):
+        def bind_function(t):
+            def state_function(wrapped_state):
+                get_item = lambda key: AsyncComponentArrow._get_item(wrapped_state.loop, t, key)
+                c, wrapped_state = State.runState(self._func(get_item(0)), wrapped_state)
+                return ((c, get_item(1)), wrapped_state)
+            return State(state_function)
+        return AsyncComponentArrow(self._patcher, bind_function)
+
+    # second (K f) = K(\(d, b) -> f b >>= \c -> return (d, c))
+    def second(self):
+        def bind_function(t):
+            def state_function(wrapped_state):
+                get_item = lambda key: AsyncComponentArrow._get_item(wrapped_state.loop, t, key)
+                c, wrapped_state = State.runState(self._func(get_item(1)), wrapped_state)
+                return ((get_item(0), c), wrapped_state)
+            return State(state_function)
+        return AsyncComponentArrow(self._patcher, bind_function)
+
+
+def __done_future(loop, value):
+    future = asyncio.Future(loop = loop)
+    future.set_result(value)
+    return future
+
+
+def __propagate(source, target):
+    """Propagate a cancelled or failed source future to the target future. Returns true if the target future needs no further completion."""
+    if target.done():
+        return True
+    if source.cancelled():
+        target.cancel()
+        return True
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+        return True
+    return False
+
+
+def __chain(source, target):
+    def done(f):
+        if not __propagate(f, target):
+            target.set_result(f.result())
+    source.add_done_callback(done)
+
+
+def __then(loop, future, function):
+    """Returns a future for the result of applying the function to the result of the future."""
+    new_future = asyncio.Future(loop = loop)
+    def done(f):
+        if __propagate(f, new_future):
+            return
+        try:
+            new_value = function(f.result())
+        except Exception as ex:
+            new_future.set_exception(ex)
+        else:
+            new_future.set_result(new_value)
+    future.add_done_callback(done)
+    return new_future
+
+
+def __gather(loop, value):
+    """Returns a future for the value, whose futures are replaced with their results, once every future in the value has completed."""
+    if isinstance(value, asyncio.Future):
+        return value
+    elif isinstance(value, tuple) and value:
+        return __then(loop,
+                      asyncio.gather(*[__gather(loop, v) for v in value]),
+                      tuple)
+    return __done_future(loop, value)
+
+
+def __schedule(loop,
+               value,
+               state_future,
+               function,
+               input_forming_function = None,
+               output_forming_function = None,
+               is_coroutine = False):
+    """Once the value and state are available apply the input forming function, the function and the output forming function. If the function is a coroutine function the event loop computes the returned coroutine, or future, before the output is formed. A future for the transformed value is returned."""
+    new_future = asyncio.Future(loop = loop)
+
+    def complete(new_a, state):
+        try:
+            # Transform the output of the function
+            transformed_new_a = output_forming_function(new_a, state) if output_forming_function else new_a
+        except Exception as ex:
+            new_future.set_exception(ex)
+        else:
+            new_future.set_result(transformed_new_a)
+
+    def ready(ready_future):
+        if __propagate(ready_future, new_future):
+            return
+
+        the_a, state = ready_future.result()
+        try:
+            # Transform the input
+            transformed_a = input_forming_function(the_a, state) if input_forming_function else the_a
+
+            # Apply
+            new_a = function(transformed_a, state)
+            if is_coroutine:
+                task = asyncio.ensure_future(new_a, loop = loop)
+                task.add_done_callback(lambda t: __propagate(t, new_future) or complete(t.result(), state))
+                return
+        except Exception as ex:
+            new_future.set_exception(ex)
+        else:
+            complete(new_a, state)
+
+    __gather(loop, (value, state_future)).add_done_callback(ready)
+    return new_future
+
+
+def __cons_component(function,
+                     input_forming_function,
+                     output_forming_function,
+                     state_mutator,
+                     is_coroutine):
+    def get_bind_function():
+        def bind_function(bind_a):
+            def state_function(wrapped_state):
+                loop = wrapped_state.loop
+
+                # Execute
+                new_future = __schedule(loop,
+                                        bind_a,
+                                        wrapped_state.state,
+                                        function,
+                                        input_forming_function,
+                                        output_forming_function,
+                                        is_coroutine)
+
+                # Mutate the state
+                next_state = __then(loop, wrapped_state.state, state_mutator) if state_mutator else wrapped_state.state
+                # New value/state pair
+                return (new_future, WrappedState(loop, next_state))
+            return State(state_function)
+        return bind_function
+
+    return AsyncComponentArrow(return_, get_bind_function())
+
+
+def cons_async_component(coro_function,
+                         input_forming_function = None,
+                         output_forming_function = None,
+                         state_mutator = None):
+    """Construct a component based on a coroutine function. The coroutine function takes a value and the state, and returns a coroutine or future which is computed by the event loop. Any input or output forming functions shall be called if provided. A Kleisli arrow is returned."""
+    return __cons_component(coro_function,
+                            input_forming_function,
+                            output_forming_function,
+                            state_mutator,
+                            True)
+
+
+def cons_function_component(function,
+                            input_forming_function = None,
+                            output_forming_function = None,
+                            state_mutator = None):
+    """Construct a component based on a function. The function is called by the event loop, and so should not block. Any input or output forming functions shall be called if provided. A Kleisli arrow is returned."""
+    return __cons_component(function,
+                            input_forming_function,
+                            output_forming_function,
+                            state_mutator,
+                            False)
+
+
+def cons_wire(wire_function):
+    """Construct a wire. A wire is a Kleisli arrow that converts data from from one pipeline component's output schema to another pipeline component's input schema. A wire built from an operator.itemgetter, attrgetter or methodcaller is called with the value only."""
+    def get_wire_function(conv_function):
+        is_value = is_value_function(conv_function)
+        def wire_function(a, s):
+            if isinstance(a, tuple):
+                raise ValueError("Wire has value that is a tuple")
+            new_a = conv_function(a) if is_value else conv_function(a, s)
+            return new_a
+
+        return wire_function
+
+    return cons_function_component(get_wire_function(wire_function))
+
+
+def cons_dictionary_wire(conversions):
+    """Construct a wire that converts between two dictionaries. The keys of the conversions dictionary are keys in the output dictionary, of the preceeding component, whose values will be used to populate a dictionary whose keys are the value of the conversions dictionary.\n\nE.g., output = {'int': 9, 'string': 'hello'}, and conversions = {'int': 'int_two', 'string': 'string_two'}, yields an input dictionary, to the next component, input = {'int_two': 9, 'string_two': 'hello'}."""
+    return cons_wire(get_dictionary_conversion_function(conversions))
+
+
+def cons_split_wire():
+    """Construct a wire that duplicates its input and produces a pair from this value. See: ***, first, second, and unsplit arrow operators."""
+    def get_split_wire_bind_function():
+        def split_wire_bind_function(a):
+            def split_wire_state_function(s):
+                if isinstance(a, tuple):
+                    raise ValueError("Split wire has a value that is a tuple")
+                return ((a, a), s)
+            return State(split_wire_state_function)
+        return split_wire_bind_function
+
+    return AsyncComponentArrow(return_, get_split_wire_bind_function())
+
+
+def cons_unsplit_wire(unsplit_function):
+    """Construct a wire that takes a pair and applies a function to this pair to combine them into one value. The wire waits for both values of the pair to be available."""
+    def get_unsplit_wrapper(inner_function):
+        def unsplit_wrapper(a, s):
+            return inner_function(a[0], a[1])
+        return unsplit_wrapper
+
+    return cons_function_component(get_unsplit_wrapper(unsplit_function))
+
+
+def cons_join_wire(join_function):
+    """Construct a wire that takes the tuple, or dictionary, of a fan-out component's outputs and applies a function to combine them into one value. The function is called with the tuple's values as positional arguments, or with the dictionary's items as keyword arguments. The wire waits for all the values to be available."""
+    def get_join_wrapper(inner_function):
+        def join_wrapper(a, s):
+            return inner_function(**a) if isinstance(a, dict) else inner_function(*a)
+        return join_wrapper
+
+    return cons_function_component(get_join_wrapper(join_function))
+
+
+def cons_fanout_component(components):
+    """Construct a component that computes each of the provided components with the same input. All the components are computed concurrently once the input is available. If the components are given as a list, or tuple, the component returns a flat tuple of their outputs, in the same order. If they are given as a dictionary it returns a dictionary of their outputs with the same keys. The state is passed through the components in turn. See cons_join_wire()."""
+    keys, components = get_fanout_components(components)
+
+    def get_fanout_bind_function():
+        def fanout_bind_function(bind_a):
+            def fanout_state_function(wrapped_state):
+                outputs = list()
+                for component in components:
+                    b, wrapped_state = State.runState(component._func(bind_a), wrapped_state)
+                    outputs.append(b)
+
+                if keys is None:
+                    return (tuple(outputs), wrapped_state)
+
+                # The dictionary is available once all its values are
+                new_future = __then(wrapped_state.loop,
+                                    __gather(wrapped_state.loop, tuple(outputs)),
+                                    lambda the_outputs: dict(zip(keys, the_outputs)))
+                return (new_future, wrapped_state)
+            return State(fanout_state_function)
+        return fanout_bind_function
+
+    return AsyncComponentArrow(return_, get_fanout_bind_function())
+
+
+def __cons_routing_component(key_function, get_component):
+    """Construct a component that computes the component returned by get_component for the key of its input and state. The key is computed once the input value and the state are available, and only the chosen component is computed."""
+    def get_routing_bind_function():
+        def routing_bind_function(bind_a):
+            def routing_state_function(wrapped_state):
+                loop = wrapped_state.loop
+                new_future = asyncio.Future(loop = loop)
+                new_state = asyncio.Future(loop = loop)
+
+                def ready(ready_future):
+                    if __propagate(ready_future, new_future):
+                        __propagate(ready_future, new_state)
+                        return
+
+                    the_a, state = ready_future.result()
+                    try:
+                        component = get_component(key_function(the_a, state))
+                        branch_a, branch_state = State.runState(component._func(bind_a), wrapped_state)
+                    except Exception as ex:
+                        new_future.set_exception(ex)
+                        new_state.set_exception(ex)
+                    else:
+                        __chain(__gather(loop, branch_a), new_future)
+                        __chain(branch_state.state, new_state)
+
+                __gather(loop, (bind_a, wrapped_state.state)).add_done_callback(ready)
+
+                # New value/state pair
+                return (new_future, WrappedState(loop, new_state))
+            return State(routing_state_function)
+        return routing_bind_function
+
+    return AsyncComponentArrow(return_, get_routing_bind_function())
+
+
+def cons_if_component(condition_function, then_component, else_component):
+    """Construct a conditional execution component. If the conditional function evaluates to true the 'then' component is executed. Otherwise, the 'else' component is executed. The condition is evaluated once the input value and the state are available, and only the chosen component is computed. Returns a Kleisli arrow."""
+    if not isinstance(then_component, KleisliArrow):
+        raise ValueError("Then component must be a KleisliArrow")
+    if not isinstance(else_component, KleisliArrow):
+        raise ValueError("Else component must be a KleisliArrow")
+
+    return __cons_routing_component(condition_function,
+                                    lambda condition: then_component if condition else else_component)
+
+
+def cons_switch_component(key_function, components, default_component = None):
+    """Construct a multi-way conditional execution component. The key function, taking the input and the state, returns the key of the component, in the components dictionary, that is executed. If the key is not in the dictionary the default component is executed, or if there is no default component a KeyError is raised. Only the chosen component is computed. Returns a Kleisli arrow."""
+    for component in components.values():
+        if not isinstance(component, KleisliArrow):
+            raise ValueError("Switch components must be KleisliArrows")
+    if default_component is not None and not isinstance(default_component, KleisliArrow):
+        raise ValueError("Default component must be a KleisliArrow")
+
+    components = dict(components)
+    def get_component(key):
+        component = components.get(key, default_component)
+        if component is None:
+            raise KeyError(key)
+        return component
+
+    return __cons_routing_component(key_function, get_component)
+
+
+def __kleisli_wrapper(f):
+    def wrapper(pipeline, input, state, loop = None):
+        """Run, evaluate, or execute a pipeline on an event loop. A future is returned that can be awaited, or yielded from in a coroutine."""
+        if loop is None:
+            loop = asyncio.get_event_loop()
+
+        if isinstance(input, tuple):
+            future = tuple([__done_future(loop, v) for v in input])
+        else:
+            future = __done_future(loop, input)
+
+        state_monad = KleisliArrow.runKleisli(pipeline, future)
+        output = State.runState(state_monad, WrappedState(loop, __done_future(loop, state)))
+        return f(loop, output[0], output[1].state)
+    return wrapper
+
+
+@__kleisli_wrapper
+def run_pipeline(loop, value, state):
+    return __gather(loop, (value, state))
+
+
+@__kleisli_wrapper
+def eval_pipeline(loop, value, state):
+    return __gather(loop, value)
+
+
+@__kleisli_wrapper
+def exec_pipeline(loop, value, state):
+    return state
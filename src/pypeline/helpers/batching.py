@@ -0,0 +1,157 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+
+from concurrent.futures import Future
+
+
+#
+# Gathers concurrent invocations of a component into batches. A batch
+# is submitted, as one call of the batch function, once it holds the
+# maximum number of values, or once its first value has waited for the
+# maximum time. Each invocation's future is resolved with its own
+# item of the batch function's result.
+#
+#   batch_function :: [a] -> [s] -> [b]
+#
+class ComponentBatcher(object):
+    def __init__(self, batch_function, max_batch_size, max_wait_ms):
+        if max_batch_size < 1:
+            raise ValueError("Maximum batch size must be positive")
+        if max_wait_ms < 0:
+            raise ValueError("Maximum wait must not be negative")
+
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.items = 0
+        self._function = batch_function
+        self._batch = list()
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ComponentBatcher: batches = %d, items = %d>" % (self.batches, self.items)
+
+    def submit(self, executor, a, s):
+        """Add the value and state to the current batch. A future for the value's item of the batch function's result is returned. A value whose future is cancelled before its batch is submitted is dropped from the batch, and a submitted batch is cancelled once the futures of all its values have been."""
+        future = Future()
+        with self._lock:
+            self._batch.append((executor, a, s, future))
+            if len(self._batch) >= self.max_batch_size:
+                batch = self._take()
+            else:
+                batch = None
+                if len(self._batch) == 1:
+                    # Each batch has its own timer: on Python 2 a waiting
+                    # thread polls to see if it has been woken, so one
+                    # thread, woken for each batch, could flush it late
+                    self._timer = threading.Timer(self.max_wait_ms / 1000.0, self._flush, (self._batch,))
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        if batch:
+            self._call(batch)
+        return future
+
+    def _take(self):
+        # Must be called with the lock held
+        batch = self._batch
+        self._batch = list()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.batches += 1
+        self.items += len(batch)
+        return batch
+
+    def _flush(self, batch):
+        with self._lock:
+            # The batch may have been submitted once it was full
+            if self._batch is not batch:
+                return
+            batch = self._take()
+        self._call(batch)
+
+    def _call(self, batch):
+        # Values are batched per executor
+        executors = list()
+        groups = dict()
+        for item in batch:
+            key = id(item[0])
+            if key not in groups:
+                executors.append(item[0])
+                groups[key] = list()
+            groups[key].append(item)
+
+        for executor in executors:
+            self._submit(executor, groups[id(executor)])
+
+    def _submit(self, executor, items):
+        # Invocations whose futures have been cancelled are dropped, and
+        # the task is cancelled once every invocation waiting on it has
+        # been cancelled
+        items = [item for item in items if not item[3].cancelled()]
+        if not items:
+            return
+        futures = [item[3] for item in items]
+
+        def done(f):
+            if f.cancelled():
+                for future in futures:
+                    future.cancel()
+                return
+
+            ex = f.exception()
+            if ex is None:
+                results = f.result()
+                if len(results) != len(futures):
+                    ex = ValueError("Batch function returned %d results for %d values" % (len(results), len(futures)))
+            if ex is not None:
+                for future in futures:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(ex)
+                return
+
+            for future, result in zip(futures, results):
+                if future.set_running_or_notify_cancel():
+                    future.set_result(result)
+
+        try:
+            task_future = executor.submit(self._function, [item[1] for item in items], [item[2] for item in items])
+        except Exception as ex:
+            for future in futures:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(ex)
+            return
+
+        waiting = [len(futures)]
+        lock = threading.Lock()
+        def cancelled(f):
+            if not f.cancelled():
+                return
+            with lock:
+                waiting[0] -= 1
+                if waiting[0] > 0:
+                    return
+            task_future.cancel()
+
+        task_future.add_done_callback(done)
+        for future in futures:
+            future.add_done_callback(cancelled)
@@ -0,0 +1,179 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class _PendingValue(object):
+    """The futures of the callers waiting on a value that is being computed, and the computation's future once it has been submitted."""
+    __slots__ = ('waiters', 'task_future')
+
+    def __init__(self, waiter):
+        self.waiters = [waiter]
+        self.task_future = None
+
+
+#
+# A least recently used cache, whose entries can expire, of the
+# results of a component's function. The cache counts hits, misses and
+# evictions; expired entries are counted as evictions.
+#
+class ComponentCache(object):
+    def __init__(self, max_entries = None, ttl = None, clock = time.time):
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("Maximum number of entries must be positive")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<ComponentCache: entries = %d, hits = %d, misses = %d, evictions = %d>" % \
+               (len(self._entries), self.hits, self.misses, self.evictions)
+
+    def _lookup(self, key):
+        # Must be called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= self._clock():
+            self.evictions += 1
+            return None
+
+        # Most recently used entries are at the end
+        self._entries[key] = entry
+        return entry
+
+    def _store(self, key, value):
+        # Must be called with the lock held
+        self._entries.pop(key, None)
+        if self.max_entries is not None and len(self._entries) >= self.max_entries:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+        expiry = self._clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (expiry, value)
+
+    def get(self, key, function):
+        """Returns the cached value for the key, or calls the function and caches its value."""
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = function()
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def get_future(self, key, submit_function):
+        """Returns a future for the cached value of the key. On a miss the submit function is called to obtain a future for the value, which is cached when the future completes. A miss on a key whose value is already being computed returns a future that completes with that computation, and is counted as a hit. Each caller gets its own future, which it may cancel; the computation's future is cancelled once every caller waiting on it has cancelled theirs."""
+        future = Future()
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                future.set_result(entry[1])
+                return future
+
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.hits += 1
+                pending.waiters.append(future)
+                future.add_done_callback(lambda f: self._cancelled(key, pending, f))
+                return future
+
+            self.misses += 1
+            pending = _PendingValue(future)
+            self._pending[key] = pending
+        future.add_done_callback(lambda f: self._cancelled(key, pending, f))
+
+        def done(f):
+            with self._lock:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+                if not f.cancelled() and f.exception() is None:
+                    self._store(key, f.result())
+                waiters, pending.waiters = pending.waiters, list()
+
+            for waiter in waiters:
+                if f.cancelled():
+                    waiter.cancel()
+                elif not waiter.set_running_or_notify_cancel():
+                    continue
+                elif f.exception() is not None:
+                    waiter.set_exception(f.exception())
+                else:
+                    waiter.set_result(f.result())
+
+        try:
+            task_future = submit_function()
+        except Exception as ex:
+            with self._lock:
+                if self._pending.get(key) is pending:
+                    del self._pending[key]
+                waiters, pending.waiters = pending.waiters, list()
+            for waiter in waiters:
+                if waiter.set_running_or_notify_cancel():
+                    waiter.set_exception(ex)
+        else:
+            with self._lock:
+                pending.task_future = task_future
+                cancel = not pending.waiters
+            task_future.add_done_callback(done)
+            if cancel:
+                task_future.cancel()
+        return future
+
+    def _cancelled(self, key, pending, future):
+        # Once every caller has cancelled its future the computation
+        # is no longer wanted. It is forgotten, so that a later miss
+        # on the key starts a new one, and cancelled if it has been
+        # submitted.
+        if not future.cancelled():
+            return
+        with self._lock:
+            if future not in pending.waiters:
+                return
+            pending.waiters.remove(future)
+            if pending.waiters:
+                return
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            task_future = pending.task_future
+        if task_future is not None:
+            task_future.cancel()
+
+    def clear(self):
+        """Remove all the entries from the cache. The counts are not reset."""
+        with self._lock:
+            self._entries.clear()
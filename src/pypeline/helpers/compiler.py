@@ -0,0 +1,179 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
+from pypeline.core.types.state import State
+from pypeline.helpers.deadlines import check_deadline, get_deadline
+
+
+#
+# Pipeline compiler
+#
+# A pipeline structure is a tree of tuples recorded by the helper
+# constructors, see pypeline.helpers.helpers.ComponentArrow:
+#
+#   ('component', function, input_forming_function, output_forming_function, state_mutator, required_keys, name)
+#   ('wire', schema_conv_function, name)
+#   ('value_wire', value_function, name)
+#   ('dictionary_wire', conversions, name)
+#   ('split',)
+#   ('unsplit', unsplit_function, name)
+#   ('compose', (structure, ...))
+#   ('first', structure)
+#   ('second', structure)
+#   ('fanout', structure, structure)
+#   ('fanout_components', keys, (structure, ...))
+#   ('compiled', function, structure, instrumented_function)
+#   ('arrow', kleisli_arrow)
+#
+# The compiler generates the source of one Python function that
+# computes the whole pipeline. The value and state are held in the
+# locals 'a' and 's', and the user functions are called directly.
+# Dictionary wires are generated as dictionary displays. Arrows
+# without a recorded structure are run with the state monad.
+#
+# An instrumented pipeline checks the deadline of the run before each
+# component, and calls the component and wire functions with a call
+# function, call(name, function, *args), so that they can be timed. Its
+# dictionary wires are generated as functions too.
+#
+class PipelineCompiler(object):
+    def __init__(self, call = None):
+        self._namespace = {'KleisliArrow': KleisliArrow,
+                           'State': State,
+                           'check_deadline': check_deadline,
+                           'get_deadline': get_deadline}
+        self._lines = list()
+        self._no_temporaries = 0
+        self._call = self._name(call) if call is not None else None
+
+    def compile(self, structure):
+        self._emit(structure, "    ")
+        source = "def pipeline(a, s):\n%s    return (a, s)\n" % "".join(self._lines)
+        exec(compile(source, "<pipeline>", "exec"), self._namespace)
+        return self._namespace['pipeline']
+
+    def compile_dictionary_conversion(self, conversions):
+        source = "def dictionary_wire(a, s):\n    return %s\n" % self._dictionary(conversions)
+        exec(compile(source, "<dictionary wire>", "exec"), self._namespace)
+        return self._namespace['dictionary_wire']
+
+    def _name(self, obj):
+        name = "f%d" % len(self._namespace)
+        self._namespace[name] = obj
+        return name
+
+    def _temporary(self):
+        self._no_temporaries += 1
+        return "t%d" % self._no_temporaries
+
+    def _dictionary(self, conversions):
+        # The keys are constants in the namespace, so any hashable keys can be used
+        return "{%s}" % ", ".join(["%s: a[%s]" % (self._name(value), self._name(key))
+                                   for key, value in conversions.items()])
+
+    def _line(self, indent, line):
+        self._lines.append("%s%s\n" % (indent, line))
+
+    def _apply(self, name, function, arguments):
+        if self._call is None:
+            return "%s(%s)" % (self._name(function), arguments)
+        return "%s(%s, %s, %s)" % (self._call, self._name(name), self._name(function), arguments)
+
+    def _emit(self, structure, indent):
+        kind = structure[0]
+        if kind == 'component':
+            function, input_forming_function, output_forming_function, state_mutator = structure[1:5]
+            if self._call is not None:
+                self._line(indent, "check_deadline(get_deadline(), %s)" % self._name(structure[6]))
+            if input_forming_function:
+                self._line(indent, "a = %s(a, s)" % self._name(input_forming_function))
+            self._line(indent, "a = %s" % self._apply(structure[6], function, "a, s"))
+            if output_forming_function:
+                self._line(indent, "a = %s(a, s)" % self._name(output_forming_function))
+            if state_mutator:
+                self._line(indent, "s = %s(s)" % self._name(state_mutator))
+        elif kind == 'wire':
+            self._line(indent, "a = %s" % self._apply(structure[2], structure[1], "a, s"))
+        elif kind == 'value_wire':
+            self._line(indent, "a = %s" % self._apply(structure[2], structure[1], "a"))
+        elif kind == 'dictionary_wire':
+            if self._call is None:
+                self._line(indent, "a = %s" % self._dictionary(structure[1]))
+            else:
+                function = PipelineCompiler().compile_dictionary_conversion(structure[1])
+                self._line(indent, "a = %s" % self._apply(structure[2], function, "a, s"))
+        elif kind == 'split':
+            self._line(indent, "a = (a, a)")
+        elif kind == 'unsplit':
+            self._line(indent, "a = %s" % self._apply(structure[2], structure[1], "a[0], a[1]"))
+        elif kind == 'compose':
+            for child in structure[1]:
+                self._emit(child, indent)
+        elif kind == 'first':
+            other = self._temporary()
+            self._line(indent, "%s = a[1]" % other)
+            self._line(indent, "a = a[0]")
+            self._emit(structure[1], indent)
+            self._line(indent, "a = (a, %s)" % other)
+        elif kind == 'second':
+            other = self._temporary()
+            self._line(indent, "%s = a[0]" % other)
+            self._line(indent, "a = a[1]")
+            self._emit(structure[1], indent)
+            self._line(indent, "a = (%s, a)" % other)
+        elif kind == 'fanout':
+            input_a = self._temporary()
+            top = self._temporary()
+            self._line(indent, "%s = a" % input_a)
+            self._emit(structure[1], indent)
+            self._line(indent, "%s = a" % top)
+            self._line(indent, "a = %s" % input_a)
+            self._emit(structure[2], indent)
+            self._line(indent, "a = (%s, a)" % top)
+        elif kind == 'fanout_components':
+            keys, children = structure[1:3]
+            input_a = self._temporary()
+            outputs = list()
+            self._line(indent, "%s = a" % input_a)
+            for child in children:
+                self._line(indent, "a = %s" % input_a)
+                self._emit(child, indent)
+                outputs.append(self._temporary())
+                self._line(indent, "%s = a" % outputs[-1])
+            if keys is None:
+                self._line(indent, "a = (%s,)" % ", ".join(outputs))
+            else:
+                self._line(indent, "a = {%s}" % ", ".join(["%s: %s" % (self._name(key), output)
+                                                            for key, output in zip(keys, outputs)]))
+        elif kind == 'compiled':
+            self._emit(structure[2], indent)
+        elif kind == 'arrow':
+            self._line(indent, "a, s = State.runState(KleisliArrow.runKleisli(%s, a), s)" % self._name(structure[1]))
+        else:
+            raise ValueError("Unknown pipeline structure [%s]" % kind)
+
+
+def compile_structure(structure, call = None):
+    """Returns a function, taking a value and a state, that computes the pipeline described by the structure and returns a value/state pair. If a call function is given the deadline of the run is checked before each component, and the component and wire functions are called with the call function, see PipelineCompiler."""
+    return PipelineCompiler(call).compile(structure)
+
+
+def compile_dictionary_conversion(conversions):
+    """Returns a function, taking a value and a state, that converts the value's dictionary with the conversions. The new dictionary is built by one generated dictionary display."""
+    return PipelineCompiler().compile_dictionary_conversion(conversions)
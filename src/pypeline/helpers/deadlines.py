@@ -0,0 +1,68 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+
+from concurrent.futures import TimeoutError
+
+
+#
+# The deadline of the pipeline run whose component is being computed,
+# or scheduled, on this thread. A deadline is a time, in seconds since
+# the epoch, as returned by time.time().
+#
+__deadline = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The deadline of a pipeline run passed before one of its components was computed. The remaining components of the run are not computed."""
+    def __init__(self, deadline, name):
+        TimeoutError.__init__(self, "Deadline passed before component [%s]" % name)
+        self.deadline = deadline
+        self.name = name
+
+    def __reduce__(self):
+        return (DeadlineExceeded, (self.deadline, self.name))
+
+
+def get_deadline():
+    """Returns the deadline of the pipeline run computing the calling component, or None if it has no deadline."""
+    return getattr(__deadline, 'deadline', None)
+
+
+def get_remaining_time():
+    """Returns the number of seconds until the deadline of the pipeline run computing the calling component, or None if it has no deadline. The remaining time is negative once the deadline has passed."""
+    deadline = get_deadline()
+    return deadline - time.time() if deadline is not None else None
+
+
+def check_deadline(deadline, name):
+    """Raise DeadlineExceeded if the deadline has passed."""
+    if deadline is not None and time.time() >= deadline:
+        raise DeadlineExceeded(deadline, name)
+
+
+def call_with_deadline(deadline, function, *args):
+    """Call the function with the deadline visible to it, and to the functions it calls, on this thread."""
+    previous_deadline = getattr(__deadline, 'deadline', None)
+    __deadline.deadline = deadline
+    try:
+        return function(*args)
+    finally:
+        __deadline.deadline = previous_deadline
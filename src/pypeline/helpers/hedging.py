@@ -0,0 +1,74 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import collections
+import math
+import threading
+
+
+#
+# Decides when a duplicate, or hedged, call of a component with heavy
+# tailed latency is made. The latencies of recent calls are recorded,
+# and a call that has not completed within the given percentile of
+# these latencies is hedged, so roughly (100 - percentile)% of calls
+# are made twice. No call is hedged until enough latencies have been
+# recorded.
+#
+class ComponentHedger(object):
+    def __init__(self, percentile, window = 100, min_samples = 10):
+        if not 0 < percentile < 100:
+            raise ValueError("Percentile must be between 0 and 100")
+        if window < 1:
+            raise ValueError("Window must be positive")
+        if not 0 < min_samples <= window:
+            raise ValueError("Minimum samples must be positive, and no more than the window")
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = collections.deque(maxlen = window)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ComponentHedger: calls = %d, hedges = %d, hedge wins = %d>" % (self.calls, self.hedges, self.hedge_wins)
+
+    def get_delay(self):
+        """Count a call, and return the number of seconds after which it is hedged, or None if it shall not be hedged."""
+        with self._lock:
+            self.calls += 1
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = int(math.ceil(self.percentile / 100.0 * len(latencies))) - 1
+        return latencies[max(index, 0)]
+
+    def record(self, latency):
+        """Record the latency, in seconds, of a completed call."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def hedged(self):
+        with self._lock:
+            self.hedges += 1
+
+    def won(self):
+        """Count a hedged call that completed before the original call."""
+        with self._lock:
+            self.hedge_wins += 1
@@ -16,25 +16,165 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
+import operator
+import os
 import subprocess
+import threading
+import time
 import types
+import Queue
 
 from pypeline.core.arrows.kleisli_arrow import KleisliArrow, split, unsplit
 from pypeline.core.types.state import State, return_
+from pypeline.helpers.cache import ComponentCache
+from pypeline.helpers.compiler import compile_dictionary_conversion, compile_structure
+from pypeline.helpers.deadlines import call_with_deadline, check_deadline, get_deadline
+from pypeline.helpers.instrumentation import get_component_name
+from pypeline.helpers.subprocesses import SubprocessPool
+
+
+#
+# The hooks given to the run, evaluate or execute function that is
+# computing a pipeline on this thread.
+#
+__instrumentation = threading.local()
+
+
+def __call_timed(hooks, name, function, *args):
+    start = time.time()
+    try:
+        return function(*args)
+    finally:
+        wall_time = time.time() - start
+        for hook in hooks:
+            hook(name, 0.0, wall_time)
+
+
+def __call_instrumented(name, function, *args):
+    """Call a component's, or wire's, function, timing it if there are hooks. Instrumented compiled pipelines, which check the deadline of the run too, call their functions with this."""
+    hooks = getattr(__instrumentation, 'hooks', None)
+    if hooks:
+        return __call_timed(hooks, name, function, *args)
+    return function(*args)
+
+
+def __call_with_hooks(hooks, function, *args):
+    """Call the function with the hooks given to the components it computes on this thread."""
+    previous_hooks = getattr(__instrumentation, 'hooks', None)
+    __instrumentation.hooks = hooks
+    try:
+        return function(*args)
+    finally:
+        __instrumentation.hooks = previous_hooks
+
+
+class ComponentArrow(KleisliArrow):
+    """A Kleisli arrow that records the structure of the components, wires and operators it was built from. The structure is used to compile a pipeline, see compile_pipeline()."""
+    __slots__ = ('_structure',)
+
+    def __init__(self, patcher, f, structure):
+        KleisliArrow.__init__(self, patcher, f)
+        self._structure = structure
+
+    @staticmethod
+    def _from_arrow(arrow, structure):
+        component = ComponentArrow(arrow._patcher, arrow._func, structure)
+        component._stages = arrow._stages
+        return component
+
+    @staticmethod
+    def _get_structure(arrow):
+        return arrow._structure if isinstance(arrow, ComponentArrow) else ('arrow', arrow)
+
+    @staticmethod
+    def _get_composed_structures(arrow):
+        structure = ComponentArrow._get_structure(arrow)
+        return structure[1] if structure[0] == 'compose' else (structure,)
+
+    @staticmethod
+    def _push_down(left, right):
+        """Returns the dictionary wire that replaces the left dictionary wire, and the right one if that is a dictionary wire too, or None. Consecutive dictionary wires are fused into one, and a wire before a component with required keys only builds those keys."""
+        if left[0] != 'dictionary_wire':
+            return None
+
+        conversions, name = left[1], left[2]
+        if right[0] == 'dictionary_wire':
+            sources = {value: key for key, value in conversions.items()}
+            if not all(key in sources for key in right[1]):
+                return None
+            fused = {sources[key]: value for key, value in right[1].items()}
+            return cons_dictionary_wire(fused, name if name == right[2] else "%s >> %s" % (name, right[2]))
+        elif right[0] == 'component' and right[5] is not None:
+            pruned = {key: value for key, value in conversions.items() if value in right[5]}
+            if len(pruned) < len(conversions):
+                return cons_dictionary_wire(pruned, name)
+        return None
+
+    def __rshift__(self, other):
+        left = ComponentArrow._get_composed_structures(self)
+        right = ComponentArrow._get_composed_structures(other)
+        wire = ComponentArrow._push_down(left[-1], right[0])
+        if wire is None:
+            return ComponentArrow._from_arrow(KleisliArrow.__rshift__(self, other), ('compose', left + right))
+
+        # Replace the stage of the wire at the end of this arrow, and
+        # the stage of a fused wire at the start of the other arrow
+        skip = 1 if right[0][0] == 'dictionary_wire' else 0
+        arrow = KleisliArrow._from_stages(other._patcher, self._stages[:-1] + wire._stages + other._stages[skip:])
+        return ComponentArrow._from_arrow(arrow, ('compose', left[:-1] + (wire._structure,) + right[skip:]))
+
+    def __and__(self, other):
+        structure = ('fanout', self._structure, ComponentArrow._get_structure(other))
+        return ComponentArrow._from_arrow(KleisliArrow.__and__(self, other), structure)
+
+    def first(self):
+        return ComponentArrow._from_arrow(KleisliArrow.first(self), ('first', self._structure))
+
+    def second(self):
+        return ComponentArrow._from_arrow(KleisliArrow.second(self), ('second', self._structure))
+
+
+class CachedComponentArrow(ComponentArrow):
+    """A component whose function's results are cached. The cache holds the hit, miss and eviction counts."""
+    __slots__ = ('cache',)
+
+    def __init__(self, patcher, f, structure, cache):
+        ComponentArrow.__init__(self, patcher, f, structure)
+        self.cache = cache
+
+
+class SubprocessComponentArrow(ComponentArrow):
+    """A component computed by a pool of worker processes. The pool holds the request and restart counts, and is closed to stop the processes."""
+    __slots__ = ('pool',)
+
+    def __init__(self, patcher, f, structure, pool):
+        ComponentArrow.__init__(self, patcher, f, structure)
+        self.pool = pool
 
 
 def cons_function_component(function,
                             input_forming_function = None,
                             output_forming_function = None,
-                            state_mutator = None):
-    """Construct a pipeline component whose computation will be achieved using a function. Optional input and output forming functions pre- and post-process the input and output values to and from the function. An optional state mutator function can be provided to alter the state object passed into one of the pipeline run/evaluating/executing functions. A Kleisli arrow is returned."""
+                            state_mutator = None,
+                            name = None,
+                            required_keys = None):
+    """Construct a pipeline component whose computation will be achieved using a function. Optional input and output forming functions pre- and post-process the input and output values to and from the function. An optional state mutator function can be provided to alter the state object passed into one of the pipeline run/evaluating/executing functions. The component's name, by default the function's name, is given to instrumentation hooks. If the component's input is a dictionary the keys it reads can be declared with required_keys, and a dictionary wire composed before the component only builds those keys. A Kleisli arrow is returned."""
+    name = get_component_name(function, name)
+
     def bind_function(a):
         def state_function(s):
+            # Late runs are abandoned
+            check_deadline(get_deadline(), name)
+
             # Transform the input
             transformed_a = input_forming_function(a, s) if input_forming_function else a
 
             # Apply
-            new_a = function(transformed_a, s)
+            hooks = getattr(__instrumentation, 'hooks', None)
+            if hooks:
+                new_a = __call_timed(hooks, name, function, transformed_a, s)
+            else:
+                new_a = function(transformed_a, s)
 
             # Transform the output of the function
             transformed_new_a = output_forming_function(new_a, s) if output_forming_function else new_a
@@ -46,31 +186,113 @@ def cons_function_component(function,
             return (transformed_new_a, next_s)
         return State(state_function)
 
-    return KleisliArrow(return_, bind_function)
-
+    required_keys = frozenset(required_keys) if required_keys is not None else None
+    structure = ('component', function, input_forming_function, output_forming_function, state_mutator, required_keys, name)
+    return ComponentArrow(return_, bind_function, structure)
+
+
+def cons_cached_component(function,
+                          key_function = None,
+                          max_entries = None,
+                          ttl = None,
+                          input_forming_function = None,
+                          output_forming_function = None,
+                          state_mutator = None,
+                          name = None,
+                          required_keys = None):
+    """Construct a pipeline component based on a pure function whose results are cached. The key function takes the formed input and the state and returns the hashable cache key; by default the formed input is the key. The least recently used entry is evicted when the cache holds max_entries, and entries expire ttl seconds after they are cached. On a hit the function is not called. The returned Kleisli arrow's cache attribute holds the hit, miss and eviction counts."""
+    cache = ComponentCache(max_entries, ttl)
+    get_key = key_function if key_function else lambda a, s: a
+
+    def cached_function(a, s):
+        return cache.get(get_key(a, s), lambda: function(a, s))
+
+    component = cons_function_component(cached_function,
+                                        input_forming_function,
+                                        output_forming_function,
+                                        state_mutator,
+                                        get_component_name(function, name),
+                                        required_keys)
+    return CachedComponentArrow(component._patcher, component._func, component._structure, cache)
+
+
+def cons_subprocess_component(args,
+                              pool_size = 1,
+                              encoder = None,
+                              decoder = None,
+                              input_forming_function = None,
+                              output_forming_function = None,
+                              state_mutator = None,
+                              name = None):
+    """Construct a pipeline component computed by long-lived worker processes, started with the command line args, that use a line protocol: for each line written to a process's standard input it writes one line to its standard output. The encoder converts the formed input to one line, by default with str, and the decoder converts the process's line, without its line terminator, to the output. A worker process that exits is restarted, and the requests it had not responded to fail with an IOError. The returned Kleisli arrow's pool attribute holds the request and restart counts, and the pool must be closed to stop the worker processes."""
+    pool = SubprocessPool(args, pool_size, encoder, decoder)
+
+    def subprocess_function(a, s):
+        return pool.submit(a).result()
+
+    component = cons_function_component(subprocess_function,
+                                        input_forming_function,
+                                        output_forming_function,
+                                        state_mutator,
+                                        name if name is not None else os.path.basename(args[0]))
+    return SubprocessComponentArrow(component._patcher, component._func, component._structure, pool)
+
+
+def cons_wire(schema_conv_function, name = None):
+    """Construct a wire. A wire is a Kleisli arrow that converts data from from one pipeline component's output schema to another pipeline component's input schema. A wire built from an operator.itemgetter, attrgetter or methodcaller is called with the value only."""
+    name = get_component_name(schema_conv_function, name)
+
+    if is_value_function(schema_conv_function):
+        def value_bind_function(a):
+            def value_state_function(s):
+                hooks = getattr(__instrumentation, 'hooks', None)
+                if hooks:
+                    return (__call_timed(hooks, name, schema_conv_function, a), s)
+                return (schema_conv_function(a), s)
+            return State(value_state_function)
+        return ComponentArrow(return_, value_bind_function, ('value_wire', schema_conv_function, name))
 
-def cons_wire(schema_conv_function):
-    """Construct a wire. A wire is a Kleisli arrow that converts data from from one pipeline component's output schema to another pipeline component's input schema."""
     def bind_function(a):
         def state_function(s):
+            hooks = getattr(__instrumentation, 'hooks', None)
+            if hooks:
+                return (__call_timed(hooks, name, schema_conv_function, a, s), s)
             return (schema_conv_function(a, s), s)
         return State(state_function)
-    return KleisliArrow(return_, bind_function)
+    return ComponentArrow(return_, bind_function, ('wire', schema_conv_function, name))
 
 
-def cons_dictionary_wire(conversions):
-    """Construct a wire that converts between two dictionaries. The keys of the conversions dictionary are keys in the output dictionary, of the preceeding component, whose values will be used to populate a dictionary whose keys are the value of the conversions dictionary.\n\nE.g., output = {'int': 9, 'string': 'hello'}, and conversions = {'int': 'int_two', 'string': 'string_two'}, yields an input dictionary, to the next component, input = {'int_two': 9, 'string_two': 'hello'}."""
-    return cons_wire(get_dictionary_conversion_function(conversions))
+def cons_dictionary_wire(conversions, name = None):
+    """Construct a wire that converts between two dictionaries. The keys of the conversions dictionary are keys in the output dictionary, of the preceeding component, whose values will be used to populate a dictionary whose keys are the value of the conversions dictionary.\n\nE.g., output = {'int': 9, 'string': 'hello'}, and conversions = {'int': 'int_two', 'string': 'string_two'}, yields an input dictionary, to the next component, input = {'int_two': 9, 'string_two': 'hello'}.\n\nComposed dictionary wires are fused into one wire, and only the keys required by a following component are built."""
+    function = get_dictionary_conversion_function(conversions)
+    wire = cons_wire(function, name)
+    return ComponentArrow(return_, wire._func, ('dictionary_wire', dict(conversions), get_component_name(function, name)))
 
 
 def cons_split_wire():
     """Construct a wire that duplicates its input and produces a pair from this value. See: ***, first, second, and unsplit arrow operators."""
-    return split(return_)
+    return ComponentArrow._from_arrow(split(return_), ('split',))
 
 
-def cons_unsplit_wire(unsplit_func):
+def cons_unsplit_wire(unsplit_func, name = None):
     """Construct a wire that takes a pair and applies a function to this pair to combine them into one value."""
-    return unsplit(return_, unsplit_func)
+    name = get_component_name(unsplit_func, name)
+
+    def instrumented_unsplit_func(b, c):
+        hooks = getattr(__instrumentation, 'hooks', None)
+        if hooks:
+            return __call_timed(hooks, name, unsplit_func, b, c)
+        return unsplit_func(b, c)
+
+    return ComponentArrow._from_arrow(unsplit(return_, instrumented_unsplit_func), ('unsplit', unsplit_func, name))
+
+
+def cons_join_wire(join_function, name = None):
+    """Construct a wire that takes the tuple, or dictionary, of a fan-out component's outputs and applies a function to combine them into one value. The function is called with the tuple's values as positional arguments, or with the dictionary's items as keyword arguments. See cons_fanout_component()."""
+    def join_wire_function(a, s):
+        return join_function(**a) if isinstance(a, dict) else join_function(*a)
+
+    return cons_wire(join_wire_function, get_component_name(join_function, name))
 
 
 def cons_wired_components(component_one, component_two, wire):
@@ -93,11 +315,62 @@ def cons_parallel_component(top_component, bottom_component):
     return top_component ** bottom_component
 
 
+def get_fanout_components(components):
+    """Returns the keys, or None, and the components of the components list, tuple or dictionary of a fan-out component."""
+    if isinstance(components, dict):
+        keys = tuple(components.keys())
+        components = tuple([components[key] for key in keys])
+    else:
+        keys = None
+        components = tuple(components)
+
+    if not components:
+        raise ValueError("Fan-out must have at least one component")
+    for component in components:
+        if not isinstance(component, KleisliArrow):
+            raise ValueError("Fan-out components must be KleisliArrows")
+    return keys, components
+
+
+def cons_fanout_component(components):
+    """Construct a component that computes each of the provided components with the same input. If the components are given as a list, or tuple, the component returns a flat tuple of their outputs, in the same order. If they are given as a dictionary it returns a dictionary of their outputs with the same keys. The state is passed through the components in turn. See cons_join_wire()."""
+    keys, components = get_fanout_components(components)
+
+    def bind_function(a):
+        def state_function(s):
+            outputs = list()
+            for component in components:
+                b, s = State.runState(KleisliArrow.runKleisli(component, a), s)
+                outputs.append(b)
+            return (dict(zip(keys, outputs)) if keys is not None else tuple(outputs), s)
+        return State(state_function)
+
+    structure = ('fanout_components', keys, tuple([ComponentArrow._get_structure(component) for component in components]))
+    return ComponentArrow(return_, bind_function, structure)
+
+
+def compile_pipeline(pipeline):
+    """Compile a pipeline into one generated Python function that calls the component, wire and state mutator functions directly, passing the value and state as local variables. Parts of the pipeline that were not constructed with these helper functions are run as Kleisli arrows. A Kleisli arrow is returned that computes the same results as the given pipeline, and can be run, evaluated or executed like any other pipeline."""
+    structure = ComponentArrow._get_structure(pipeline)
+    function = compile_structure(structure)
+    instrumented_function = compile_structure(structure, __call_instrumented)
+    def bind_function(a):
+        def state_function(s):
+            # Runs with hooks time every component and wire, and runs
+            # with a deadline check it before every component
+            if getattr(__instrumentation, 'hooks', None) or get_deadline() is not None:
+                return instrumented_function(a, s)
+            return function(a, s)
+        return State(state_function)
+
+    return ComponentArrow(return_, bind_function, ('compiled', function, structure, instrumented_function))
+
+
 def __kleisli_wrapper(f):
-    def wrapper(pipeline, input, state):
-        """Run, evaluate, or execute a pipeline."""
+    def wrapper(pipeline, input, state, hooks = None, deadline = None):
+        """Run, evaluate, or execute a pipeline. If hooks are given each hook is called with the name, queue time and wall time of every component's function call. If a deadline, a time as returned by time.time(), is given no component is computed after it has passed, and DeadlineExceeded is raised instead. Components can read the deadline with pypeline.helpers.deadlines.get_deadline()."""
         state_monad = KleisliArrow.runKleisli(pipeline, input)
-        return f(state_monad, state)
+        return __call_with_hooks(hooks, call_with_deadline, deadline, f, state_monad, state)
     return wrapper
 
 
@@ -116,6 +389,101 @@ def exec_pipeline(state_monad, state):
     return State.execState(state_monad, state)
 
 
+def __get_pipeline_function(pipeline, instrumented = False):
+    structure = ComponentArrow._get_structure(pipeline)
+    if structure[0] == 'compiled':
+        return structure[3] if instrumented else structure[1]
+    return compile_structure(structure, __call_instrumented if instrumented else None)
+
+
+def __batch_wrapper(f):
+    def wrapper(pipeline, inputs, state, thread_state = False, hooks = None, deadline = None):
+        """Run, evaluate, or execute a pipeline over each of the inputs. The pipeline is compiled once for the whole batch. If thread_state is true the resultant state of one input is the initial state of the next, otherwise every input is computed with the given initial state. If hooks are given each hook is called with the name, queue time and wall time of every component's function call. If a deadline is given no component is computed after it has passed, and DeadlineExceeded is raised instead."""
+        function = __get_pipeline_function(pipeline, bool(hooks) or deadline is not None)
+        def run_batch(state):
+            results = list()
+            for input in inputs:
+                result = function(input, state)
+                if thread_state:
+                    state = result[1]
+                results.append(result)
+            return results
+        return f(__call_with_hooks(hooks, call_with_deadline, deadline, run_batch, state))
+    return wrapper
+
+
+@__batch_wrapper
+def run_pipeline_batch(results):
+    return results
+
+
+@__batch_wrapper
+def eval_pipeline_batch(results):
+    return [result[0] for result in results]
+
+
+@__batch_wrapper
+def exec_pipeline_batch(results):
+    return [result[1] for result in results]
+
+
+def stream_pipeline(pipeline, inputs, state, read_ahead = 0, hooks = None, deadline = None):
+    """Lazily evaluate a pipeline over an iterable of inputs, yielding each output as soon as its input has been computed. The resultant state of one input is the initial state of the next. If read_ahead is greater than zero a thread reads up to that many inputs ahead of the pipeline, otherwise inputs are read only when the next output is requested. If hooks are given each hook is called with the name, queue time and wall time of every component's function call. If a deadline is given no component is computed after it has passed, and DeadlineExceeded is raised instead."""
+    function = __get_pipeline_function(pipeline, bool(hooks) or deadline is not None)
+    if read_ahead > 0:
+        inputs = __read_ahead(inputs, read_ahead)
+    for input in inputs:
+        value, state = __call_with_hooks(hooks, call_with_deadline, deadline, function, input, state)
+        yield value
+
+
+def __read_ahead(inputs, size):
+    queue = Queue.Queue(size)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        # The reader stops once the stream is abandoned, rather than
+        # waiting forever for a full queue to be drained
+        while not stopped.is_set():
+            try:
+                queue.put(item, timeout = 0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for input in inputs:
+                if not put((input, None)):
+                    return
+        except Exception as ex:
+            put((end, ex))
+        else:
+            put((end, None))
+
+    thread = threading.Thread(target = reader)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            input, ex = queue.get()
+            if input is end:
+                if ex:
+                    raise ex
+                return
+            yield input
+    finally:
+        # Stop the reader if the stream is abandoned
+        stopped.set()
+
+
+def is_value_function(function):
+    """Returns true if the wire function is an operator.itemgetter, attrgetter or methodcaller. These are called, without the state, directly by the wire."""
+    return isinstance(function, (operator.itemgetter, operator.attrgetter, operator.methodcaller))
+
+
 def get_dictionary_conversion_function(conversions):
-    """Returns a function that completes the dictionary conversions as part of a wire."""
-    return lambda a, _: {conversions[key]: a[key] for key in conversions}
+    """Returns a function that completes the dictionary conversions as part of a wire. The function is generated, so that it builds the new dictionary without looking up the conversions."""
+    return compile_dictionary_conversion(conversions)
@@ -0,0 +1,75 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+
+from collections import namedtuple
+
+
+#
+# Instrumentation of pipeline components. The run, evaluate and
+# execute functions take a sequence of hooks; every hook is called with
+# a component's name, the time its function call waited to be started
+# and the time the function took, in seconds, each time a component's
+# function is called.
+#
+#   hook :: name -> queue_time -> wall_time -> ()
+#
+ComponentTiming = namedtuple('ComponentTiming', ['calls', 'wall_time', 'queue_time'])
+
+
+class ComponentTimings(object):
+    """A hook that totals, for each component name, the number of calls, wall time and queue time."""
+    def __init__(self):
+        self._timings = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, name, queue_time, wall_time):
+        with self._lock:
+            calls, total_wall_time, total_queue_time = self._timings.get(name, (0, 0.0, 0.0))
+            self._timings[name] = ComponentTiming(calls + 1,
+                                                  total_wall_time + wall_time,
+                                                  total_queue_time + queue_time)
+
+    def __getitem__(self, name):
+        return self._timings[name]
+
+    def __contains__(self, name):
+        return name in self._timings
+
+    def __len__(self):
+        return len(self._timings)
+
+    def __repr__(self):
+        return "<ComponentTimings: %s>" % ", ".join(["%s = %r" % item for item in self.items()])
+
+    def items(self):
+        """Returns a list of name and timing pairs, ordered by descending wall time."""
+        with self._lock:
+            return sorted(self._timings.items(), key = lambda item: item[1].wall_time, reverse = True)
+
+    def clear(self):
+        with self._lock:
+            self._timings.clear()
+
+
+def get_component_name(function, name = None):
+    """Returns the name of a component: the given name, otherwise the name of the component's function."""
+    if name is not None:
+        return name
+    return getattr(function, '__name__', repr(function))
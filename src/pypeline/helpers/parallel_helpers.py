@@ -16,12 +16,24 @@
 # You should have received a copy of the GNU Lesser General Public License
 # along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
 #
-from concurrent.futures import Future
+import collections
+import functools
+import os
+import pickle
+import threading
+import time
+
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
 from pypeline.core.arrows.kleisli_arrow import KleisliArrow, split, unsplit
-from pypeline.core.arrows.kleisli_arrow_choice import KleisliArrowChoice
-from pypeline.core.types.either import Either, Left, Right
 from pypeline.core.types.state import State, return_
-from pypeline.helpers.helpers import get_dictionary_conversion_function
+from pypeline.helpers.batching import ComponentBatcher
+from pypeline.helpers.cache import ComponentCache
+from pypeline.helpers.deadlines import DeadlineExceeded, call_with_deadline, check_deadline, get_deadline
+from pypeline.helpers.hedging import ComponentHedger
+from pypeline.helpers.helpers import get_dictionary_conversion_function, get_fanout_components, is_value_function
+from pypeline.helpers.instrumentation import get_component_name
+from pypeline.helpers.subprocesses import SubprocessPool
+from pypeline.helpers.timers import TimerQueue
 
 
 #
@@ -31,74 +43,908 @@ Future.__getitem__ = lambda f, key: (f.result())[key]
 
 
 class WrappedState(object):
-    def __init__(self, executor, state):
+    __slots__ = ('executor', 'state', 'hooks', 'run')
+
+    def __init__(self, executor, state, hooks = None, run = None):
         self.executor = executor
         self.state = state
+        self.hooks = hooks
+        self.run = run
+
+
+class ComponentError(Exception):
+    """A component of a pipeline run failed. The component's name, the input it was given and the exception that it raised are held."""
+    def __init__(self, name, input, cause):
+        input_repr = repr(input)
+        if len(input_repr) > 200:
+            input_repr = input_repr[:197] + "..."
+        Exception.__init__(self, "Component [%s] failed with input %s: %s: %s" % (name, input_repr, type(cause).__name__, cause))
+        self.name = name
+        self.input = input
+        self.cause = cause
+
+
+class PipelineRun(object):
+    """The deadline and failure of one run of a pipeline, and its tasks submitted to the executor that have not completed. The first failure of a run cancels its tasks that have not started, and its components that have not been submitted never are."""
+    __slots__ = ('deadline', 'failure', '_tasks', '_callbacks', '_lock')
+
+    def __init__(self, deadline = None):
+        self.deadline = deadline
+        self.failure = None
+        self._tasks = set()
+        self._callbacks = list()
+        self._lock = threading.Lock()
+
+    def add_task(self, future):
+        """Add an executor's future, or a future for a task that other runs share, which is cancelled if the run fails before it completes."""
+        with self._lock:
+            if self.failure is None:
+                self._tasks.add(future)
+                future.add_done_callback(self._tasks.discard)
+                return
+        future.cancel()
+
+    def add_failure_callback(self, callback):
+        """Call back with the run's failure as soon as it fails."""
+        with self._lock:
+            if self.failure is None:
+                self._callbacks.append(callback)
+                return
+        callback(self.failure)
+
+    def fail(self, ex):
+        with self._lock:
+            if self.failure is not None:
+                return
+            self.failure = ex
+            tasks, self._tasks = list(self._tasks), set()
+            callbacks, self._callbacks = self._callbacks, list()
+
+        for task in tasks:
+            task.cancel()
+        for callback in callbacks:
+            callback(ex)
+
+
+class ParallelComponentArrow(KleisliArrow):
+    """A Kleisli arrow built by these helpers. Composing it with another arrow fuses a function component, or wire, at the end of one with one at the start of the other, so a linear chain of them is submitted to the executor as one task."""
+    __slots__ = ()
+
+    @staticmethod
+    def _compose(left, right):
+        """Compose two Kleisli arrows. A task that is submitted to the executor is not fused after inline tasks, which are called before it by the thread that made their input available."""
+        if not isinstance(left, KleisliArrow) or not isinstance(right, KleisliArrow):
+            raise ValueError("Must be an KleisliArrow")
+
+        last, first = left._stages[-1], right._stages[0]
+        left_tasks = getattr(last, 'tasks', None)
+        right_tasks = getattr(first, 'tasks', None)
+        if left_tasks and right_tasks and (right_tasks[0].inline or not left_tasks[-1].inline):
+            stages = left._stages[:-1] + (last.fuse(first),) + right._stages[1:]
+        else:
+            stages = left._stages + right._stages
+
+        arrow = KleisliArrow._from_stages(right._patcher, stages)
+        component = ParallelComponentArrow(arrow._patcher, arrow._func)
+        component._stages = arrow._stages
+        return component
+
+    @staticmethod
+    def _get_item(value, key):
+        """Index the value. The item of a future is another future that completes when the indexed future completes, so that the thread scheduling the components is never blocked."""
+        if not isinstance(value, Future):
+            return value[key]
+
+        item_future = Future()
+        def done(f):
+            try:
+                item = f.result()[key]
+            except Exception as ex:
+                item_future.set_exception(ex)
+            else:
+                item_future.set_result(item)
+        value.add_done_callback(done)
+        return item_future
+
+    def __rshift__(self, other):
+        return ParallelComponentArrow._compose(self, other)
+
+    def __rrshift__(self, other):
+        return ParallelComponentArrow._compose(other, self)
+
+    def __and__(self, other):
+        arrow = KleisliArrow.__and__(self, other)
+        return ParallelComponentArrow(arrow._patcher, arrow._func)
+
+    # first (K f) = K(\(b, d) -> f b >>= \c -> return (c, d))
+    def first(self):
+        get_item = ParallelComponentArrow._get_item
+        func = lambda t: self._func(get_item(t, 0)) >= (lambda c: self._patcher((c, get_item(t, 1))))
+        return ParallelComponentArrow(self._patcher, func)
+
+    # second (K f) = K(\(d, b) -> f b >>= \c -> return (d, c))
+    def second(self):
+        get_item = ParallelComponentArrow._get_item
+        func = lambda t: self._func(get_item(t, 1)) >= (lambda c: self._patcher((get_item(t, 0), c)))
+        return ParallelComponentArrow(self._patcher, func)
+
+
+class CachedComponentArrow(ParallelComponentArrow):
+    """A component whose function's results are cached. The cache holds the hit, miss and eviction counts."""
+    __slots__ = ('cache',)
+
+    def __init__(self, patcher, f, cache):
+        ParallelComponentArrow.__init__(self, patcher, f)
+        self.cache = cache
+
+
+class BatchingComponentArrow(ParallelComponentArrow):
+    """A component whose invocations are gathered into batches. The batcher holds the batch and item counts."""
+    __slots__ = ('batcher',)
+
+    def __init__(self, patcher, f, batcher):
+        ParallelComponentArrow.__init__(self, patcher, f)
+        self.batcher = batcher
+
+
+class HedgingComponentArrow(ParallelComponentArrow):
+    """A component whose slow calls are hedged. The hedger holds the call, hedge and hedge win counts."""
+    __slots__ = ('hedger',)
+
+    def __init__(self, patcher, f, hedger):
+        ParallelComponentArrow.__init__(self, patcher, f)
+        self.hedger = hedger
+
+
+class SubprocessComponentArrow(ParallelComponentArrow):
+    """A component computed by a pool of worker processes. The pool holds the request and restart counts, and is closed to stop the processes."""
+    __slots__ = ('pool',)
+
+    def __init__(self, patcher, f, pool):
+        ParallelComponentArrow.__init__(self, patcher, f)
+        self.pool = pool
+
+
+def __get_futures(value):
+    if isinstance(value, Future):
+        return [value]
+    elif isinstance(value, tuple):
+        return [future for v in value for future in __get_futures(v)]
+    return []
+
+
+def __get_result(value):
+    if isinstance(value, Future):
+        return value.result()
+    elif isinstance(value, tuple):
+        return tuple([__get_result(v) for v in value])
+    return value
+
+
+__trampoline = threading.local()
+
+
+def __defer(function):
+    """Call the function, unless this thread is already calling a deferred function, in which case the function is queued and called after it. Futures that complete as soon as a callback is added would otherwise call the next component's callbacks recursively, and deep pipelines would exhaust the stack."""
+    queue = getattr(__trampoline, 'queue', None)
+    if queue is not None:
+        queue.append(function)
+        return
+
+    queue = __trampoline.queue = collections.deque([function])
+    try:
+        while queue:
+            queue.popleft()()
+    finally:
+        __trampoline.queue = None
+
+
+def __when_ready(value, callback):
+    """Call back with the value, whose futures are replaced with their results, once every future in the value has completed. If any future has failed the callback is given the exception instead."""
+    def ready():
+        try:
+            the_value = __get_result(value)
+        except Exception as ex:
+            callback(None, ex)
+        else:
+            callback(the_value, None)
+
+    futures = __get_futures(value)
+    if not futures:
+        ready()
+    elif len(futures) == 1:
+        futures[0].add_done_callback(lambda _: __defer(ready))
+    else:
+        lock = threading.Lock()
+        pending = [len(futures)]
+        def done(_):
+            with lock:
+                pending[0] -= 1
+                is_ready = pending[0] == 0
+            if is_ready:
+                __defer(ready)
+        for future in futures:
+            future.add_done_callback(done)
+
+
+#
+# The pipeline run whose component is being submitted on this thread
+#
+__current_run = threading.local()
+
+
+def __call_in_run(run, function, *args):
+    """Call the function with the run's tasks submitted by __submit, and its deadline, visible to it on this thread."""
+    if run is None:
+        return function(*args)
+
+    previous_run = getattr(__current_run, 'run', None)
+    __current_run.run = run
+    try:
+        if run.deadline is None:
+            return function(*args)
+        return call_with_deadline(run.deadline, function, *args)
+    finally:
+        __current_run.run = previous_run
+
+
+def __set_result(future, result):
+    """Complete a future created by these helpers, unless it has been cancelled."""
+    if future.set_running_or_notify_cancel():
+        future.set_result(result)
+
+
+def __set_exception(future, ex):
+    if future.set_running_or_notify_cancel():
+        future.set_exception(ex)
+
+
+def __runs_in_parent(executor):
+    """Wires, and other closures built by these helpers, cannot be sent to a process pool and are computed by the parent process."""
+    return isinstance(executor, ProcessPoolExecutor)
+
+
+def __timed_call(function, a, s):
+    """Call the function, and return its value with the times at which it was started and finished."""
+    start = time.time()
+    new_a = function(a, s)
+    return (new_a, start, time.time())
+
+
+def __get_timed_future(future, timing):
+    value_future = Future()
+    def done(f):
+        if f.cancelled():
+            value_future.cancel()
+        elif f.exception() is not None:
+            __set_exception(value_future, f.exception())
+        else:
+            new_a, start, end = f.result()
+            timing.extend((start, end))
+            __set_result(value_future, new_a)
+    future.add_done_callback(done)
+    value_future.add_done_callback(lambda f: f.cancelled() and future.cancel())
+    return value_future
+
+
+def __check_picklable(*arguments):
+    """Raise a PicklingError if the arguments cannot be sent to a process pool. A task that cannot be pickled would otherwise never complete, as the pool's feeder thread only reports the error."""
+    try:
+        pickle.dumps(arguments, pickle.HIGHEST_PROTOCOL)
+    except pickle.PicklingError:
+        raise
+    except Exception as ex:
+        raise pickle.PicklingError(str(ex))
+
+
+def __submit(executor, function, a, s, timing, shared = False):
+    """Submit the function to the executor. If a timing list, holding the submission time, is given, the worker appends the times at which the function was started and finished. The deadline of the pipeline run, if any, is visible to the function, and the task is cancelled if the run fails before it is started. A task that cannot be pickled is not submitted to a process pool, and a PicklingError is raised. A shared task, which other runs may wait on, is not added to the run; each run adds its own future for the task's value instead."""
+    run = getattr(__current_run, 'run', None)
+    if run is not None and run.deadline is not None:
+        function = functools.partial(call_with_deadline, run.deadline, function)
+
+    arguments = (function, a, s) if timing is None else (__timed_call, function, a, s)
+    if __runs_in_parent(executor):
+        __check_picklable(*arguments)
+    task_future = executor.submit(*arguments)
+    if run is not None and not shared:
+        run.add_task(task_future)
+    return __get_timed_future(task_future, timing) if timing is not None else task_future
+
+
+def __call_hooks(hooks, name, timing):
+    if len(timing) == 3:
+        submitted, start, end = timing
+        queue_time, wall_time = max(start - submitted, 0.0), end - start
+    else:
+        # Computed by the parent, or failed
+        queue_time, wall_time = 0.0, time.time() - timing[0]
+    for hook in hooks:
+        hook(name, queue_time, wall_time)
+
+
+def __call(function, a, s):
+    """Call the function on this thread. A completed future is returned."""
+    future = Future()
+    try:
+        future.set_result(function(a, s))
+    except Exception as ex:
+        future.set_exception(ex)
+    return future
+
+
+def __get_submit_function(function):
+    return lambda executor, a, s, timing: __submit(executor, function, a, s, timing)
+
+
+def __get_inline_submit_function(function):
+    """Returns a submit function that calls the function on the thread that made its input available, rather than submitting it to the executor. A cheap function then costs no executor task, lock or queue hop."""
+    return lambda executor, a, s, timing: __call(function, a, s)
+
+
+def __get_wire_submit_function(function, inline = False):
+    if inline:
+        return __get_inline_submit_function(function)
+
+    def submit_function(executor, a, s, timing):
+        if __runs_in_parent(executor):
+            return __call(function, a, s)
+        return __submit(executor, function, a, s, timing)
+    return submit_function
+
+
+__timers = TimerQueue()
+
+
+def __get_retrying_submit_function(submit_function, name, timeout, retries, backoff):
+    """Returns a submit function whose task fails with a TimeoutError if it has not completed timeout seconds after it was submitted. A task that has not started is then cancelled; a running task cannot be interrupted, and its result is ignored. A failed, or timed out, task is resubmitted up to retries times, waiting backoff seconds before the first retry and doubling the wait for each further retry. A task is not retried once the deadline of the pipeline run has passed."""
+    def retrying_submit_function(executor, a, s, timing):
+        new_future = Future()
+        run = getattr(__current_run, 'run', None)
+        task_futures = list()
+        new_future.add_done_callback(lambda f: f.cancelled() and task_futures and task_futures[-1].cancel())
+
+        def failed(no_attempts, ex):
+            if no_attempts > retries:
+                __set_exception(new_future, ex)
+                return
+            delay = backoff * (2 ** (no_attempts - 1))
+            if delay > 0:
+                __timers.call_later(delay, lambda: attempt(no_attempts + 1))
+            else:
+                attempt(no_attempts + 1)
+
+        def attempt(no_attempts):
+            if new_future.done():
+                return
+            try:
+                if no_attempts > 1 and run is not None:
+                    check_deadline(run.deadline, name)
+                task_future = __call_in_run(run, submit_function, executor, a, s, timing)
+            except Exception as ex:
+                __set_exception(new_future, ex)
+                return
+            task_futures.append(task_future)
+
+            # Either the task or the timer completes the attempt
+            lock = threading.Lock()
+            completed = [False]
+            def complete():
+                with lock:
+                    is_first, completed[0] = not completed[0], True
+                return is_first
+
+            def time_out():
+                if complete():
+                    task_future.cancel()
+                    failed(no_attempts, TimeoutError("Component [%s] timed out after %s seconds" % (name, timeout)))
+
+            timer = __timers.call_later(timeout, time_out) if timeout is not None else None
+
+            def done(f):
+                if timer is not None:
+                    timer.cancel()
+                if not complete():
+                    return
+                if f.cancelled():
+                    new_future.cancel()
+                elif f.exception() is not None:
+                    failed(no_attempts, f.exception())
+                else:
+                    __set_result(new_future, f.result())
+
+            task_future.add_done_callback(done)
+
+        attempt(1)
+        return new_future
+    return retrying_submit_function
+
+
+def __get_hedging_submit_function(submit_function, hedger):
+    """Returns a submit function that submits the task again if it has not completed within the hedger's delay. The first task to complete successfully gives the result, and the other is cancelled, or, if it is running, its result is ignored. The task fails only if every submitted task fails."""
+    def hedging_submit_function(executor, a, s, timing):
+        new_future = Future()
+        lock = threading.Lock()
+        tasks = list()
+        timer = [None]
+        finished = [False]
+        run = getattr(__current_run, 'run', None)
+
+        def get_done(is_hedge, submitted):
+            def done(f):
+                if not f.cancelled() and f.exception() is None:
+                    hedger.record(time.time() - submitted)
+                with lock:
+                    if finished[0]:
+                        return
+                    tasks.remove(f)
+                    if f.cancelled() or f.exception() is not None:
+                        if tasks:
+                            # Wait for the other task
+                            return
+                    finished[0] = True
+                    others = list(tasks)
+
+                if timer[0] is not None:
+                    timer[0].cancel()
+                for other in others:
+                    other.cancel()
+                if f.cancelled():
+                    new_future.cancel()
+                elif f.exception() is not None:
+                    __set_exception(new_future, f.exception())
+                else:
+                    if is_hedge:
+                        hedger.won()
+                    __set_result(new_future, f.result())
+            return done
+
+        def submit(is_hedge, task_timing):
+            submitted = time.time()
+            task_future = __call_in_run(run, submit_function, executor, a, s, task_timing)
+            with lock:
+                tasks.append(task_future)
+            task_future.add_done_callback(get_done(is_hedge, submitted))
+
+        def hedge():
+            with lock:
+                if finished[0] or timer[0] is None:
+                    return
+                timer[0] = None
+            if run is not None and run.deadline is not None and time.time() >= run.deadline:
+                return
+            hedger.hedged()
+            try:
+                submit(True, None)
+            except Exception:
+                # The original task may still complete
+                pass
+
+        def cancelled(f):
+            if not f.cancelled():
+                return
+            with lock:
+                finished[0] = True
+                others = list(tasks)
+            if timer[0] is not None:
+                timer[0].cancel()
+            for other in others:
+                other.cancel()
+        new_future.add_done_callback(cancelled)
+
+        delay = hedger.get_delay()
+        if delay is not None:
+            timer[0] = __timers.call_later(delay, hedge)
+        try:
+            submit(False, timing)
+        except Exception:
+            if timer[0] is not None:
+                timer[0].cancel()
+            raise
+        return new_future
+    return hedging_submit_function
+
+
+def __then_state(state, function):
+    """Apply the function to the state, or, if the state is a future, return a future for the function applied to its result."""
+    if not isinstance(state, Future):
+        return function(state)
+
+    new_state = Future()
+    def ready(the_state, ex):
+        if ex is not None:
+            new_state.set_exception(ex)
+            return
+        try:
+            new_state.set_result(function(the_state))
+        except Exception as ex:
+            new_state.set_exception(ex)
+
+    __when_ready(state, ready)
+    return new_state
+
+
+def __fail(future, run, ex, name = None, input = None):
+    """Fail the future, and the run, with the exception. An exception raised by a component is wrapped in a ComponentError that names it, and holds its input."""
+    if name is not None and not isinstance(ex, (ComponentError, DeadlineExceeded)):
+        ex = ComponentError(name, input, ex)
+    if run is not None:
+        run.fail(ex)
+    future.set_exception(ex)
+
+
+def __schedule(executor,
+               value,
+               state,
+               submit_function,
+               input_forming_function = None,
+               output_forming_function = None,
+               name = None,
+               hooks = None,
+               run = None):
+    """Once all the futures in the value, and the state if it is a future, have completed, check that the run has not failed and its deadline, if any, has not passed, apply the input forming function, submit the formed input and the state with the submit function, and apply the output forming function to the result. Submit functions return a future, and usually submit only a component's function and its arguments to the executor, so a process pool can be used if these can be pickled. The forming functions are computed by the thread that completed the awaited future. If hooks are given they are called with the name, queue time and wall time of the submitted function. A future for the transformed value is returned. If the component fails, the future and the run fail with a ComponentError; if the deadline has passed they fail with DeadlineExceeded."""
+    new_future = Future()
+    timing = [] if hooks else None
+
+    def ready(the_a, the_state, ex):
+        if ex is None and run is not None:
+            # Components of a failed run are not submitted
+            ex = run.failure
+        if ex is not None:
+            new_future.set_exception(ex)
+            return
+
+        # The input given to the component
+        input = [the_a]
+
+        def complete(new_a):
+            try:
+                # Transform the output of the function
+                transformed_new_a = output_forming_function(new_a, the_state) if output_forming_function else new_a
+            except Exception as ex:
+                __fail(new_future, run, ex, name, input[0])
+            else:
+                new_future.set_result(transformed_new_a)
+
+        def done(task_future):
+            if timing is not None:
+                try:
+                    __call_hooks(hooks, name, timing)
+                except Exception as ex:
+                    __fail(new_future, run, ex)
+                    return
+
+            if task_future.cancelled():
+                if run is not None and run.failure is not None:
+                    new_future.set_exception(run.failure)
+                else:
+                    new_future.cancel()
+            elif task_future.exception() is not None:
+                __fail(new_future, run, task_future.exception(), name, input[0])
+            else:
+                complete(task_future.result())
+
+        try:
+            # Late runs are abandoned
+            check_deadline(run.deadline if run is not None else None, name)
+
+            # Transform the input
+            if input_forming_function:
+                input[0] = input_forming_function(the_a, the_state)
+
+            # Apply
+            if timing is not None:
+                timing.append(time.time())
+            task_future = __call_in_run(run, submit_function, executor, input[0], the_state, timing)
+        except Exception as ex:
+            __fail(new_future, run, ex, name, input[0])
+        else:
+            task_future.add_done_callback(done)
+
+    if isinstance(state, Future):
+        # The state is computed by a preceeding conditional component
+        def state_ready(the_value, ex):
+            if ex is not None:
+                ready(None, None, ex)
+            else:
+                ready(the_value[0], the_value[1], None)
+        __when_ready((value, state), state_ready)
+    else:
+        __when_ready(value, lambda the_a, ex: ready(the_a, state, ex))
+    return new_future
 
 
 def cons_function_component(function,
                             input_forming_function = None,
                             output_forming_function = None,
-                            state_mutator = None):
-    """Construct a component based on a function. Any input or output forming functions shall be called if provided. A Kleisli arrow is returned."""
+                            state_mutator = None,
+                            name = None,
+                            timeout = None,
+                            retries = 0,
+                            backoff = 0,
+                            hedge_percentile = None,
+                            inline = False):
+    """Construct a component based on a function. Any input or output forming functions shall be called if provided. The function is submitted to the executor only when its input is available. To use a process pool executor the function, its input and the state must be picklable, e.g., the function is defined at the top level of a module. The forming functions and state mutator are always computed by the parent process. The component's name, by default the function's name, is given to instrumentation hooks.\n\nIf a timeout, in seconds, is given the component fails with a TimeoutError when the function has not returned that long after it was submitted; a function that has not started is cancelled, but a running function cannot be interrupted. A function that fails, or times out, is submitted again up to retries times, after waiting backoff seconds, doubled for each further retry. Components that take the output of a failed component are never submitted.\n\nIf a hedge percentile is given, a call that has not returned within that percentile of the latencies of recent calls is submitted again, and the first to return gives the output. The returned Kleisli arrow's hedger attribute then holds the call, hedge and hedge win counts.\n\nAn inline function, which should be cheap, is called by the thread that made its input available rather than submitted to the executor, and cannot be timed out or hedged. A Kleisli arrow is returned."""
+    if timeout is not None and timeout <= 0:
+        raise ValueError("Timeout must be positive")
+    if retries < 0:
+        raise ValueError("Retries must not be negative")
+    if backoff < 0:
+        raise ValueError("Backoff must not be negative")
+    if inline and (timeout is not None or hedge_percentile is not None):
+        raise ValueError("Inline components cannot be timed out or hedged")
+
+    name = get_component_name(function, name)
+    submit_function = __get_inline_submit_function(function) if inline else __get_submit_function(function)
+    hedger = ComponentHedger(hedge_percentile) if hedge_percentile is not None else None
+    if hedger is not None:
+        submit_function = __get_hedging_submit_function(submit_function, hedger)
+    if timeout is not None or retries > 0:
+        submit_function = __get_retrying_submit_function(submit_function, name, timeout, retries, backoff)
+
+    component = __cons_component(submit_function,
+                                 input_forming_function,
+                                 output_forming_function,
+                                 state_mutator,
+                                 name,
+                                 function if hedger is None and timeout is None and retries == 0 else None,
+                                 inline)
+    if hedger is not None:
+        return HedgingComponentArrow(component._patcher, component._func, hedger)
+    return component
+
+
+def cons_cached_component(function,
+                          key_function = None,
+                          max_entries = None,
+                          ttl = None,
+                          input_forming_function = None,
+                          output_forming_function = None,
+                          state_mutator = None,
+                          name = None):
+    """Construct a component based on a pure function whose results are cached. The key function takes the formed input and the state and returns the hashable cache key; by default the formed input is the key. The least recently used entry is evicted when the cache holds max_entries, and entries expire ttl seconds after they are cached. On a hit the function is not submitted, and concurrent misses with the same key are coalesced so that the function is submitted once. The returned Kleisli arrow's cache attribute holds the hit, miss and eviction counts."""
+    cache = ComponentCache(max_entries, ttl)
+    get_key = key_function if key_function else lambda a, s: a
+
+    def submit_function(executor, a, s, timing):
+        # Concurrent runs with the same key wait on one task, which is
+        # cancelled only once every one of them has failed
+        future = cache.get_future(get_key(a, s), lambda: __submit(executor, function, a, s, timing, True))
+        run = getattr(__current_run, 'run', None)
+        if run is not None:
+            run.add_task(future)
+        return future
+
+    component = __cons_component(submit_function,
+                                 input_forming_function,
+                                 output_forming_function,
+                                 state_mutator,
+                                 get_component_name(function, name))
+    return CachedComponentArrow(component._patcher, component._func, cache)
+
+
+def cons_batching_component(batch_function,
+                            max_batch_size,
+                            max_wait_ms,
+                            input_forming_function = None,
+                            output_forming_function = None,
+                            state_mutator = None,
+                            name = None):
+    """Construct a component whose concurrent invocations are gathered into batches. The batch function takes a list of formed inputs and a list of their states, and returns a sequence of the same length. A batch is submitted to the executor once it holds max_batch_size values, or once its first value has waited max_wait_ms milliseconds, and each invocation's output is its item of the batch function's result. The returned Kleisli arrow's batcher attribute holds the batch and item counts."""
+    batcher = ComponentBatcher(batch_function, max_batch_size, max_wait_ms)
+
+    def submit_function(executor, a, s, timing):
+        # The batch's task is shared by the runs of its invocations, and
+        # is cancelled only once every one of them has failed
+        future = batcher.submit(executor, a, s)
+        run = getattr(__current_run, 'run', None)
+        if run is not None:
+            run.add_task(future)
+        return future
+
+    component = __cons_component(submit_function,
+                                 input_forming_function,
+                                 output_forming_function,
+                                 state_mutator,
+                                 get_component_name(batch_function, name))
+    return BatchingComponentArrow(component._patcher, component._func, batcher)
+
+
+def cons_subprocess_component(args,
+                              pool_size = 1,
+                              encoder = None,
+                              decoder = None,
+                              input_forming_function = None,
+                              output_forming_function = None,
+                              state_mutator = None,
+                              name = None):
+    """Construct a component computed by long-lived worker processes, started with the command line args, that use a line protocol: for each line written to a process's standard input it writes one line to its standard output. The encoder converts the formed input to one line, by default with str, and the decoder converts the process's line, without its line terminator, to the output. Requests are written to the process with the fewest pending requests without waiting for earlier responses, and no executor worker waits for a response. A worker process that exits is restarted, and the requests it had not responded to fail with an IOError. The returned Kleisli arrow's pool attribute holds the request and restart counts, and the pool must be closed to stop the worker processes."""
+    pool = SubprocessPool(args, pool_size, encoder, decoder)
+
+    def submit_function(executor, a, s, timing):
+        return pool.submit(a)
+
+    component = __cons_component(submit_function,
+                                 input_forming_function,
+                                 output_forming_function,
+                                 state_mutator,
+                                 name if name is not None else os.path.basename(args[0]))
+    return SubprocessComponentArrow(component._patcher, component._func, pool)
+
+
+def __cons_component(submit_function,
+                     input_forming_function = None,
+                     output_forming_function = None,
+                     state_mutator = None,
+                     name = None,
+                     function = None,
+                     inline = False):
+    """Construct a component that schedules the submit function. If the function that the submit function submits, or calls inline, is given the component can be fused with its neighbours into one task, see ParallelComponentArrow._compose()."""
     def get_bind_function():
         def bind_function(bind_a):
             def state_function(wrapped_state):
                 # Unpack state
                 state = wrapped_state.state
+                executor = wrapped_state.executor
 
-                def do_transformation(a, s):
-                    # Handle input
-                    if isinstance(a, Future):
-                        the_a = a.result()
-                    elif isinstance(a, tuple):
-                        the_a = a
-                    else:
-                        raise ValueError("Component state function has value that is not of type tuple or Future")
-                    
-                    # Transform the input
-                    transformed_a = input_forming_function(the_a, state) if input_forming_function else the_a
-
-                    # Apply
-                    new_a = function(transformed_a, state)
-
-                    # Transform the output of the function
-                    transformed_new_a = output_forming_function(new_a, state) if output_forming_function else new_a
-
-                    return transformed_new_a
+                # Handle input
+                if not isinstance(bind_a, Future) and not isinstance(bind_a, tuple):
+                    raise ValueError("Component state function has value that is not of type tuple or Future")
 
                 # Execute
-                new_future = wrapped_state.executor.submit(do_transformation,
-                                                           bind_a,
-                                                           state)
+                new_future = __schedule(executor,
+                                        bind_a,
+                                        state,
+                                        submit_function,
+                                        input_forming_function,
+                                        output_forming_function,
+                                        name,
+                                        wrapped_state.hooks,
+                                        wrapped_state.run)
 
                 # Mutate the state
-                next_state = state_mutator(state) if state_mutator else state
+                next_state = __then_state(state, state_mutator) if state_mutator else state
                 # New value/state pair
-                return (new_future, WrappedState(wrapped_state.executor, next_state))
+                return (new_future, WrappedState(executor, next_state, wrapped_state.hooks, wrapped_state.run))
             return State(state_function)
         return bind_function
 
-    return KleisliArrow(return_, get_bind_function())
+    bind_function = get_bind_function()
+    if function is not None:
+        bind_function.tasks = (__ChainTask(bind_function,
+                                           function,
+                                           input_forming_function,
+                                           output_forming_function,
+                                           state_mutator,
+                                           name,
+                                           inline),)
+        bind_function.fuse = lambda other: __get_chain_bind_function(bind_function.tasks + other.tasks)
+    return ParallelComponentArrow(return_, bind_function)
+
+
+#
+# A function component, or wire, that can be fused into a chain. The
+# bind function computes the component on its own. The bind functions
+# of components and chains that can be fused hold their tasks, and
+# fuse() returns the bind function of the chain of their tasks and
+# another's.
+#
+__ChainTask = collections.namedtuple('ChainTask', ['bind_function',
+                                                   'function',
+                                                   'input_forming_function',
+                                                   'output_forming_function',
+                                                   'state_mutator',
+                                                   'name',
+                                                   'inline'])
+
+
+def __get_chain_function(tasks):
+    """Returns a function, taking the run, a value and the states of the tasks, that computes the tasks in turn. The run is abandoned between tasks if it has failed, or its deadline has passed, and a failed task raises a ComponentError that names it."""
+    def chain_function(run, a, states):
+        for i, task in enumerate(tasks):
+            if i > 0:
+                if run is not None and run.failure is not None:
+                    raise run.failure
+                check_deadline(get_deadline(), task.name)
+
+            s = states[i]
+            input = a
+            try:
+                if task.input_forming_function:
+                    input = task.input_forming_function(a, s)
+                a = task.function(input, s)
+                if task.output_forming_function:
+                    a = task.output_forming_function(a, s)
+            except Exception as ex:
+                raise ComponentError(task.name, input, ex)
+        return a
+    return chain_function
+
+
+def __get_chain_scheduler(tasks):
+    """Returns the submit function of a chain of tasks, which submits them to the executor as one task, the function that maps a state to the states of the tasks and the resultant state, and the chain's name. Tasks that are all inline are called as one function by the thread that made the input available."""
+    chain_function = __get_chain_function(tasks)
+    mutators = [task.state_mutator for task in tasks]
+    inline = all([task.inline for task in tasks])
+
+    def get_states(state):
+        # The state given to each task, and the resultant state
+        states = [state]
+        for mutator in mutators:
+            states.append(mutator(states[-1]) if mutator else states[-1])
+        return tuple(states)
+
+    def submit_function(executor, a, s, timing):
+        function = functools.partial(chain_function, getattr(__current_run, 'run', None))
+        if inline:
+            return __call(function, a, s)
+        return __submit(executor, function, a, s, timing)
+
+    return (submit_function, get_states, " >> ".join([str(task.name) for task in tasks]))
 
 
-def cons_wire(wire_function):
-    """Construct a wire. A wire is a Kleisli arrow that converts data from from one pipeline component's output schema to another pipeline component's input schema."""
+def __get_chain_bind_function(tasks):
+    """Returns the bind function of a chain of tasks. The chain is scheduled when it is first bound, so that composing a long chain one component at a time takes linear time. Pipelines run with hooks, so that every component is timed, or on a process pool, to which the forming functions and wires cannot be sent, compute the tasks one by one."""
+    scheduler = list()
+
+    def bind_function(bind_a):
+        def state_function(wrapped_state):
+            executor = wrapped_state.executor
+            if wrapped_state.hooks or __runs_in_parent(executor):
+                value = bind_a
+                for task in tasks:
+                    value, wrapped_state = State.runState(task.bind_function(value), wrapped_state)
+                return (value, wrapped_state)
+
+            # Handle input
+            if not isinstance(bind_a, Future) and not isinstance(bind_a, tuple):
+                raise ValueError("Component state function has value that is not of type tuple or Future")
+
+            if not scheduler:
+                scheduler.append(__get_chain_scheduler(tasks))
+            submit_function, get_states, name = scheduler[0]
+
+            states = __then_state(wrapped_state.state, get_states)
+            new_future = __schedule(executor,
+                                    bind_a,
+                                    states,
+                                    submit_function,
+                                    name = name,
+                                    run = wrapped_state.run)
+            next_state = ParallelComponentArrow._get_item(states, -1)
+            return (new_future, WrappedState(executor, next_state, wrapped_state.hooks, wrapped_state.run))
+        return State(state_function)
+
+    bind_function.tasks = tasks
+    bind_function.fuse = lambda other: __get_chain_bind_function(tasks + other.tasks)
+    return bind_function
+
+
+def cons_wire(wire_function, name = None, inline = None):
+    """Construct a wire. A wire is a Kleisli arrow that converts data from from one pipeline component's output schema to another pipeline component's input schema. A wire built from an operator.itemgetter, attrgetter or methodcaller is called with the value only. An inline wire is called by the thread that made its input available rather than submitted to the executor; by default only wires built from an operator.itemgetter, attrgetter or methodcaller are inline."""
+    if inline is None:
+        inline = is_value_function(wire_function)
+
     def get_wire_function(conv_function):
+        is_value = is_value_function(conv_function)
         def wire_function(a, s):
             if isinstance(a, tuple):
                 raise ValueError("Wire has value that is a tuple")
-            new_a = conv_function(a, s)
+            new_a = conv_function(a) if is_value else conv_function(a, s)
             return new_a
 
         return wire_function
 
-    return cons_function_component(get_wire_function(wire_function))
+    function = get_wire_function(wire_function)
+    return __cons_component(__get_wire_submit_function(function, inline),
+                            name = get_component_name(wire_function, name),
+                            function = function,
+                            inline = inline)
 
 
-def cons_dictionary_wire(conversions):
-    """Construct a wire that converts between two dictionaries. The keys of the conversions dictionary are keys in the output dictionary, of the preceeding component, whose values will be used to populate a dictionary whose keys are the value of the conversions dictionary.\n\nE.g., output = {'int': 9, 'string': 'hello'}, and conversions = {'int': 'int_two', 'string': 'string_two'}, yields an input dictionary, to the next component, input = {'int_two': 9, 'string_two': 'hello'}."""
-    return cons_wire(get_dictionary_conversion_function(conversions))
+def cons_dictionary_wire(conversions, name = None, inline = True):
+    """Construct a wire that converts between two dictionaries. The keys of the conversions dictionary are keys in the output dictionary, of the preceeding component, whose values will be used to populate a dictionary whose keys are the value of the conversions dictionary.\n\nE.g., output = {'int': 9, 'string': 'hello'}, and conversions = {'int': 'int_two', 'string': 'string_two'}, yields an input dictionary, to the next component, input = {'int_two': 9, 'string_two': 'hello'}. Dictionary wires are cheap, and are inline unless inline is false, see cons_wire()."""
+    return cons_wire(get_dictionary_conversion_function(conversions), name, inline)
 
 
 def cons_split_wire():
@@ -112,113 +958,375 @@ def cons_split_wire():
             return State(split_wire_state_function)
         return split_wire_bind_function
 
-    return KleisliArrow(return_, get_split_wire_bind_function())
+    return ParallelComponentArrow(return_, get_split_wire_bind_function())
 
 
-def cons_unsplit_wire(unsplit_function):
-    """Construct a wire that takes a pair and applies a function to this pair to combine them into one value."""
+def cons_unsplit_wire(unsplit_function, name = None, inline = False):
+    """Construct a wire that takes a pair and applies a function to this pair to combine them into one value. An inline wire is called by the thread that made the pair available rather than submitted to the executor."""
     def get_unsplit_wrapper(inner_function):
         def unsplit_wrapper(a, s):
-            top = a[0].result() if isinstance(a[0], Future) else a[0]
-            bottom = a[1].result() if isinstance(a[1], Future) else a[1]
-            return inner_function(top, bottom)
+            return inner_function(a[0], a[1])
         return unsplit_wrapper
-    
-    return cons_function_component(get_unsplit_wrapper(unsplit_function))
 
+    function = get_unsplit_wrapper(unsplit_function)
+    return __cons_component(__get_wire_submit_function(function, inline),
+                            name = get_component_name(unsplit_function, name),
+                            function = function,
+                            inline = inline)
 
-def cons_if_component(condition_function, then_component, else_component):
-    """Construct a conditional execution component. If the conditional function evaluates to true the 'then' component is executed. Otherwise, the 'else' component is executed. Returns a Kleisli arrow."""
-    if not isinstance(then_component, KleisliArrow):
-        raise ValueError("Then component must be a KleisliArrow")
-    if not isinstance(else_component, KleisliArrow):
-        raise ValueError("Else component must be a KleisliArrow")
 
-    def get_test_bind_function():
-        def test_bind_function(bind_a):
-            def test_state_function(wrapped_state):
+def cons_join_wire(join_function, name = None, inline = False):
+    """Construct a wire that takes the tuple, or dictionary, of a fan-out component's outputs and applies a function to combine them into one value. The function is called with the tuple's values as positional arguments, or with the dictionary's items as keyword arguments. The wire waits for all the values to be available, and an inline wire is then called by the thread that made the last of them available."""
+    def get_join_wrapper(inner_function):
+        def join_wrapper(a, s):
+            return inner_function(**a) if isinstance(a, dict) else inner_function(*a)
+        return join_wrapper
+
+    function = get_join_wrapper(join_function)
+    return __cons_component(__get_wire_submit_function(function, inline),
+                            name = get_component_name(join_function, name),
+                            function = function,
+                            inline = inline)
+
+
+def cons_fanout_component(components):
+    """Construct a component that computes each of the provided components with the same input. All the components are scheduled at once, and are computed in parallel once the input is available. If the components are given as a list, or tuple, the component returns a flat tuple of their outputs, in the same order. If they are given as a dictionary it returns a dictionary of their outputs with the same keys. The state is passed through the components in turn. See cons_join_wire()."""
+    keys, components = get_fanout_components(components)
+
+    def get_fanout_bind_function():
+        def fanout_bind_function(bind_a):
+            def fanout_state_function(wrapped_state):
+                # Handle input
+                if not isinstance(bind_a, Future) and not isinstance(bind_a, tuple):
+                    raise ValueError("Fan-out state function has value that is not of type tuple or Future")
+
+                outputs = list()
+                for component in components:
+                    b, wrapped_state = State.runState(component._func(bind_a), wrapped_state)
+                    outputs.append(b)
+
+                if keys is None:
+                    return (tuple(outputs), wrapped_state)
+
+                # The dictionary is available once all its values are
+                new_future = Future()
+                def ready(the_outputs, ex):
+                    if ex is not None:
+                        new_future.set_exception(ex)
+                    else:
+                        new_future.set_result(dict(zip(keys, the_outputs)))
+                __when_ready(tuple(outputs), ready)
+                return (new_future, wrapped_state)
+            return State(fanout_state_function)
+        return fanout_bind_function
+
+    return ParallelComponentArrow(return_, get_fanout_bind_function())
+
+
+def __is_ready(value):
+    """Returns true if every future in the value has completed successfully."""
+    for future in __get_futures(value):
+        if not future.done() or future.cancelled() or future.exception() is not None:
+            return False
+    return True
+
+
+def __cons_routing_component(key_function, get_component, inline):
+    """Construct a component that computes the component returned by get_component for the key of its input and state. Only the chosen component is computed. An inline key function is called by the scheduling thread, as soon as the input and state are available; otherwise, it is submitted to the executor like a wire."""
+    key_name = get_component_name(key_function)
+
+    def get_routing_bind_function():
+        def routing_bind_function(bind_a):
+            def routing_state_function(wrapped_state):
                 # Unpack state
                 state = wrapped_state.state
+                executor = wrapped_state.executor
 
-                def do_transformation(a, s):
-                    # Handle input
-                    if isinstance(a, tuple):
-                        the_a = (a[0].result(), a[1].result())
-                    elif isinstance(a, Future):
-                        the_a = a.result()
-                    else:
-                        raise ValueError("Test state function has value that is not of type tuple or Future")
+                # Handle input
+                if not isinstance(bind_a, Future) and not isinstance(bind_a, tuple):
+                    raise ValueError("Routing state function has value that is not of type tuple or Future")
 
-                    condition_result = condition_function(a, s)
-                    new_a = Left(a) if condition_result else Right(a)
+                new_future = Future()
+                new_state = Future()
 
-                    return new_a
+                def fail(ex):
+                    if wrapped_state.run is not None:
+                        wrapped_state.run.fail(ex)
+                    new_future.set_exception(ex)
+                    new_state.set_exception(ex)
 
-                # Execute
-                new_future = wrapped_state.executor.submit(do_transformation,
-                                                           bind_a,
-                                                           state)
+                def choose(the_a, the_state):
+                    # The component chosen by an inline key function, or
+                    # None if the run has failed or its deadline has passed
+                    run = wrapped_state.run
+                    try:
+                        if run is not None:
+                            if run.failure is not None:
+                                raise run.failure
+                            check_deadline(run.deadline, key_name)
+                    except Exception as ex:
+                        fail(ex)
+                        return None
+                    timing = [time.time()]
+                    try:
+                        key = key_function(the_a, the_state)
+                    except Exception as ex:
+                        fail(ComponentError(key_name, the_a, ex))
+                        return None
+                    finally:
+                        if wrapped_state.hooks:
+                            __call_hooks(wrapped_state.hooks, key_name, timing)
+                    try:
+                        return get_component(key)
+                    except Exception as ex:
+                        fail(ex)
+                        return None
+
+                if inline and __is_ready((bind_a, state)):
+                    # Choose the component now, and compute it like any other
+                    the_a, the_state = __get_result((bind_a, state))
+                    component = choose(the_a, the_state)
+                    if component is None:
+                        return (new_future, WrappedState(executor, new_state, wrapped_state.hooks, wrapped_state.run))
+                    return State.runState(component._func(bind_a), wrapped_state)
+
+                def route(component, the_state):
+                    try:
+                        branch_a, branch_wrapped_state = State.runState(component._func(bind_a),
+                                                                        WrappedState(executor,
+                                                                                     the_state,
+                                                                                     wrapped_state.hooks,
+                                                                                     wrapped_state.run))
+                    except Exception as ex:
+                        fail(ex)
+                        return
+
+                    def value_ready(the_value, ex):
+                        if ex is not None:
+                            new_future.set_exception(ex)
+                        else:
+                            new_future.set_result(the_value)
+
+                    def state_ready(the_state, ex):
+                        if ex is not None:
+                            new_state.set_exception(ex)
+                        else:
+                            new_state.set_result(the_state)
+
+                    __when_ready(branch_a, value_ready)
+                    __when_ready(branch_wrapped_state.state, state_ready)
+
+                if inline:
+                    def ready(the_value, ex):
+                        if ex is not None:
+                            fail(ex)
+                            return
+                        the_a, the_state = the_value
+                        component = choose(the_a, the_state)
+                        if component is not None:
+                            route(component, the_state)
+                    __when_ready((bind_a, state), ready)
+                else:
+                    key_future = __schedule(executor,
+                                            bind_a,
+                                            state,
+                                            __get_wire_submit_function(key_function),
+                                            name = key_name,
+                                            hooks = wrapped_state.hooks,
+                                            run = wrapped_state.run)
+                    def key_ready(the_value, ex):
+                        if ex is not None:
+                            fail(ex)
+                            return
+                        try:
+                            component = get_component(the_value[0])
+                        except Exception as ex:
+                            fail(ex)
+                        else:
+                            route(component, the_value[1])
+                    __when_ready((key_future, state), key_ready)
 
                 # New value/state pair
-                return (new_future, wrapped_state)
-            return State(test_state_function)
-        return test_bind_function
-
-    def get_if_left_function(left_function):
-        def if_left_function(futured_either):
-            either = futured_either.result()
-            if isinstance(either, Left):
-                return left_function(either.val) >= (lambda a: return_(Left(a)))
-            elif isinstance(either, Right):
-                return return_(either)
-            else:
-                raise ValueError("Result of future must be of type Either")
-        return if_left_function
+                return (new_future, WrappedState(executor, new_state, wrapped_state.hooks, wrapped_state.run))
+            return State(routing_state_function)
+        return routing_bind_function
 
-    if_comp = KleisliArrow(return_, get_test_bind_function()) >> \
-              ((KleisliArrowChoice(return_, get_if_left_function(then_component._func)) >> \
-                KleisliArrowChoice(return_, else_component._func).right()) >> \
-               KleisliArrow(return_, lambda either: return_(either.val)))
+    return ParallelComponentArrow(return_, get_routing_bind_function())
 
-    return if_comp
 
+def cons_if_component(condition_function, then_component, else_component, inline = False):
+    """Construct a conditional execution component. If the conditional function evaluates to true the 'then' component is executed. Otherwise, the 'else' component is executed. Only the chosen component is scheduled. A cheap condition can be marked inline, and it is then evaluated by the scheduling thread rather than submitted to the executor. Returns a Kleisli arrow."""
+    if not isinstance(then_component, KleisliArrow):
+        raise ValueError("Then component must be a KleisliArrow")
+    if not isinstance(else_component, KleisliArrow):
+        raise ValueError("Else component must be a KleisliArrow")
 
-def __handle_output(o):
-    po = (o[0].result() if isinstance(o[0], Future) else o[0],
-          o[1].result() if isinstance(o[1], Future) else o[1]) if isinstance(o, tuple) \
-         else o.result()
-    return po
+    return __cons_routing_component(condition_function,
+                                    lambda condition: then_component if condition else else_component,
+                                    inline)
 
 
-def __kleisli_wrapper(f):
-    def wrapper(executor, pipeline, input, state):
-        """Run, evaluate, or execute a pipeline."""
-        if isinstance(input, tuple):
-            future = (Future(), Future())
-            for fu, v in zip(future, input):
-                fu.set_result(v)
+def cons_switch_component(key_function, components, default_component = None, inline = False):
+    """Construct a multi-way conditional execution component. The key function, taking the input and the state, returns the key of the component, in the components dictionary, that is executed. If the key is not in the dictionary the default component is executed, or if there is no default component a KeyError is raised. Only the chosen component is scheduled. A cheap key function can be marked inline, and it is then evaluated by the scheduling thread rather than submitted to the executor. Returns a Kleisli arrow."""
+    for component in components.values():
+        if not isinstance(component, KleisliArrow):
+            raise ValueError("Switch components must be KleisliArrows")
+    if default_component is not None and not isinstance(default_component, KleisliArrow):
+        raise ValueError("Default component must be a KleisliArrow")
+
+    components = dict(components)
+    def get_component(key):
+        component = components.get(key, default_component)
+        if component is None:
+            raise KeyError(key)
+        return component
+
+    return __cons_routing_component(key_function, get_component, inline)
+
+
+def __get_input_future(input):
+    if isinstance(input, tuple):
+        future = (Future(), Future())
+        for fu, v in zip(future, input):
+            fu.set_result(v)
+    else:
+        future = Future()
+        future.set_result(input)
+    return future
+
+
+def __get_run_future(value, run):
+    """Returns a future that completes once every future in the value has completed, or as soon as the run fails, so a failed run does not wait for its components that are still computing."""
+    future = Future()
+    lock = threading.Lock()
+    completed = [False]
+
+    def complete(result, ex):
+        with lock:
+            is_first, completed[0] = not completed[0], True
+        if not is_first:
+            return
+        if ex is not None:
+            future.set_exception(ex)
         else:
-            future = Future()
-            future.set_result(input)
+            future.set_result(result)
+
+    run.add_failure_callback(lambda ex: complete(None, ex))
+    __when_ready(value, complete)
+    return future
+
 
-        state_monad = KleisliArrow.runKleisli(pipeline, future)
-        return f(state_monad, WrappedState(executor, state))
+def __start_run(executor, pipeline, input, state, hooks, deadline):
+    """Start a run of the pipeline. A future for the output and resultant state pair is returned."""
+    run = PipelineRun(deadline)
+    state_monad = KleisliArrow.runKleisli(pipeline, __get_input_future(input))
+    output = State.runState(state_monad, WrappedState(executor, state, hooks, run))
+    return __get_run_future((output[0], output[1].state), run)
+
+
+def __kleisli_wrapper(f):
+    def wrapper(executor, pipeline, input, state, hooks = None, deadline = None):
+        """Run, evaluate, or execute a pipeline. If hooks are given each hook is called with the name, queue time and wall time of every component's function call. If a deadline, a time as returned by time.time(), is given no component is scheduled after it has passed, and DeadlineExceeded is raised instead. The first component to fail fails the run: its components that have not started are cancelled, and a ComponentError is raised at once."""
+        return f(__start_run(executor, pipeline, input, state, hooks, deadline).result())
     return wrapper
 
 
 @__kleisli_wrapper
-def run_pipeline(state_monad, state):
-     output = State.runState(state_monad, state)
-     return (__handle_output(output[0]), output[1].state)
+def run_pipeline(output):
+     return output
 
 
 @__kleisli_wrapper
-def eval_pipeline(state_monad, state):
-    future = State.evalState(state_monad, state)
-    return __handle_output(future)
+def eval_pipeline(output):
+    return output[0]
 
 
 @__kleisli_wrapper
-def exec_pipeline(state_monad, state):
-    wrapped_state = State.execState(state_monad, state)
-    return wrapped_state.state
+def exec_pipeline(output):
+    return output[1]
+
+
+def submit_pipeline(executor, pipeline, input, state, hooks = None, deadline = None):
+    """Run a pipeline without waiting for it to complete. A future for the output and resultant state pair is returned. If hooks are given each hook is called with the name, queue time and wall time of every component's function call. If a deadline, a time as returned by time.time(), is given no component is scheduled after it has passed, and the future fails with DeadlineExceeded. The future fails with a ComponentError as soon as a component fails, and the run's components that have not started are cancelled."""
+    try:
+        return __start_run(executor, pipeline, input, state, hooks, deadline)
+    except Exception as ex:
+        future = Future()
+        future.set_exception(ex)
+        return future
+
+
+#
+# Runs a pipeline for many inputs on one executor. Each run has its own
+# state, and at most max_in_flight runs are computed at once; further
+# runs wait, in the order they were submitted, for a run to complete.
+#
+class PipelineRunner(object):
+    def __init__(self, pipeline, executor, max_in_flight = None, hooks = None):
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("Maximum number of runs in flight must be positive")
+
+        self.pipeline = pipeline
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.hooks = hooks
+        self._in_flight = 0
+        self._waiting = collections.deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def submit(self, input, state, deadline = None):
+        """Submit a run of the pipeline. A future for the output and resultant state pair is returned. The run is started now, unless the maximum number of runs are in flight. A run whose deadline passes while it waits, or is computed, fails with DeadlineExceeded as soon as it is next scheduled."""
+        future = Future()
+        with self._lock:
+            if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                self._waiting.append((future, input, state, deadline))
+                return future
+            self._in_flight += 1
+
+        future.set_running_or_notify_cancel()
+        self._start(future, input, state, deadline)
+        return future
+
+    def _start(self, future, input, state, deadline):
+        def done(f):
+            if f.exception() is not None:
+                future.set_exception(f.exception())
+            else:
+                future.set_result(f.result())
+            self._next()
+
+        submit_pipeline(self.executor, self.pipeline, input, state, self.hooks, deadline).add_done_callback(done)
+
+    def _next(self):
+        # Runs that complete as they are started would otherwise start
+        # the next waiting run recursively
+        if getattr(self._local, 'starting', False):
+            self._local.completed += 1
+            return
+
+        self._local.starting = True
+        self._local.completed = 1
+        try:
+            while self._local.completed:
+                self._local.completed -= 1
+                self._start_waiting()
+        finally:
+            self._local.starting = False
+
+    def _start_waiting(self):
+        while True:
+            with self._lock:
+                if not self._waiting:
+                    self._in_flight -= 1
+                    return
+                future, input, state, deadline = self._waiting.popleft()
+            # Cancelled runs are not started
+            if future.set_running_or_notify_cancel():
+                self._start(future, input, state, deadline)
+                return
+
@@ -0,0 +1,199 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import collections
+import subprocess
+import threading
+
+from concurrent.futures import Future
+
+
+class SubprocessWorker(object):
+    """A long-lived process that reads one request line from its standard input, and writes one response line to its standard output, for each request. Requests are written without waiting for the responses to earlier requests, and a reader thread matches the responses to the requests in order."""
+    def __init__(self, args, on_exit):
+        self._process = subprocess.Popen(args,
+                                         stdin = subprocess.PIPE,
+                                         stdout = subprocess.PIPE)
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._is_alive = True
+        self._on_exit = on_exit
+        self._reader = threading.Thread(target = self._read)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    @property
+    def no_pending(self):
+        return len(self._pending)
+
+    @property
+    def is_alive(self):
+        return self._is_alive
+
+    def submit(self, line):
+        """Write the line to the process. A future for the process's response line is returned."""
+        future = Future()
+        with self._lock:
+            if not self._is_alive:
+                raise IOError("Worker process [%d] has exited" % self.pid)
+            self._pending.append(future)
+            try:
+                self._process.stdin.write(line + "\n")
+                self._process.stdin.flush()
+            except IOError:
+                # The reader fails the request once the process has exited
+                pass
+        return future
+
+    def close(self):
+        """Close the process's standard input, and wait for it to respond to the pending requests and exit."""
+        with self._lock:
+            self._is_alive = False
+            try:
+                self._process.stdin.close()
+            except IOError:
+                pass
+        self._reader.join()
+
+    def _read(self):
+        stdout = self._process.stdout
+        for line in iter(stdout.readline, ''):
+            # The lock is not taken, as a writer holding it may be
+            # waiting for the process to read, while the process waits
+            # for its response to be read
+            future = self._pending.popleft() if self._pending else None
+            if future is not None:
+                future.set_result(line.rstrip("\n"))
+
+        # The process has exited, or closed its standard output
+        with self._lock:
+            self._is_alive = False
+            pending = list(self._pending)
+            self._pending.clear()
+        stdout.close()
+        return_code = self._process.poll()
+        if return_code is None:
+            ex = IOError("Worker process [%d] closed its standard output" % self.pid)
+        else:
+            ex = IOError("Worker process [%d] exited with code %s" % (self.pid, return_code))
+
+        # Restart before the requests fail, so that they can be retried
+        self._on_exit(self)
+        for future in pending:
+            future.set_exception(ex)
+
+        # A process that closed its standard output cannot respond, and
+        # is killed rather than waited on
+        if return_code is None:
+            try:
+                self._process.kill()
+            except OSError:
+                # It has exited since it was polled
+                pass
+            self._process.wait()
+
+
+#
+# A pool of long-lived worker processes that use a line protocol: one
+# line is written to a process's standard input for each request, and
+# the process writes one line to its standard output for each request,
+# in the order they were written. Many requests are in flight at once
+# in each process, and a request is written to the process with the
+# fewest pending requests. A worker process that exits, or closes its
+# standard output, is restarted, and its pending requests fail.
+#
+class SubprocessPool(object):
+    def __init__(self, args, pool_size = 1, encoder = None, decoder = None):
+        if pool_size < 1:
+            raise ValueError("Pool size must be positive")
+
+        self.args = list(args)
+        self.pool_size = pool_size
+        self.requests = 0
+        self.restarts = 0
+        self._encoder = encoder if encoder else str
+        self._decoder = decoder if decoder else lambda line: line
+        self._lock = threading.Lock()
+        self._is_closed = False
+        self._workers = list()
+        try:
+            for i in xrange(pool_size):
+                self._workers.append(SubprocessWorker(self.args, self._restart))
+        except Exception:
+            self.close()
+            raise
+
+    def __repr__(self):
+        return "<SubprocessPool: requests = %d, restarts = %d>" % (self.requests, self.restarts)
+
+    @property
+    def pids(self):
+        with self._lock:
+            return [worker.pid for worker in self._workers]
+
+    def submit(self, a):
+        """Encode the value as one line, and write it to a worker process. A future for the decoded response is returned."""
+        line = self._encoder(a)
+        if "\n" in line:
+            raise ValueError("Encoded value must be one line")
+
+        with self._lock:
+            if self._is_closed:
+                raise ValueError("Subprocess pool is closed")
+            self.requests += 1
+            worker = min([worker for worker in self._workers if worker.is_alive] or self._workers,
+                         key = lambda worker: worker.no_pending)
+
+        line_future = worker.submit(line)
+        future = Future()
+        def done(f):
+            if f.exception() is not None:
+                future.set_exception(f.exception())
+                return
+            try:
+                value = self._decoder(f.result())
+            except Exception as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(value)
+        line_future.add_done_callback(done)
+        return future
+
+    def close(self):
+        """Close the worker processes once they have responded to their pending requests."""
+        with self._lock:
+            self._is_closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            worker.close()
+
+    def _restart(self, worker):
+        with self._lock:
+            if self._is_closed or worker not in self._workers:
+                return
+            self.restarts += 1
+            try:
+                new_worker = SubprocessWorker(self.args, self._restart)
+            except Exception:
+                # The exited worker is kept, and its requests fail
+                return
+            self._workers[self._workers.index(worker)] = new_worker
@@ -0,0 +1,207 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+#
+# Unit tests for building a pipeline using the asyncio helper functions.
+#
+import operator
+import unittest
+
+try:
+     import asyncio
+except ImportError:
+     import trollius as asyncio
+
+from pypeline.helpers.async_helpers import cons_async_component, \
+     cons_function_component, \
+     cons_wire, \
+     cons_dictionary_wire, \
+     cons_split_wire, \
+     cons_unsplit_wire, \
+     cons_if_component, \
+     cons_switch_component, \
+     cons_fanout_component, \
+     cons_join_wire, \
+     run_pipeline, \
+     eval_pipeline, \
+     exec_pipeline
+
+
+class AsyncPypelineHelperUnitTest(unittest.TestCase):
+     @staticmethod
+     def test(pipeline, input, state, run_function = run_pipeline):
+          loop = asyncio.new_event_loop()
+          asyncio.set_event_loop(loop)
+          try:
+               result = loop.run_until_complete(run_function(pipeline, input, state, loop))
+          finally:
+               asyncio.set_event_loop(None)
+               loop.close()
+          return result
+
+
+     def test_serial_pypeline_with_async_components(self):
+          rev_msg_one = "reverse(1)"
+          rev_msg_two = "reverse(2)"
+          upper_msg = "upper"
+
+          reverse_function = lambda a, s: asyncio.sleep(0.001, a[::-1])
+          upper_function = lambda a, s: a.upper()
+
+          comp_rev_one = cons_async_component(reverse_function,
+                                              state_mutator = lambda s: s.append(rev_msg_one) or s)
+          comp_rev_two = cons_async_component(reverse_function,
+                                              state_mutator = lambda s: s.append(rev_msg_two) or s)
+          comp_upper = cons_function_component(upper_function,
+                                               state_mutator = lambda s: s.append(upper_msg) or s)
+
+          pipeline = comp_rev_one >> comp_rev_two >> comp_upper
+
+          value = "hello world"
+          target = (upper_function(value, None), [rev_msg_one, rev_msg_two, upper_msg])
+          result = AsyncPypelineHelperUnitTest.test(pipeline, value, list())
+
+          self.assertEquals(target, result)
+
+
+     def test_async_split_and_unsplit_wires(self):
+          top_func = lambda a, s: asyncio.sleep(0.001, " ".join([a, "top"]))
+          bottom_func = lambda a, s: asyncio.sleep(0.001, " ".join([a, "bottom"]))
+          unsplit_func = lambda t, b: {'top': t, 'bottom': b}
+
+          pipeline = cons_wire(lambda a, s: a['input']) >> \
+                     cons_split_wire() >> \
+                     (cons_async_component(top_func, state_mutator = lambda s: s + 1) ** \
+                      cons_async_component(bottom_func, state_mutator = lambda s: s * 10)) >> \
+                     cons_unsplit_wire(unsplit_func)
+
+          result = AsyncPypelineHelperUnitTest.test(pipeline, {'input': "hello"}, 1)
+          self.assertEquals(({'top': "hello top", 'bottom': "hello bottom"}, 20), result)
+
+
+     def test_async_first_and_second_of_component_output(self):
+          pair_func = lambda a, s: asyncio.sleep(0.001, (a, a))
+          upper = cons_function_component(lambda a, s: a.upper())
+          reverse = cons_async_component(lambda a, s: asyncio.sleep(0.001, a[::-1]))
+
+          pipeline = cons_async_component(pair_func) >> upper.first() >> reverse.second()
+          self.assertEquals(("HELLO", "olleh"), AsyncPypelineHelperUnitTest.test(pipeline, "hello", None, eval_pipeline))
+
+          pipeline = cons_async_component(pair_func) >> (upper ** reverse) >> cons_unsplit_wire(lambda t, b: t + b)
+          self.assertEquals("HELLOolleh", AsyncPypelineHelperUnitTest.test(pipeline, "hello", None, eval_pipeline))
+
+
+     def test_async_run_eval_and_exec(self):
+          value = "hello world"
+          state = 0
+
+          input_func = lambda a, s: " ".join(["input", a])
+          output_func = lambda a, s: " ".join([a, "output"])
+          function = lambda a, s: asyncio.sleep(0, a.upper())
+          state_func = lambda s: s + 1
+
+          pipeline = cons_async_component(function,
+                                          input_func,
+                                          output_func,
+                                          state_mutator = state_func)
+
+          target_value = "INPUT HELLO WORLD output"
+          self.assertEquals((target_value, 1), AsyncPypelineHelperUnitTest.test(pipeline, value, state, run_pipeline))
+          self.assertEquals(target_value, AsyncPypelineHelperUnitTest.test(pipeline, value, state, eval_pipeline))
+          self.assertEquals(1, AsyncPypelineHelperUnitTest.test(pipeline, value, state, exec_pipeline))
+
+
+     def test_async_if(self):
+          then_comp = cons_async_component(lambda a, s: asyncio.sleep(0, {'z': 'THEN'}),
+                                           state_mutator = lambda s: s + ["then"])
+          else_comp = cons_dictionary_wire({'c': 'z'})
+          pipeline = cons_if_component(lambda a, s: a['a'] == True, then_comp, else_comp) >> \
+                     cons_function_component(lambda a, s: (a['z'], s))
+
+          value = {'a': True, 'b': 'then', 'c': 'else'}
+          result = AsyncPypelineHelperUnitTest.test(pipeline, value, list(), eval_pipeline)
+          self.assertEquals(('THEN', ["then"]), result)
+
+          value = {'a': False, 'b': 'then', 'c': 'else'}
+          result = AsyncPypelineHelperUnitTest.test(pipeline, value, list(), eval_pipeline)
+          self.assertEquals(('else', []), result)
+
+
+     def test_async_switch(self):
+          components = {'int': cons_async_component(lambda a, s: asyncio.sleep(0, "int(%d)" % a)),
+                        'str': cons_function_component(lambda a, s: "str(%s)" % a)}
+          pipeline = cons_switch_component(lambda a, s: type(a).__name__, components)
+
+          self.assertEquals("int(1)", AsyncPypelineHelperUnitTest.test(pipeline, 1, None, eval_pipeline))
+          self.assertEquals("str(one)", AsyncPypelineHelperUnitTest.test(pipeline, "one", None, eval_pipeline))
+          self.assertRaises(KeyError, AsyncPypelineHelperUnitTest.test, pipeline, 1.0, None, eval_pipeline)
+
+          pipeline = cons_switch_component(lambda a, s: type(a).__name__,
+                                           components,
+                                           cons_function_component(lambda a, s: "default"))
+          self.assertEquals("default", AsyncPypelineHelperUnitTest.test(pipeline, 1.0, None, eval_pipeline))
+
+
+     def test_async_fanout_component_and_join_wire(self):
+          components = [cons_async_component(lambda a, s, i = i: asyncio.sleep(0.001 * (4 - i), a + i)) for i in xrange(4)]
+          pipeline = cons_fanout_component(components) >> cons_join_wire(lambda *values: values)
+          self.assertEquals((10, 11, 12, 13), AsyncPypelineHelperUnitTest.test(pipeline, 10, None, eval_pipeline))
+
+          pipeline = cons_fanout_component({'upper': cons_function_component(lambda a, s: a.upper()),
+                                            'length': cons_async_component(lambda a, s: asyncio.sleep(0, len(a)))})
+          self.assertEquals({'upper': "HELLO", 'length': 5}, AsyncPypelineHelperUnitTest.test(pipeline, "hello", None, eval_pipeline))
+
+
+     def test_async_component_failure(self):
+          called = list()
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          pipeline = cons_async_component(lambda a, s: asyncio.sleep(0, a)) >> \
+                     cons_function_component(fail) >> \
+                     cons_function_component(lambda a, s: called.append(a) or a)
+
+          self.assertRaises(IOError, AsyncPypelineHelperUnitTest.test, pipeline, "hello world", None)
+          self.assertEquals([], called)
+
+
+     def test_many_pipeline_runs_in_flight(self):
+          no_runs = 1000
+          pipeline = cons_async_component(lambda a, s: asyncio.sleep(0.01, a * 2)) >> \
+                     cons_split_wire() >> \
+                     (cons_async_component(lambda a, s: asyncio.sleep(0.01, a + 1)) ** \
+                      cons_function_component(lambda a, s: a - 1)) >> \
+                     cons_unsplit_wire(lambda t, b: t + b)
+
+          loop = asyncio.new_event_loop()
+          asyncio.set_event_loop(loop)
+          try:
+               futures = [eval_pipeline(pipeline, i, None, loop) for i in xrange(no_runs)]
+               results = loop.run_until_complete(asyncio.gather(*futures))
+          finally:
+               asyncio.set_event_loop(None)
+               loop.close()
+
+          self.assertEquals([4 * i for i in xrange(no_runs)], results)
+
+
+     def test_async_wire_with_value_functions(self):
+          pipeline = cons_wire(operator.itemgetter('input')) >> cons_wire(operator.methodcaller('upper'))
+          result = AsyncPypelineHelperUnitTest.test(pipeline, {'input': "hello"}, None, eval_pipeline)
+          self.assertEquals("HELLO", result)
@@ -0,0 +1,132 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+from pypeline.helpers.batching import ComponentBatcher
+
+
+def add_one(values, states):
+     return [value + 1 for value in values]
+
+
+class ComponentBatcherUnitTest(unittest.TestCase):
+     def setUp(self):
+          self.executor = ThreadPoolExecutor(max_workers = 2)
+
+
+     def tearDown(self):
+          self.executor.shutdown(True)
+
+
+     def test_full_batches_are_submitted(self):
+          batches = list()
+          def function(values, states):
+               batches.append(values)
+               return add_one(values, states)
+
+          batcher = ComponentBatcher(function, 3, 60000)
+          futures = [batcher.submit(self.executor, value, None) for value in xrange(6)]
+
+          self.assertEquals(range(1, 7), [future.result(5) for future in futures])
+          self.assertEquals([[0, 1, 2], [3, 4, 5]], batches)
+          self.assertEquals((2, 6), (batcher.batches, batcher.items))
+
+
+     def test_partial_batch_is_submitted_after_wait(self):
+          batcher = ComponentBatcher(add_one, 100, 10)
+          start = time.time()
+          futures = [batcher.submit(self.executor, value, None) for value in xrange(3)]
+
+          self.assertEquals([1, 2, 3], [future.result(5) for future in futures])
+          self.assertTrue(time.time() - start >= 0.01)
+          self.assertEquals((1, 3), (batcher.batches, batcher.items))
+
+          # The next batch waits again
+          self.assertEquals(5, batcher.submit(self.executor, 4, None).result(5))
+          self.assertEquals(2, batcher.batches)
+
+
+     def test_small_wait_is_honoured(self):
+          batcher = ComponentBatcher(add_one, 100, 2)
+          waits = list()
+          for value in xrange(10):
+               start = time.time()
+               self.assertEquals(value + 1, batcher.submit(self.executor, value, None).result(5))
+               waits.append(time.time() - start)
+
+          # Each batch is submitted after 2ms, give or take scheduling
+          self.assertTrue(min(waits) >= 0.002)
+          self.assertTrue(sum(waits) / len(waits) < 0.015)
+
+
+     def test_failed_batch(self):
+          def fail(values, states):
+               raise RuntimeError("Batch failed")
+
+          batcher = ComponentBatcher(fail, 2, 60000)
+          futures = [batcher.submit(self.executor, value, None) for value in xrange(2)]
+          for future in futures:
+               self.assertRaises(RuntimeError, future.result, 5)
+
+          batcher = ComponentBatcher(lambda values, states: values[1:], 2, 60000)
+          futures = [batcher.submit(self.executor, value, None) for value in xrange(2)]
+          for future in futures:
+               self.assertRaises(ValueError, future.result, 5)
+
+
+     def test_cancelled_items(self):
+          batches = list()
+          def function(values, states):
+               batches.append(values)
+               return add_one(values, states)
+
+          # Cancelled before the batch is submitted
+          batcher = ComponentBatcher(function, 3, 60000)
+          futures = [batcher.submit(self.executor, value, None) for value in xrange(2)]
+          self.assertTrue(futures[0].cancel())
+          self.assertEquals(3, batcher.submit(self.executor, 2, None).result(5))
+          self.assertEquals([[1, 2]], batches)
+          self.assertEquals(2, futures[1].result(5))
+
+          # Cancelled while the batch is waiting on the executor
+          release = threading.Event()
+          executor = ThreadPoolExecutor(max_workers = 1)
+          try:
+               executor.submit(release.wait, 5)
+               batcher = ComponentBatcher(function, 2, 60000)
+               first = [batcher.submit(executor, value, None) for value in xrange(2)]
+               second = [batcher.submit(executor, value, None) for value in xrange(2)]
+               self.assertTrue(first[0].cancel())
+               self.assertTrue(second[0].cancel())
+               self.assertTrue(second[1].cancel())
+               release.set()
+               self.assertEquals(2, first[1].result(5))
+          finally:
+               release.set()
+               executor.shutdown(True)
+          # Only the batch that is still waited on is called
+          self.assertEquals([[1, 2], [0, 1]], batches)
+
+
+     def test_invalid_arguments(self):
+          self.assertRaises(ValueError, ComponentBatcher, add_one, 0, 10)
+          self.assertRaises(ValueError, ComponentBatcher, add_one, 10, -1)
@@ -0,0 +1,119 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from concurrent.futures import Future
+from pypeline.helpers.cache import ComponentCache
+
+
+class ComponentCacheUnitTest(unittest.TestCase):
+     def test_hits_and_misses(self):
+          calls = list()
+          cache = ComponentCache()
+          function = lambda: calls.append(1) or "value"
+
+          self.assertEquals("value", cache.get("key", function))
+          self.assertEquals("value", cache.get("key", function))
+          self.assertEquals([1], calls)
+          self.assertEquals((1, 1, 0), (cache.hits, cache.misses, cache.evictions))
+
+
+     def test_least_recently_used_eviction(self):
+          cache = ComponentCache(max_entries = 2)
+          cache.get(1, lambda: "one")
+          cache.get(2, lambda: "two")
+          cache.get(1, lambda: "one")
+          cache.get(3, lambda: "three")
+
+          self.assertEquals(2, len(cache))
+          self.assertEquals(1, cache.evictions)
+          self.assertEquals("one", cache.get(1, lambda: "ONE"))
+          self.assertEquals("TWO", cache.get(2, lambda: "TWO"))
+
+
+     def test_time_to_live(self):
+          now = [0.0]
+          cache = ComponentCache(ttl = 10, clock = lambda: now[0])
+          cache.get("key", lambda: "old")
+          now[0] = 9.0
+          self.assertEquals("old", cache.get("key", lambda: "new"))
+          now[0] = 10.0
+          self.assertEquals("new", cache.get("key", lambda: "new"))
+          self.assertEquals((1, 2, 1), (cache.hits, cache.misses, cache.evictions))
+
+
+     def test_coalesced_futures(self):
+          submitted = list()
+          def submit():
+               future = Future()
+               submitted.append(future)
+               return future
+
+          cache = ComponentCache()
+          future_one = cache.get_future("key", submit)
+          future_two = cache.get_future("key", submit)
+          self.assertEquals(1, len(submitted))
+          self.assertFalse(future_one.done())
+
+          submitted[0].set_result("value")
+          self.assertEquals("value", future_one.result())
+          self.assertEquals("value", future_two.result())
+          self.assertEquals("value", cache.get_future("key", submit).result())
+          self.assertEquals(1, len(submitted))
+          self.assertEquals((2, 1), (cache.hits, cache.misses))
+
+
+     def test_cancelled_coalesced_futures(self):
+          submitted = list()
+          def submit():
+               future = Future()
+               submitted.append(future)
+               return future
+
+          cache = ComponentCache()
+          future_one = cache.get_future("key", submit)
+          future_two = cache.get_future("key", submit)
+          self.assertTrue(future_one.cancel())
+          self.assertFalse(submitted[0].cancelled())
+
+          submitted[0].set_result("value")
+          self.assertTrue(future_one.cancelled())
+          self.assertEquals("value", future_two.result())
+
+          future_three = cache.get_future("other key", submit)
+          self.assertTrue(future_three.cancel())
+          self.assertTrue(submitted[1].cancelled())
+          cache.get_future("other key", submit)
+          self.assertEquals(3, len(submitted))
+
+
+     def test_failures_are_not_cached(self):
+          submitted = list()
+          def submit():
+               future = Future()
+               submitted.append(future)
+               return future
+
+          cache = ComponentCache()
+          future = cache.get_future("key", submit)
+          submitted[0].set_exception(IOError("Failed"))
+          self.assertRaises(IOError, future.result)
+          self.assertEquals(0, len(cache))
+          cache.get_future("key", submit)
+          self.assertEquals(2, len(submitted))
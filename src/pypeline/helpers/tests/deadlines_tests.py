@@ -0,0 +1,56 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import pickle
+import time
+import unittest
+
+from concurrent.futures import TimeoutError
+from pypeline.helpers.deadlines import DeadlineExceeded, \
+     call_with_deadline, \
+     check_deadline, \
+     get_deadline, \
+     get_remaining_time
+
+
+class DeadlinesUnitTest(unittest.TestCase):
+     def test_deadline_is_visible_to_called_function(self):
+          deadline = time.time() + 60
+          self.assertEquals(None, get_deadline())
+          self.assertEquals(None, get_remaining_time())
+          self.assertEquals(deadline, call_with_deadline(deadline, get_deadline))
+          self.assertTrue(0 < call_with_deadline(deadline, get_remaining_time) <= 60)
+
+          # Nested calls restore the deadline
+          nested = lambda: (call_with_deadline(None, get_deadline), get_deadline())
+          self.assertEquals((None, deadline), call_with_deadline(deadline, nested))
+          self.assertEquals(None, get_deadline())
+
+
+     def test_check_deadline(self):
+          check_deadline(None, "component")
+          check_deadline(time.time() + 60, "component")
+          try:
+               check_deadline(time.time() - 1, "component")
+          except DeadlineExceeded, ex:
+               self.assertTrue(isinstance(ex, TimeoutError))
+               self.assertEquals("component", ex.name)
+               copy = pickle.loads(pickle.dumps(ex))
+               self.assertEquals((ex.deadline, ex.name, str(ex)), (copy.deadline, copy.name, str(copy)))
+          else:
+               self.fail("Deadline has passed")
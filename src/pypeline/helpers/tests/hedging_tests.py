@@ -0,0 +1,52 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from pypeline.helpers.hedging import ComponentHedger
+
+
+class ComponentHedgerUnitTest(unittest.TestCase):
+     def test_no_delay_until_enough_latencies(self):
+          hedger = ComponentHedger(90, min_samples = 3)
+          hedger.record(1.0)
+          hedger.record(2.0)
+          self.assertEquals(None, hedger.get_delay())
+          hedger.record(3.0)
+          self.assertEquals(3.0, hedger.get_delay())
+          self.assertEquals(2, hedger.calls)
+
+
+     def test_percentile_of_recent_latencies(self):
+          hedger = ComponentHedger(95, window = 100)
+          for latency in xrange(200, 0, -1):
+               hedger.record(latency / 1000.0)
+          # Only the most recent 100 latencies, 1ms to 100ms, are kept
+          self.assertEquals(0.095, hedger.get_delay())
+
+          hedger = ComponentHedger(50, window = 100)
+          for latency in xrange(1, 101):
+               hedger.record(latency / 1000.0)
+          self.assertEquals(0.05, hedger.get_delay())
+
+
+     def test_invalid_arguments(self):
+          self.assertRaises(ValueError, ComponentHedger, 0)
+          self.assertRaises(ValueError, ComponentHedger, 100)
+          self.assertRaises(ValueError, ComponentHedger, 90, window = 0)
+          self.assertRaises(ValueError, ComponentHedger, 90, window = 5, min_samples = 10)
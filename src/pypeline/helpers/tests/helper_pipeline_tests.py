@@ -22,12 +22,17 @@
 # The pipeline is a mixture of components that are sub-processes and plain old
 # Python functions.
 #
+import operator
 import os
 import subprocess
 import sys
+import threading
+import time
 import unittest
 
 from pypeline.helpers.helpers import cons_function_component, \
+     cons_cached_component, \
+     cons_subprocess_component, \
      cons_wire, \
      cons_dictionary_wire, \
      cons_split_wire, \
@@ -36,7 +41,19 @@ from pypeline.helpers.helpers import cons_function_component, \
      cons_wired_components, \
      cons_composed_component, \
      cons_parallel_component, \
-     run_pipeline
+     cons_fanout_component, \
+     cons_join_wire, \
+     compile_pipeline, \
+     run_pipeline, \
+     eval_pipeline, \
+     run_pipeline_batch, \
+     eval_pipeline_batch, \
+     exec_pipeline_batch, \
+     stream_pipeline
+from pypeline.helpers.deadlines import DeadlineExceeded, get_remaining_time
+from pypeline.helpers.instrumentation import ComponentTimings
+from pypeline.core.arrows.kleisli_arrow import KleisliArrow
+from pypeline.core.types.state import State
 
 
 class PypelineHelperUnitTest(unittest.TestCase):
@@ -178,3 +195,320 @@ class PypelineHelperUnitTest(unittest.TestCase):
           finally:
                comp_proc_one[1].terminate()
                comp_proc_one[1].wait()
+
+
+     def test_compiled_pipeline_with_function_components(self):
+          upper_msg = "upper"
+          reverse_msg = "reverse"
+
+          upper_comp = cons_function_component(lambda a, s: a.upper(),
+                                               lambda a, s: a['input'],
+                                               lambda a, s: {'output': a},
+                                               state_mutator = lambda s: s.append(upper_msg) or s)
+          reverse_comp = cons_function_component(lambda a, s: a[::-1],
+                                                 state_mutator = lambda s: s.append(reverse_msg) or s)
+          input_wire = cons_wire(lambda a, s: {'input': a})
+          output_wire = cons_dictionary_wire({'output': 'input'}) >> cons_wire(lambda a, s: a['input'])
+
+          pipeline = cons_pipeline(input_wire,
+                                   cons_wired_components(upper_comp, reverse_comp, output_wire),
+                                   cons_wire(lambda a, s: " ".join([a, str(len(s))])))
+          compiled_pipeline = compile_pipeline(pipeline)
+
+          value = "hello world"
+          target = run_pipeline(pipeline, value, list())
+          result = run_pipeline(compiled_pipeline, value, list())
+          self.assertEquals(("DLROW OLLEH 2", [upper_msg, reverse_msg]), target)
+          self.assertEquals(target, result)
+
+
+     def test_compiled_pipeline_with_split_and_unsplit_wires(self):
+          top_comp = cons_function_component(lambda a, s: a * 2,
+                                             state_mutator = lambda s: s + 1)
+          bottom_comp = cons_function_component(lambda a, s: a - s,
+                                                state_mutator = lambda s: s * 10)
+          fanout_comp = cons_function_component(lambda a, s: a + 1) & \
+                        cons_function_component(lambda a, s: a + s)
+
+          pipeline = cons_split_wire() >> \
+                     cons_parallel_component(top_comp, bottom_comp) >> \
+                     cons_function_component(lambda a, s: a + 3).second() >> \
+                     cons_unsplit_wire(lambda t, b: t + b) >> \
+                     fanout_comp >> \
+                     cons_unsplit_wire(lambda t, b: (t, b))
+          compiled_pipeline = compile_pipeline(pipeline)
+
+          for value in xrange(5):
+               target = run_pipeline(pipeline, value, 3)
+               result = run_pipeline(compiled_pipeline, value, 3)
+               self.assertEquals(target, result)
+
+
+     def test_compiled_pipeline_with_kleisli_arrows(self):
+          arrow = KleisliArrow(State.return_, lambda a: State(lambda s: (a * 3, s + [a])))
+          pipeline = cons_function_component(lambda a, s: a + 1) >> \
+                     arrow >> \
+                     compile_pipeline(cons_wire(lambda a, s: a - 1))
+          compiled_pipeline = compile_pipeline(pipeline)
+
+          target = run_pipeline(pipeline, 7, list())
+          result = run_pipeline(compiled_pipeline, 7, list())
+          self.assertEquals((23, [8]), target)
+          self.assertEquals(target, result)
+
+
+     def test_pipeline_batch(self):
+          pipeline = cons_function_component(lambda a, s: a * s,
+                                             state_mutator = lambda s: s + 1) >> \
+                     cons_wire(lambda a, s: a - s)
+          inputs = range(5)
+          state = 2
+
+          target = [run_pipeline(pipeline, value, state) for value in inputs]
+          self.assertEquals(target, run_pipeline_batch(pipeline, inputs, state))
+          self.assertEquals([t[0] for t in target], eval_pipeline_batch(pipeline, inputs, state))
+          self.assertEquals([t[1] for t in target], exec_pipeline_batch(pipeline, inputs, state))
+
+          compiled_pipeline = compile_pipeline(pipeline)
+          self.assertEquals(target, run_pipeline_batch(compiled_pipeline, iter(inputs), state))
+
+
+     def test_pipeline_batch_with_threaded_state(self):
+          pipeline = cons_function_component(lambda a, s: a * s,
+                                             state_mutator = lambda s: s + 1)
+          inputs = range(5)
+
+          target = list()
+          state = 2
+          for value in inputs:
+               result = run_pipeline(pipeline, value, state)
+               state = result[1]
+               target.append(result)
+
+          self.assertEquals(target, run_pipeline_batch(pipeline, inputs, 2, thread_state = True))
+          self.assertEquals([t[0] for t in target], eval_pipeline_batch(pipeline, inputs, 2, True))
+          self.assertEquals([t[1] for t in target], exec_pipeline_batch(pipeline, inputs, 2, True))
+
+
+     def test_stream_pipeline(self):
+          consumed = list()
+          def inputs():
+               for value in xrange(10):
+                    consumed.append(value)
+                    yield value
+
+          pipeline = cons_function_component(lambda a, s: a * s,
+                                             state_mutator = lambda s: s + 1)
+          stream = stream_pipeline(pipeline, inputs(), 1)
+          self.assertEquals(0, stream.next())
+          self.assertEquals([0], consumed)
+          self.assertEquals(2, stream.next())
+          self.assertEquals([0, 1], consumed)
+          self.assertEquals([6, 12, 20, 30, 42, 56, 72, 90], list(stream))
+
+
+     def test_stream_pipeline_with_read_ahead(self):
+          pipeline = cons_function_component(lambda a, s: a * s,
+                                             state_mutator = lambda s: s + 1)
+          target = eval_pipeline_batch(pipeline, xrange(100), 1, thread_state = True)
+          self.assertEquals(target, list(stream_pipeline(pipeline, xrange(100), 1, read_ahead = 4)))
+
+          def failing_inputs():
+               yield 1
+               raise IOError("Input failed")
+
+          stream = stream_pipeline(pipeline, failing_inputs(), 1, read_ahead = 4)
+          self.assertEquals(1, stream.next())
+          self.assertRaises(IOError, stream.next)
+
+
+     def test_abandoned_stream_pipeline_with_read_ahead(self):
+          closed = threading.Event()
+          def endless_inputs():
+               try:
+                    i = 0
+                    while True:
+                         yield i
+                         i += 1
+               finally:
+                    closed.set()
+
+          # The reader stops, and releases the inputs, once the stream is closed
+          pipeline = cons_function_component(lambda a, s: a)
+          stream = stream_pipeline(pipeline, endless_inputs(), None, read_ahead = 2)
+          self.assertEquals(0, stream.next())
+          stream.close()
+          self.assertTrue(closed.wait(5))
+
+
+     def test_cached_component(self):
+          calls = list()
+          function = lambda a, s: calls.append(a) or a['input'].upper()
+          component = cons_cached_component(function,
+                                            key_function = lambda a, s: a['input'],
+                                            max_entries = 2,
+                                            input_forming_function = lambda a, s: {'input': a},
+                                            output_forming_function = lambda a, s: a[::-1],
+                                            state_mutator = lambda s: s + 1)
+          pipeline = component >> cons_wire(lambda a, s: (a, s))
+
+          values = ["one", "two", "one", "three", "two", "one"]
+          results = [run_pipeline(pipeline, value, 0)[0] for value in values]
+          self.assertEquals([(value.upper()[::-1], 1) for value in values], results)
+          self.assertEquals(["one", "two", "three", "two", "one"], [a['input'] for a in calls])
+          self.assertEquals((1, 5, 3), (component.cache.hits, component.cache.misses, component.cache.evictions))
+
+          compiled_results = eval_pipeline_batch(pipeline, values, 0)
+          self.assertEquals(results, compiled_results)
+
+
+     def test_instrumented_pipeline(self):
+          def upper(a, s):
+               return a.upper()
+
+          calls = list()
+          timings = ComponentTimings()
+          pipeline = cons_function_component(upper) >> \
+                     cons_split_wire() >> \
+                     (cons_function_component(lambda a, s: a[::-1], name = "reverse") ** \
+                      cons_wire(lambda a, s: a.lower(), name = "lower")) >> \
+                     cons_unsplit_wire(lambda t, b: t + b, name = "join")
+
+          hooks = [timings, lambda name, queue_time, wall_time: calls.append(name)]
+          self.assertEquals("OLLEHhello", eval_pipeline(pipeline, "hello", None, hooks))
+          self.assertEquals("OLLEHhello", eval_pipeline(pipeline, "hello", None, hooks))
+          self.assertEquals(["upper", "reverse", "lower", "join"] * 2, calls)
+          self.assertEquals(set(["upper", "reverse", "lower", "join"]), set([name for name, timing in timings.items()]))
+          for name, timing in timings.items():
+               self.assertEquals(2, timing.calls)
+               self.assertEquals(0.0, timing.queue_time)
+               self.assertTrue(timing.wall_time >= 0.0)
+
+          # Hooks only apply to the run that was given them
+          self.assertEquals(("OLLEHhello", None), run_pipeline(pipeline, "hello", None))
+          self.assertEquals(8, len(calls))
+
+          # Compiled, batched and streamed pipelines call the hooks too
+          del calls[:]
+          compiled_pipeline = compile_pipeline(cons_dictionary_wire({'input': 'value'}, name = "rename") >> \
+                                               cons_wire(operator.itemgetter('value'), name = "value") >> \
+                                               pipeline)
+          self.assertEquals("OLLEHhello", eval_pipeline(compiled_pipeline, {'input': "hello"}, None, hooks))
+          self.assertEquals(["rename", "value", "upper", "reverse", "lower", "join"], calls)
+          self.assertEquals("OLLEHhello", eval_pipeline(compiled_pipeline, {'input': "hello"}, None))
+          self.assertEquals(6, len(calls))
+
+          del calls[:]
+          self.assertEquals(["OLLEHhello"] * 2, eval_pipeline_batch(pipeline, ["hello"] * 2, None, hooks = hooks))
+          self.assertEquals(["OLLEHhello"] * 2, list(stream_pipeline(compiled_pipeline, [{'input': "hello"}] * 2, None, hooks = hooks)))
+          self.assertEquals(["upper", "reverse", "lower", "join"] * 2 + ["rename", "value", "upper", "reverse", "lower", "join"] * 2, calls)
+
+
+     def test_wires_with_value_functions(self):
+          pipeline = cons_wire(operator.itemgetter('input')) >> \
+                     cons_wire(operator.methodcaller('upper')) >> \
+                     cons_split_wire() >> \
+                     (cons_function_component(lambda a, s: a + s) ** cons_wire(operator.attrgetter('lower'))) >> \
+                     cons_unsplit_wire(lambda t, b: t + b())
+          self.assertEquals(("HELLO!hello", "!"), run_pipeline(pipeline, {'input': "hello"}, "!"))
+          self.assertEquals(("HELLO!hello", "!"), run_pipeline(compile_pipeline(pipeline), {'input': "hello"}, "!"))
+
+
+     def test_fused_dictionary_wires(self):
+          pipeline = cons_dictionary_wire({'a': 'b', 'x': 'y'}) >> \
+                     cons_dictionary_wire({'b': 'c', 'y': 'z'}) >> \
+                     cons_dictionary_wire({'c': 'd'})
+          self.assertEquals(('dictionary_wire', {'a': 'd'}, 'dictionary_wire'), pipeline._structure[1][0])
+          self.assertEquals(1, len(pipeline._structure[1]))
+
+          value = {'a': 1, 'x': 2}
+          self.assertEquals(({'d': 1}, None), run_pipeline(pipeline, value, None))
+          self.assertEquals(({'d': 1}, None), run_pipeline(compile_pipeline(pipeline), value, None))
+
+          # Keys that are not converted by the preceeding wire are not fused
+          pipeline = cons_dictionary_wire({'a': 'b'}) >> cons_dictionary_wire({'x': 'y'})
+          self.assertEquals(2, len(pipeline._structure[1]))
+          self.assertRaises(KeyError, run_pipeline, pipeline, value, None)
+
+
+     def test_dictionary_wire_with_required_keys(self):
+          component = cons_function_component(lambda a, s: a['sum'] + a['difference'],
+                                              required_keys = ['sum', 'difference'])
+          wire = cons_dictionary_wire({'plus': 'sum', 'minus': 'difference', 'times': 'product'})
+          pipeline = cons_wire(lambda a, s: {'plus': a[0] + a[1], 'minus': a[0] - a[1]}) >> wire >> component
+
+          # The product is not built, so it need not be in the output
+          self.assertEquals((6, None), run_pipeline(pipeline, (3, 2), None))
+          self.assertEquals((6, None), run_pipeline(compile_pipeline(pipeline), (3, 2), None))
+          self.assertRaises(KeyError, run_pipeline, cons_wire(lambda a, s: {'plus': 5, 'minus': 1}) >> wire, None, None)
+
+
+     def test_fanout_component_and_join_wire(self):
+          components = [cons_function_component(lambda a, s, i = i: a + i, state_mutator = lambda s: s + [len(s)])
+                        for i in xrange(8)]
+          pipeline = cons_fanout_component(components) >> cons_join_wire(lambda *values: sum(values))
+          self.assertEquals((tuple(xrange(10, 18)), range(8)),
+                            run_pipeline(cons_fanout_component(components), 10, list()))
+          self.assertEquals((108, range(8)), run_pipeline(pipeline, 10, list()))
+          self.assertEquals((108, range(8)), run_pipeline(compile_pipeline(pipeline), 10, list()))
+
+          pipeline = cons_fanout_component({'upper': cons_wire(operator.methodcaller('upper')),
+                                            'length': cons_wire(lambda a, s: len(a) + s)}) >> \
+                     cons_join_wire(lambda upper, length: "%s:%d" % (upper, length))
+          self.assertEquals(("HELLO:6", 1), run_pipeline(pipeline, "hello", 1))
+          self.assertEquals(("HELLO:6", 1), run_pipeline(compile_pipeline(pipeline), "hello", 1))
+
+          self.assertRaises(ValueError, cons_fanout_component, [])
+          self.assertRaises(ValueError, cons_fanout_component, [lambda a, s: a])
+
+
+     def test_subprocess_component(self):
+          reverse_command = os.path.join("src", "pypeline", "helpers", "tests", "reverse.sh")
+          component = cons_subprocess_component([reverse_command],
+                                                input_forming_function = lambda a, s: a['input'],
+                                                output_forming_function = lambda a, s: {'output': a},
+                                                state_mutator = lambda s: s + 1)
+          try:
+               pipeline = component >> \
+                          cons_dictionary_wire({'output': 'input'}) >> \
+                          component >> \
+                          cons_wire(lambda a, s: a['output'].upper())
+               self.assertEquals(("HELLO WORLD", 2), run_pipeline(pipeline, {'input': "hello world"}, 0))
+               self.assertEquals(["OLLEH", "DLROW"], eval_pipeline_batch(component >> cons_wire(lambda a, s: a['output'].upper()),
+                                                                         [{'input': "hello"}, {'input': "world"}],
+                                                                         0))
+          finally:
+               component.pool.close()
+          self.assertEquals(4, component.pool.requests)
+
+
+     def test_pipeline_with_deadline(self):
+          called = list()
+          def late(a, s):
+               called.append(get_remaining_time() > 0)
+               # Wait for a short deadline to pass
+               while 0 < get_remaining_time() < 1:
+                    time.sleep(0.005)
+               return a
+
+          pipeline = cons_function_component(late, name = "late") >> \
+                     cons_function_component(lambda a, s: called.append(a) or a, name = "next")
+          try:
+               run_pipeline(pipeline, "hello", None, deadline = time.time() + 0.2)
+          except DeadlineExceeded, ex:
+               self.assertEquals("next", ex.name)
+          else:
+               self.fail("Deadline has passed")
+          self.assertEquals([True], called)
+
+          self.assertEquals("hello", eval_pipeline(pipeline, "hello", None, deadline = time.time() + 60))
+
+          # Compiled pipelines, batches and streams check the deadline too
+          del called[:]
+          compiled_pipeline = compile_pipeline(pipeline)
+          expired = time.time() - 1
+          self.assertRaises(DeadlineExceeded, run_pipeline, compiled_pipeline, "hello", None, deadline = expired)
+          self.assertRaises(DeadlineExceeded, eval_pipeline_batch, pipeline, ["hello"], None, deadline = expired)
+          self.assertRaises(DeadlineExceeded, list, stream_pipeline(compiled_pipeline, ["hello"], None, deadline = expired))
+          self.assertEquals([], called)
+          self.assertEquals(["hello"], eval_pipeline_batch(compiled_pipeline, ["hello"], None, deadline = time.time() + 60))
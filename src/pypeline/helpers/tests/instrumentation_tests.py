@@ -0,0 +1,47 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import unittest
+
+from pypeline.helpers.instrumentation import ComponentTimings, get_component_name
+
+
+class ComponentTimingsUnitTest(unittest.TestCase):
+     def test_timings_are_totalled_by_name(self):
+          timings = ComponentTimings()
+          timings("fast", 0.0, 0.25)
+          timings("slow", 0.5, 1.0)
+          timings("fast", 0.25, 0.5)
+
+          self.assertEquals(2, len(timings))
+          self.assertTrue("fast" in timings)
+          self.assertEquals((2, 0.75, 0.25), timings["fast"])
+          self.assertEquals(1, timings["slow"].calls)
+          self.assertEquals(["slow", "fast"], [name for name, timing in timings.items()])
+
+          timings.clear()
+          self.assertEquals(0, len(timings))
+
+
+     def test_component_names(self):
+          def upper(a, s):
+               return a.upper()
+
+          self.assertEquals("upper", get_component_name(upper))
+          self.assertEquals("shout", get_component_name(upper, "shout"))
+          self.assertEquals("<lambda>", get_component_name(lambda a, s: a))
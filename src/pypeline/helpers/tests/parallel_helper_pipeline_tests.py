@@ -22,21 +22,55 @@
 # The pipeline is a mixture of components that are sub-processes and plain old
 # Python functions.
 #
+import operator
 import os
+import pickle
 import subprocess
 import sys
+import threading
+import time
 import unittest
 
-from concurrent.futures import ThreadPoolExecutor
-from pypeline.helpers.parallel_helpers import cons_function_component, \
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
+from pypeline.helpers.deadlines import DeadlineExceeded, get_deadline
+from pypeline.helpers.instrumentation import ComponentTimings
+from pypeline.helpers.parallel_helpers import ComponentError, \
+     cons_function_component, \
+     cons_cached_component, \
+     cons_batching_component, \
+     cons_subprocess_component, \
      cons_wire, \
      cons_dictionary_wire, \
      cons_split_wire, \
      cons_unsplit_wire, \
      cons_if_component, \
+     cons_switch_component, \
+     cons_fanout_component, \
+     cons_join_wire, \
      run_pipeline, \
      eval_pipeline, \
-     exec_pipeline
+     exec_pipeline, \
+     submit_pipeline, \
+     PipelineRunner
+
+
+#
+# Component functions sent to a process pool must be picklable
+#
+def reverse_function(a, s):
+     return a[::-1]
+
+
+def count_function(a, s):
+     return (os.getpid(), len(a))
+
+
+def deadline_function(a, s):
+     return get_deadline()
+
+
+def upper_batch_function(values, states):
+     return [value.upper() for value in values]
 
 
 class ParallelPypelineHelperUnitTest(unittest.TestCase):
@@ -50,6 +84,19 @@ class ParallelPypelineHelperUnitTest(unittest.TestCase):
           return result
 
 
+     def run_in_process_pool(self, no_workers, pipeline, input, state, hooks = None, deadline = None):
+          # A hung run fails the test, rather than stalling the suite, and the pool is shut down by tearDown
+          self.process_pool = ProcessPoolExecutor(max_workers = no_workers)
+          return submit_pipeline(self.process_pool, pipeline, input, state, hooks, deadline).result(30)
+
+
+     def tearDown(self):
+          process_pool = getattr(self, 'process_pool', None)
+          if process_pool is not None:
+               self.process_pool = None
+               process_pool.shutdown(wait = True)
+
+
      def test_serial_pypeline_with_function_components(self):
           rev_msg_one = "reverse(1)"
           rev_msg_two = "reverse(2)"
@@ -147,6 +194,12 @@ class ParallelPypelineHelperUnitTest(unittest.TestCase):
           self.assertEquals({'pi' : 3.141, 'e' : 2.718}, result)
 
 
+     def test_parallel_wire_with_value_functions(self):
+          pipeline = cons_wire(operator.itemgetter('PI')) >> cons_wire(operator.methodcaller('__mul__', 2))
+          result = ParallelPypelineHelperUnitTest.test(1, pipeline, {'PI' : 3.141}, None, eval_pipeline)
+          self.assertEquals(6.282, result)
+
+
      def test_parallel_dictionary_wire(self):
           value = {'pi' : 3.141, 'e' : 2.718}
           pipeline = cons_dictionary_wire({'pi' : 'PI', 'e' : 'E'})
@@ -154,6 +207,102 @@ class ParallelPypelineHelperUnitTest(unittest.TestCase):
           self.assertEquals({'PI' : 3.141, 'E' : 2.718}, result)
 
 
+     def test_parallel_inline_components(self):
+          threads = list()
+          def record(a, s):
+               threads.append(threading.current_thread())
+               return a
+
+          # Inline functions are called by the thread that made their input available
+          release = threading.Event()
+          pipeline = cons_function_component(record, inline = True) >> \
+                     cons_dictionary_wire({'pi' : 'PI'}) >> \
+                     cons_function_component(lambda a, s: release.wait(5) and record(a, s)) >> \
+                     cons_wire(lambda a, s: record(a['PI'], s), inline = True) >> \
+                     cons_split_wire() >> \
+                     cons_unsplit_wire(lambda t, b: record(t + b, None), inline = True)
+
+          executor = ThreadPoolExecutor(max_workers = 1)
+          try:
+               future = submit_pipeline(executor, pipeline, {'pi' : 3.141}, None)
+               release.set()
+               self.assertEquals((6.282, None), future.result(5))
+          finally:
+               executor.shutdown(True)
+
+          self.assertEquals(4, len(threads))
+          self.assertEquals(threading.current_thread(), threads[0])
+          self.assertNotEquals(threading.current_thread(), threads[1])
+          self.assertEquals([threads[1]] * 2, threads[2:])
+
+          self.assertRaises(ValueError, cons_function_component, record, timeout = 1, inline = True)
+          self.assertRaises(ValueError, cons_function_component, record, hedge_percentile = 90, inline = True)
+
+
+     def test_parallel_fused_chain(self):
+          submitted = list()
+          class CountingExecutor(ThreadPoolExecutor):
+               def submit(self, fn, *args, **kwargs):
+                    submitted.append(fn)
+                    return ThreadPoolExecutor.submit(self, fn, *args, **kwargs)
+
+          # Each component sees the state mutated by the components before it
+          pipeline = cons_function_component(lambda a, s: a + [s], state_mutator = lambda s: s + 1) >> \
+                     cons_wire(lambda a, s: a + [s]) >> \
+                     cons_function_component(lambda a, s: a + [s],
+                                             input_forming_function = lambda a, s: a + ["input"],
+                                             state_mutator = lambda s: s * 10) >> \
+                     cons_function_component(lambda a, s: a + [s])
+
+          executor = CountingExecutor(max_workers = 2)
+          try:
+               self.assertEquals(([0, 1, "input", 1, 10], 10), run_pipeline(executor, pipeline, list(), 0))
+               self.assertEquals(1, len(submitted))
+
+               # A long chain, composed one component at a time, is one task too
+               pipeline = cons_function_component(lambda a, s: a + 1)
+               for i in xrange(2999):
+                    pipeline = pipeline >> cons_wire(lambda a, s: a + 1)
+               del submitted[:]
+               self.assertEquals(3000, eval_pipeline(executor, pipeline, 0, None))
+               self.assertEquals(1, len(submitted))
+
+               # The branches of a parallel component are not fused
+               events = (threading.Event(), threading.Event())
+               def get_branch(i):
+                    return lambda a, s: events[i].set() or events[1 - i].wait(5)
+               branch = cons_function_component(get_branch(0)) ** cons_function_component(get_branch(1))
+               pipeline = cons_function_component(lambda a, s: a) >> \
+                          cons_split_wire() >> \
+                          branch >> \
+                          cons_unsplit_wire(lambda t, b: t and b) >> \
+                          cons_wire(lambda a, s: not a)
+               del submitted[:]
+               self.assertEquals(False, eval_pipeline(executor, pipeline, "hello", None))
+               self.assertEquals(4, len(submitted))
+          finally:
+               executor.shutdown(True)
+
+
+     def test_parallel_fused_chain_failure(self):
+          called = list()
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          pipeline = cons_function_component(lambda a, s: a.upper()) >> \
+                     cons_function_component(fail) >> \
+                     cons_function_component(lambda a, s: called.append(a) or a)
+
+          try:
+               ParallelPypelineHelperUnitTest.test(1, pipeline, "hello", None, eval_pipeline)
+               self.fail("Component error not raised")
+          except ComponentError, ex:
+               self.assertEquals("fail", ex.name)
+               self.assertEquals("HELLO", ex.input)
+               self.assertTrue(isinstance(ex.cause, IOError))
+          self.assertEquals([], called)
+
+
      def test_parallel_split(self):
           pi = 3.141
           value = {'pi' : pi}
@@ -178,6 +327,26 @@ class ParallelPypelineHelperUnitTest(unittest.TestCase):
           self.assertEquals(({'PI' : pi}, {'E' : e}), result)
 
 
+     def test_parallel_first_and_second_of_component_output(self):
+          release = threading.Event()
+          pipeline = cons_function_component(lambda a, s: release.wait(5) and (a, a)) >> \
+                     (cons_function_component(lambda a, s: a.upper()) ** cons_function_component(lambda a, s: a[::-1]))
+
+          # The items of the component's output are taken without waiting for it
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               future = submit_pipeline(executor, pipeline, "hello", None)
+               self.assertFalse(future.done())
+               release.set()
+               self.assertEquals((("HELLO", "olleh"), None), future.result(5))
+
+               # Indexing a future waits for its result
+               self.assertEquals("olleh", future[0][1])
+          finally:
+               release.set()
+               executor.shutdown(True)
+
+
      def test_parallel_if(self):
           then_comp = cons_function_component(lambda a, s: {'z' : 'THEN'})
           else_comp = cons_dictionary_wire({'c' : 'z'})
@@ -190,3 +359,641 @@ class ParallelPypelineHelperUnitTest(unittest.TestCase):
           value = {'a' : False, 'b' : 'then', 'c' : 'else'}
           result = ParallelPypelineHelperUnitTest.test(1, pipeline, value, None, eval_pipeline)
           self.assertEquals({'z' : 'else'}, result)
+
+
+     def test_parallel_inline_if(self):
+          threads = list()
+          def condition(a, s):
+               threads.append(threading.current_thread())
+               return a > 0
+
+          then_comp = cons_function_component(lambda a, s: "positive", state_mutator = lambda s: s + ["then"])
+          else_comp = cons_function_component(lambda a, s: "negative", state_mutator = lambda s: s + ["else"])
+          pipeline = cons_if_component(condition, then_comp, else_comp, inline = True) >> \
+                     cons_function_component(lambda a, s: a.upper(), state_mutator = lambda s: s + ["upper"])
+
+          # The input is available, so the condition is evaluated by the caller's thread
+          self.assertEquals(("POSITIVE", ["then", "upper"]), ParallelPypelineHelperUnitTest.test(1, pipeline, 1, list()))
+          self.assertEquals([threading.current_thread()], threads)
+
+          # The input is computed, so the condition, and the state, wait for it
+          pipeline = cons_function_component(lambda a, s: a - 2) >> pipeline
+          self.assertEquals(("NEGATIVE", ["else", "upper"]), ParallelPypelineHelperUnitTest.test(1, pipeline, 1, list()))
+          self.assertEquals(("POSITIVE", ["then", "upper"]), ParallelPypelineHelperUnitTest.test(1, pipeline, 3, list()))
+
+
+     def test_parallel_inline_if_in_failed_run(self):
+          called = list()
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          pipeline = cons_if_component(lambda a, s: called.append(a) or True,
+                                       cons_wire(lambda a, s: "then"),
+                                       cons_wire(lambda a, s: "else"),
+                                       inline = True)
+
+          # The condition is not evaluated once the deadline has passed, or the run has failed
+          executor = ThreadPoolExecutor(max_workers = 1)
+          try:
+               self.assertRaises(DeadlineExceeded, eval_pipeline, executor, pipeline, 1, None, deadline = time.time() - 1)
+               failing = cons_fanout_component([cons_function_component(fail, inline = True), pipeline])
+               self.assertRaises(ComponentError, eval_pipeline, executor, failing, 1, None)
+          finally:
+               executor.shutdown(True)
+          self.assertEquals([], called)
+
+
+     def test_parallel_switch(self):
+          called = list()
+          def get_component(name):
+               return cons_function_component(lambda a, s: called.append(name) or "%s(%s)" % (name, a))
+
+          components = {'int' : get_component('int'), 'str' : get_component('str')}
+          for inline in (False, True):
+               pipeline = cons_function_component(lambda a, s: a) >> \
+                          cons_switch_component(lambda a, s: type(a).__name__, components, inline = inline)
+               self.assertEquals("int(1)", ParallelPypelineHelperUnitTest.test(2, pipeline, 1, None, eval_pipeline))
+               self.assertEquals("str(one)", ParallelPypelineHelperUnitTest.test(2, pipeline, "one", None, eval_pipeline))
+               self.assertRaises(KeyError,
+                                 ParallelPypelineHelperUnitTest.test,
+                                 2, pipeline, 1.0, None, eval_pipeline)
+
+               pipeline = cons_switch_component(lambda a, s: type(a).__name__,
+                                                components,
+                                                get_component('default'),
+                                                inline = inline)
+               self.assertEquals("default(1.0)", ParallelPypelineHelperUnitTest.test(2, pipeline, 1.0, None, eval_pipeline))
+          self.assertEquals(['int', 'str', 'default'] * 2, called)
+
+          self.assertRaises(ValueError, cons_switch_component, lambda a, s: a, {'a' : lambda a, s: a})
+
+
+     def test_parallel_fanout_component_and_join_wire(self):
+          no_branches = 8
+          lock = threading.Lock()
+          started = [0]
+          all_started = threading.Event()
+          def get_function(i):
+               def function(a, s):
+                    # Every branch waits for all the others to start
+                    with lock:
+                         started[0] += 1
+                         if started[0] == no_branches:
+                              all_started.set()
+                    all_started.wait(5)
+                    return a + i
+               return function
+
+          components = [cons_function_component(get_function(i), state_mutator = lambda s: s + 1)
+                        for i in xrange(no_branches)]
+          pipeline = cons_function_component(lambda a, s: a * 10) >> \
+                     cons_fanout_component(components) >> \
+                     cons_join_wire(lambda *values: values)
+          result = ParallelPypelineHelperUnitTest.test(no_branches, pipeline, 1, 0)
+          self.assertEquals((tuple(xrange(10, 18)), no_branches), result)
+          self.assertTrue(all_started.is_set())
+
+          pipeline = cons_fanout_component({'upper': cons_wire(operator.methodcaller('upper')),
+                                            'length': cons_wire(lambda a, s: len(a))})
+          result = ParallelPypelineHelperUnitTest.test(2, pipeline, "hello", None, eval_pipeline)
+          self.assertEquals({'upper': "HELLO", 'length': 5}, result)
+          pipeline = pipeline >> cons_join_wire(lambda upper, length: "%s:%d" % (upper, length))
+          result = ParallelPypelineHelperUnitTest.test(2, pipeline, "hello", None, eval_pipeline)
+          self.assertEquals("HELLO:5", result)
+
+
+     def test_deep_pipeline_with_fewer_workers_than_components(self):
+          depth = 200
+          increment = cons_function_component(lambda a, s: a + 1,
+                                              state_mutator = lambda s: s + 1)
+          chain = increment
+          for i in xrange(depth - 1):
+               chain = chain >> increment
+
+          pipeline = cons_split_wire() >> \
+                     (chain ** chain) >> \
+                     cons_unsplit_wire(lambda t, b: t + b)
+
+          result = ParallelPypelineHelperUnitTest.test(2, pipeline, 0, 0)
+          self.assertEquals((2 * depth, 2 * depth), result)
+
+
+     def test_parallel_component_failure(self):
+          called = list()
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          pipeline = cons_function_component(fail) >> \
+                     cons_function_component(lambda a, s: called.append(a) or a)
+
+          try:
+               ParallelPypelineHelperUnitTest.test(1, pipeline, "hello world", None, eval_pipeline)
+               self.fail("Component error not raised")
+          except ComponentError, ex:
+               self.assertEquals("fail", ex.name)
+               self.assertEquals("hello world", ex.input)
+               self.assertTrue(isinstance(ex.cause, IOError))
+          self.assertEquals([], called)
+
+
+     def test_parallel_component_failure_cancels_run(self):
+          release = threading.Event()
+          called = list()
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          # The failure is raised while the slow component is running, and the queued one is cancelled
+          pipeline = cons_fanout_component([cons_function_component(fail),
+                                            cons_function_component(lambda a, s: release.wait(5)),
+                                            cons_function_component(lambda a, s: called.append(a) or a)])
+
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               self.assertRaises(ComponentError, eval_pipeline, executor, pipeline, "hello", None)
+               self.assertFalse(release.is_set())
+          finally:
+               release.set()
+               executor.shutdown(True)
+          self.assertEquals([], called)
+
+
+     def test_parallel_component_timeout(self):
+          release = threading.Event()
+          called = list()
+          pipeline = cons_function_component(lambda a, s: release.wait(), timeout = 0.02) >> \
+                     cons_function_component(lambda a, s: called.append(a) or a)
+
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               try:
+                    eval_pipeline(executor, pipeline, "hello world", None)
+                    self.fail("Component error not raised")
+               except ComponentError, ex:
+                    self.assertTrue(isinstance(ex.cause, TimeoutError))
+          finally:
+               release.set()
+               executor.shutdown(True)
+          self.assertEquals([], called)
+
+          # A component that completes in time is unaffected
+          pipeline = cons_function_component(lambda a, s: a.upper(), timeout = 5)
+          self.assertEquals("HELLO", ParallelPypelineHelperUnitTest.test(1, pipeline, "hello", None, eval_pipeline))
+
+
+     def test_parallel_component_retries(self):
+          attempts = list()
+          def flaky(a, s):
+               attempts.append(time.time())
+               if len(attempts) < 3:
+                    raise IOError("Component failed")
+               return a.upper()
+
+          pipeline = cons_function_component(flaky, retries = 2, backoff = 0.01)
+          self.assertEquals("HELLO", ParallelPypelineHelperUnitTest.test(1, pipeline, "hello", None, eval_pipeline))
+          self.assertEquals(3, len(attempts))
+          # Waits 0.01 seconds, then 0.02 seconds
+          self.assertTrue(attempts[2] - attempts[0] >= 0.03)
+
+          del attempts[:]
+          pipeline = cons_function_component(flaky, retries = 1)
+          self.assertRaises(ComponentError,
+                            ParallelPypelineHelperUnitTest.test,
+                            1, pipeline, "hello", None, eval_pipeline)
+          self.assertEquals(2, len(attempts))
+
+          # Timed out attempts are retried too
+          release = threading.Event()
+          def hang_once(a, s):
+               if not release.is_set():
+                    release.set()
+                    threading.Event().wait(0.2)
+               return a
+          pipeline = cons_function_component(hang_once, timeout = 0.05, retries = 1)
+          self.assertEquals("hello", ParallelPypelineHelperUnitTest.test(2, pipeline, "hello", None, eval_pipeline))
+
+          self.assertRaises(ValueError, cons_function_component, flaky, timeout = 0)
+          self.assertRaises(ValueError, cons_function_component, flaky, retries = -1)
+          self.assertRaises(ValueError, cons_function_component, flaky, backoff = -1)
+
+
+     def test_parallel_hedged_component(self):
+          lock = threading.Lock()
+          calls = [0]
+          release = threading.Event()
+          def function(a, s):
+               with lock:
+                    calls[0] += 1
+                    call = calls[0]
+               # The eleventh call straggles, and is beaten by its hedge
+               if call == 11:
+                    release.wait(5)
+                    return "straggler"
+               threading.Event().wait(0.001)
+               return a.upper()
+
+          component = cons_function_component(function, hedge_percentile = 90)
+          pipeline = component >> cons_wire(lambda a, s: a + "!")
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               results = [eval_pipeline(executor, pipeline, "hello", None) for i in xrange(11)]
+          finally:
+               release.set()
+               executor.shutdown(True)
+
+          self.assertEquals(["HELLO!"] * 11, results)
+          self.assertEquals(12, calls[0])
+          self.assertEquals((11, 1, 1), (component.hedger.calls, component.hedger.hedges, component.hedger.hedge_wins))
+          self.assertRaises(ValueError, cons_function_component, function, hedge_percentile = 100)
+
+
+     def test_parallel_hedged_component_failure(self):
+          def fail(a, s):
+               raise IOError("Component failed")
+
+          component = cons_function_component(fail, hedge_percentile = 50)
+          for latency in xrange(10):
+               component.hedger.record(0.001)
+          self.assertRaises(ComponentError,
+                            ParallelPypelineHelperUnitTest.test,
+                            2, component, "hello", None, eval_pipeline)
+
+
+     def test_parallel_subprocess_component(self):
+          reverse_command = os.path.join("src", "pypeline", "helpers", "tests", "reverse.sh")
+          component = cons_subprocess_component([reverse_command], pool_size = 2, decoder = lambda line: line.upper())
+          pipeline = component >> cons_wire(lambda a, s: a + "!")
+
+          # One executor worker runs many requests, as none waits for a response
+          executor = ThreadPoolExecutor(max_workers = 1)
+          try:
+               runner = PipelineRunner(pipeline, executor)
+               futures = [runner.submit("hello %d" % i, None) for i in xrange(50)]
+               results = [future.result(5) for future in futures]
+          finally:
+               executor.shutdown(True)
+               component.pool.close()
+
+          self.assertEquals([(("hello %d" % i)[::-1].upper() + "!", None) for i in xrange(50)], results)
+          self.assertEquals(50, component.pool.requests)
+
+
+     def test_parallel_pipeline_with_deadline(self):
+          called = list()
+          def late(a, s):
+               # Wait for a short deadline to pass
+               while 0 < get_deadline() - time.time() < 1:
+                    time.sleep(0.005)
+               return a
+
+          pipeline = cons_function_component(late, retries = 3) >> \
+                     cons_function_component(lambda a, s: called.append(a) or a, name = "next")
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               try:
+                    run_pipeline(executor, pipeline, "hello", None, deadline = time.time() + 0.1)
+               except DeadlineExceeded, ex:
+                    self.assertEquals("next", ex.name)
+               else:
+                    self.fail("Deadline has passed")
+
+               # Runs that are late when they are started are shed
+               runner = PipelineRunner(pipeline, executor, max_in_flight = 1)
+               futures = [runner.submit("hello", None, deadline = time.time() + 0.1) for i in xrange(5)]
+               for future in futures:
+                    self.assertRaises(DeadlineExceeded, future.result, 5)
+
+               deadline = time.time() + 60
+               self.assertEquals(deadline, eval_pipeline(executor, cons_function_component(deadline_function), None, None, deadline = deadline))
+          finally:
+               executor.shutdown(True)
+          self.assertEquals([], called)
+
+          result = self.run_in_process_pool(1, cons_function_component(deadline_function), None, None, deadline = deadline)
+          self.assertEquals(deadline, result[0])
+
+
+     def test_process_pool_pipeline(self):
+          rev_msg = "reverse"
+          count_msg = "count"
+
+          comp_rev = cons_function_component(reverse_function,
+                                             lambda a, s: a['input'],
+                                             lambda a, s: a.upper(),
+                                             state_mutator = lambda s: s.append(rev_msg) or s)
+          comp_count = cons_function_component(count_function,
+                                               state_mutator = lambda s: s.append(count_msg) or s)
+
+          pipeline = cons_wire(lambda a, s: {'input': a}) >> \
+                     comp_rev >> \
+                     cons_split_wire() >> \
+                     (comp_count ** cons_wire(lambda a, s: a.lower())) >> \
+                     cons_unsplit_wire(lambda t, b: (t[0], t[1], b))
+
+          result = self.run_in_process_pool(2, pipeline, "hello world", list())
+
+          self.assertNotEquals(os.getpid(), result[0][0])
+          self.assertEquals((11, "dlrow olleh"), result[0][1:])
+          self.assertEquals([rev_msg, count_msg], result[1])
+
+
+     def test_parallel_cached_component(self):
+          calls = list()
+          release = threading.Event()
+          def function(a, s):
+               release.wait()
+               calls.append(a)
+               return a.upper()
+
+          component = cons_cached_component(function)
+          pipeline = component >> cons_wire(lambda a, s: a + "!")
+
+          executor = ThreadPoolExecutor(max_workers = 4)
+          try:
+               runs = [executor.submit(eval_pipeline, executor, pipeline, "hello", None) for i in xrange(3)]
+               while component.cache.hits + component.cache.misses < 3:
+                    release.wait(0.001)
+               release.set()
+               results = [run.result() for run in runs]
+               results.append(eval_pipeline(executor, pipeline, "hello", None))
+          finally:
+               executor.shutdown(True)
+
+          self.assertEquals(["HELLO!"] * 4, results)
+          self.assertEquals(["hello"], calls)
+          self.assertEquals((3, 1, 0), (component.cache.hits, component.cache.misses, component.cache.evictions))
+
+
+     def test_parallel_cached_component_shared_by_failed_run(self):
+          release = threading.Event()
+          fail_now = threading.Event()
+          def fail(a, s):
+               fail_now.wait(5)
+               raise IOError("Component failed")
+
+          component = cons_cached_component(lambda a, s: a.upper())
+          failing = cons_fanout_component([cons_function_component(fail), component])
+
+          # The blocked worker keeps the cached task queued while the first run fails
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               executor.submit(release.wait, 5)
+               failed_run = submit_pipeline(executor, failing, "hello", None)
+               while component.cache.misses < 1:
+                    release.wait(0.001)
+               run = submit_pipeline(executor, component, "hello", None)
+               while component.cache.hits < 1:
+                    release.wait(0.001)
+               fail_now.set()
+               self.assertRaises(ComponentError, failed_run.result, 5)
+               release.set()
+               self.assertEquals(("HELLO", None), run.result(5))
+          finally:
+               fail_now.set()
+               release.set()
+               executor.shutdown(True)
+
+
+     def test_instrumented_parallel_pipeline(self):
+          def upper(a, s):
+               return a.upper()
+
+          timings = ComponentTimings()
+          pipeline = cons_function_component(upper) >> \
+                     cons_split_wire() >> \
+                     (cons_function_component(reverse_function, name = "reverse") ** \
+                      cons_wire(lambda a, s: a.lower(), name = "lower")) >> \
+                     cons_unsplit_wire(lambda t, b: t + b, name = "join")
+
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               for i in xrange(3):
+                    self.assertEquals("OLLEHhello", eval_pipeline(executor, pipeline, "hello", None, [timings]))
+               self.assertEquals("OLLEHhello", eval_pipeline(executor, pipeline, "hello", None))
+          finally:
+               executor.shutdown(True)
+
+          self.assertEquals(set(["upper", "reverse", "lower", "join"]), set([name for name, timing in timings.items()]))
+          for name, timing in timings.items():
+               self.assertEquals(3, timing.calls)
+               self.assertTrue(timing.queue_time >= 0.0)
+               self.assertTrue(timing.wall_time >= 0.0)
+
+          # Conditions are timed too, whether they are submitted or inline
+          def is_short(a, s):
+               return len(a) < 10
+          def is_long(a, s):
+               return len(a) >= 10
+
+          timings = ComponentTimings()
+          pipeline = cons_if_component(is_short, cons_function_component(upper), cons_wire(lambda a, s: a)) >> \
+                     cons_if_component(is_long, cons_wire(lambda a, s: a), cons_function_component(reverse_function), True)
+
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               self.assertEquals("OLLEH", eval_pipeline(executor, pipeline, "hello", None, [timings]))
+          finally:
+               executor.shutdown(True)
+
+          self.assertEquals(set(["is_short", "upper", "is_long", "reverse_function"]), set([name for name, timing in timings.items()]))
+          for name, timing in timings.items():
+               self.assertEquals(1, timing.calls)
+
+
+     def test_instrumented_process_pool_pipeline(self):
+          timings = ComponentTimings()
+          pipeline = cons_function_component(reverse_function) >> \
+                     cons_wire(lambda a, s: a.upper(), name = "upper")
+
+          result = self.run_in_process_pool(1, pipeline, "hello", None, [timings])
+
+          self.assertEquals("OLLEH", result[0])
+          self.assertEquals(1, timings["reverse_function"].calls)
+          self.assertEquals(1, timings["upper"].calls)
+          self.assertEquals(0.0, timings["upper"].queue_time)
+
+
+     def test_parallel_batching_component(self):
+          batches = list()
+          def batch_function(values, states):
+               batches.append(len(values))
+               return [(value, state) for value, state in zip(values, states)]
+
+          component = cons_batching_component(batch_function,
+                                              4,
+                                              50,
+                                              input_forming_function = lambda a, s: a * 2,
+                                              output_forming_function = lambda a, s: a[0] + a[1])
+          pipeline = cons_wire(lambda a, s: a + 1) >> component
+
+          # Callers block, so they must not use the pipeline's workers
+          callers = ThreadPoolExecutor(max_workers = 8)
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               runs = [callers.submit(eval_pipeline, executor, pipeline, i, 100) for i in xrange(8)]
+               results = [run.result() for run in runs]
+          finally:
+               callers.shutdown(True)
+               executor.shutdown(True)
+
+          self.assertEquals([(i + 1) * 2 + 100 for i in xrange(8)], results)
+          self.assertEquals(8, sum(batches))
+          self.assertEquals((len(batches), 8), (component.batcher.batches, component.batcher.items))
+
+
+     def test_parallel_batching_component_in_failed_run(self):
+          release = threading.Event()
+          fail_now = threading.Event()
+          batches = list()
+          def fail(a, s):
+               fail_now.wait(5)
+               raise IOError("Component failed")
+          def batch_function(values, states):
+               batches.append(values)
+               return values
+
+          component = cons_batching_component(batch_function, 2, 60000)
+          pipeline = cons_fanout_component([cons_function_component(fail), component, component])
+
+          # The blocked worker keeps the batch queued while the run fails
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               executor.submit(release.wait, 5)
+               run = submit_pipeline(executor, pipeline, "hello", None)
+               while component.batcher.batches < 1:
+                    release.wait(0.001)
+               fail_now.set()
+               self.assertRaises(ComponentError, run.result, 5)
+          finally:
+               fail_now.set()
+               release.set()
+               executor.shutdown(True)
+          self.assertEquals([], batches)
+
+
+     def test_process_pool_pipeline_with_unpicklable_function(self):
+          pipeline = cons_function_component(lambda a, s: a.upper(), name = "upper")
+          try:
+               self.run_in_process_pool(1, pipeline, "hello", None)
+               self.fail("Component error not raised")
+          except ComponentError, ex:
+               self.assertEquals("upper", ex.name)
+               self.assertTrue(isinstance(ex.cause, pickle.PicklingError))
+
+
+     def test_process_pool_batching_component(self):
+          component = cons_batching_component(upper_batch_function, 2, 10)
+          result = self.run_in_process_pool(1, component >> cons_wire(lambda a, s: a + "!"), "hello", None)
+          self.assertEquals("HELLO!", result[0])
+
+
+     def test_submit_pipeline(self):
+          pipeline = cons_function_component(lambda a, s: a.upper(), state_mutator = lambda s: s + 1) >> \
+                     cons_split_wire() >> \
+                     (cons_wire(lambda a, s: a[::-1]) ** cons_wire(lambda a, s: a.lower()))
+          failing = cons_function_component(lambda a, s: a / 0)
+
+          executor = ThreadPoolExecutor(max_workers = 2)
+          try:
+               self.assertEquals((("OLLEH", "hello"), 1), submit_pipeline(executor, pipeline, "hello", 0).result(5))
+               self.assertRaises(ComponentError, submit_pipeline(executor, failing, 1, None).result, 5)
+          finally:
+               executor.shutdown(True)
+
+
+     def test_pipeline_runner(self):
+          lock = threading.Lock()
+          running = [0, 0]
+          def function(a, s):
+               with lock:
+                    running[0] += 1
+                    running[1] = max(running)
+               threading.Event().wait(0.002)
+               with lock:
+                    running[0] -= 1
+               return a * 2
+
+          pipeline = cons_function_component(function, state_mutator = lambda s: s + [len(s)]) >> \
+                     cons_wire(lambda a, s: a + 1)
+
+          executor = ThreadPoolExecutor(max_workers = 8)
+          try:
+               runner = PipelineRunner(pipeline, executor, max_in_flight = 3)
+               futures = [runner.submit(i, list()) for i in xrange(30)]
+               results = [future.result(10) for future in futures]
+          finally:
+               executor.shutdown(True)
+
+          self.assertEquals([(i * 2 + 1, [0]) for i in xrange(30)], results)
+          self.assertTrue(running[1] <= 3)
+          self.assertEquals(0, runner.in_flight)
+
+
+     def test_pipeline_runner_with_failed_run(self):
+          release = threading.Event()
+          def check(a, s):
+               if a == 0:
+                    raise ValueError("Zero")
+               return a
+
+          # The failed run frees its slot without waiting for its slow component
+          pipeline = cons_fanout_component([cons_function_component(check),
+                                            cons_function_component(lambda a, s: a == 0 and release.wait(5) or a)])
+
+          executor = ThreadPoolExecutor(max_workers = 3)
+          try:
+               runner = PipelineRunner(pipeline, executor, max_in_flight = 1)
+               futures = [runner.submit(i, None) for i in xrange(2)]
+               self.assertRaises(ComponentError, futures[0].result, 5)
+               self.assertEquals(((1, 1), None), futures[1].result(5))
+               self.assertFalse(release.is_set())
+          finally:
+               release.set()
+               executor.shutdown(True)
+          self.assertEquals(0, runner.in_flight)
+
+
+     def test_pipeline_runner_with_runs_that_complete_immediately(self):
+          release = threading.Event()
+          def function(a, s):
+               release.wait()
+               return "cached"
+
+          # Once cached, runs complete as they are started
+          pipeline = cons_cached_component(function, key_function = lambda a, s: None)
+
+          executor = ThreadPoolExecutor(max_workers = 1)
+          try:
+               runner = PipelineRunner(pipeline, executor, max_in_flight = 1)
+               futures = [runner.submit(i, None) for i in xrange(sys.getrecursionlimit() * 2)]
+               futures[1].cancel()
+               release.set()
+               self.assertEquals(("cached", None), futures[-1].result(10))
+          finally:
+               executor.shutdown(True)
+
+          self.assertTrue(futures[1].cancelled())
+          self.assertEquals(0, runner.in_flight)
+
+
+     def test_pipeline_runner_with_if_component(self):
+          release = threading.Event()
+          def slow(a, s):
+               release.wait()
+               return a
+
+          # Runs wait on the slow component, but the runner's thread is not blocked by the condition
+          pipeline = cons_function_component(slow) >> \
+                     cons_if_component(lambda a, s: a % 2 == 0,
+                                       cons_wire(lambda a, s: "even"),
+                                       cons_wire(lambda a, s: "odd"),
+                                       inline = True)
+
+          executor = ThreadPoolExecutor(max_workers = 4)
+          try:
+               runner = PipelineRunner(pipeline, executor)
+               futures = [runner.submit(i, None) for i in xrange(4)]
+               self.assertEquals(4, runner.in_flight)
+               release.set()
+               self.assertEquals([("even", None), ("odd", None)] * 2, [future.result(5) for future in futures])
+          finally:
+               executor.shutdown(True)
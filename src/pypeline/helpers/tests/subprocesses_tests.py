@@ -0,0 +1,90 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import os
+import unittest
+
+from pypeline.helpers.subprocesses import SubprocessPool
+
+
+#
+# Echoes each line, tagged with the process id, and exits when told to
+#
+ECHO_COMMAND = ["sh", "-c", 'while read line; do [ "$line" = exit ] && exit 3; echo "$$:$line"; done']
+
+
+class SubprocessPoolUnitTest(unittest.TestCase):
+     def test_requests_are_pipelined_and_matched_in_order(self):
+          pool = SubprocessPool(ECHO_COMMAND, pool_size = 2)
+          try:
+               futures = [pool.submit(i) for i in xrange(100)]
+               responses = [future.result(5).split(":") for future in futures]
+          finally:
+               pool.close()
+
+          self.assertEquals([str(i) for i in xrange(100)], [response[1] for response in responses])
+          self.assertEquals(sorted(map(str, pool.pids)), sorted(set([response[0] for response in responses])))
+          self.assertEquals(100, pool.requests)
+
+
+     def test_encoder_and_decoder(self):
+          command = [os.path.join("src", "pypeline", "helpers", "tests", "reverse.sh")]
+          pool = SubprocessPool(command, encoder = json.dumps, decoder = lambda line: line[::-1])
+          try:
+               self.assertEquals('{"a": 1}', pool.submit({'a': 1}).result(5))
+          finally:
+               pool.close()
+
+          pool = SubprocessPool(command, encoder = lambda a: "two\nlines")
+          try:
+               self.assertRaises(ValueError, pool.submit, None)
+          finally:
+               pool.close()
+
+
+     def test_exited_worker_is_restarted(self):
+          pool = SubprocessPool(ECHO_COMMAND)
+          try:
+               pid = pool.pids[0]
+               self.assertEquals("%d:before" % pid, pool.submit("before").result(5))
+               self.assertRaises(IOError, pool.submit("exit").result, 5)
+
+               response = pool.submit("after").result(5)
+               self.assertEquals("%d:after" % pool.pids[0], response)
+               self.assertNotEquals(pid, pool.pids[0])
+               self.assertEquals(1, pool.restarts)
+          finally:
+               pool.close()
+          self.assertRaises(ValueError, pool.submit, "closed")
+          self.assertRaises(ValueError, SubprocessPool, ECHO_COMMAND, pool_size = 0)
+
+
+     def test_worker_that_closes_its_output_is_restarted(self):
+          # The worker keeps running after closing its standard output
+          command = ["sh", "-c", 'while read line; do [ "$line" = close ] && exec sleep 30 >&-; echo "$$:$line"; done']
+          pool = SubprocessPool(command)
+          try:
+               pid = pool.pids[0]
+               self.assertRaises(IOError, pool.submit("close").result, 5)
+
+               response = pool.submit("after").result(5)
+               self.assertEquals("%d:after" % pool.pids[0], response)
+               self.assertNotEquals(pid, pool.pids[0])
+          finally:
+               pool.close()
@@ -0,0 +1,86 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+import unittest
+
+from pypeline.helpers.timers import TimerQueue
+
+
+class TimerQueueUnitTest(unittest.TestCase):
+     def setUp(self):
+          # Timers are due only once the test advances the clock, however long it takes to call the queue
+          self.now = time.time()
+          self.timers = TimerQueue(lambda: self.now)
+
+
+     def test_timers_are_called_in_order(self):
+          called = list()
+          finished = threading.Event()
+          self.timers.call_later(0.02, lambda: called.append(2) or finished.set())
+          self.timers.call_later(0.01, lambda: called.append(1))
+          self.timers.call_later(0, lambda: called.append(0))
+
+          self.now += 1
+          self.assertTrue(finished.wait(5))
+          self.assertEquals([0, 1, 2], called)
+
+
+     def test_cancelled_timers_are_not_called(self):
+          called = list()
+          finished = threading.Event()
+          cancelled = [self.timers.call_later(0.01, lambda: called.append(i)) for i in xrange(10)]
+          timer = self.timers.call_later(0.02, finished.set)
+          self.assertEquals(11, len(self.timers))
+
+          self.assertTrue(all([t.cancel() for t in cancelled]))
+          self.assertFalse(cancelled[0].cancel())
+          self.assertEquals(1, len(self.timers))
+          self.now += 1
+          self.assertTrue(finished.wait(5))
+          self.assertEquals([], called)
+          self.assertFalse(timer.cancel())
+
+
+     def test_earlier_timer_is_called_on_time(self):
+          timers = TimerQueue()
+          late = timers.call_later(10, lambda: None)
+          delays = list()
+          for i in xrange(5):
+               # The thread has been waiting long enough to poll at its slowest
+               time.sleep(0.1)
+               finished = threading.Event()
+               start = time.time()
+               timers.call_later(0.005, finished.set)
+               self.assertTrue(finished.wait(5))
+               delays.append(time.time() - start)
+          late.cancel()
+
+          self.assertTrue(sum(delays) / len(delays) < 0.015)
+
+
+     def test_failing_timer_does_not_stop_the_queue(self):
+          def fail():
+               raise RuntimeError("Timer failed")
+
+          finished = threading.Event()
+          timers = TimerQueue()
+          timers.call_later(0, fail)
+          timers.call_later(0.01, finished.set)
+          self.assertTrue(finished.wait(5))
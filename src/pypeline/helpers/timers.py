@@ -0,0 +1,124 @@
+#
+# Copyright Applied Language Solutions 2012
+#
+# This file is part of Pypeline.
+#
+# Pypeline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Pypeline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with Pypeline.  If not, see <http://www.gnu.org/licenses/>.
+#
+import heapq
+import itertools
+import threading
+import time
+
+
+class Timer(object):
+    """A function that is called by a timer queue once its time has come, unless the timer is cancelled."""
+    __slots__ = ('when', 'function', '_queue')
+
+    def __init__(self, queue, when, function):
+        self.when = when
+        self.function = function
+        self._queue = queue
+
+    def cancel(self):
+        """Stop the function being called. Returns true if the function had not already been called."""
+        return self._queue._cancel(self)
+
+
+#
+# Calls functions after a delay. One daemon thread waits for the next
+# timer to come due, and runs only while there are timers waiting, so
+# many timeouts and delayed retries do not need a thread each.
+# Functions are called by the timer thread, and so should not block.
+# The clock, by default time.time, gives the current time in seconds.
+#
+# On Python 2 a waiting thread polls, with sleeps of up to 50ms, to see
+# if it has been woken, although a wait ends on time. So a timer that
+# comes due before the one being waited for is not waited for by
+# waking the thread; a new thread waits for it instead, and the old
+# one stops once it sees that it has been replaced.
+#
+class TimerQueue(object):
+    def __init__(self, clock = time.time):
+        self._clock = clock
+        self._heap = list()
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._lock = threading.Lock()
+        self._wakeup = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap) - self._cancelled
+
+    def call_later(self, delay, function):
+        """Call the function, with no arguments, once delay seconds have passed. Exceptions raised by the function are ignored. A timer is returned that can be cancelled."""
+        timer = Timer(self, self._clock() + delay, function)
+        with self._lock:
+            heapq.heappush(self._heap, (timer.when, next(self._counter), timer))
+            if self._wakeup is None or self._heap[0][2] is timer:
+                if self._wakeup is not None:
+                    self._wakeup.set()
+                self._wakeup = threading.Event()
+                thread = threading.Thread(target = self._run, args = (self._wakeup,))
+                thread.daemon = True
+                thread.start()
+        return timer
+
+    def _cancel(self, timer):
+        with self._lock:
+            if timer.function is None:
+                return False
+            timer.function = None
+            self._cancelled += 1
+
+            # The thread stops once no timer is waiting
+            if self._cancelled == len(self._heap):
+                self._heap = list()
+                self._cancelled = 0
+                if self._wakeup is not None:
+                    self._wakeup.set()
+                    self._wakeup = None
+
+            # Cancelled timers are removed once they outnumber the waiting ones
+            elif self._cancelled * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if entry[2].function is not None]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+            return True
+
+    def _run(self, wakeup):
+        while True:
+            with self._lock:
+                if self._wakeup is not wakeup:
+                    return
+                while self._heap and self._heap[0][2].function is None:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                if not self._heap:
+                    self._wakeup = None
+                    return
+                remaining = self._heap[0][0] - self._clock()
+                if remaining <= 0:
+                    timer = heapq.heappop(self._heap)[2]
+                    function, timer.function = timer.function, None
+
+            if remaining > 0:
+                wakeup.wait(remaining)
+                continue
+
+            try:
+                function()
+            except Exception:
+                pass